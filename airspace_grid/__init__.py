@@ -5,7 +5,7 @@ iwhereGIS 网格数据引擎包
 
 from .grid_manager import AirspaceGridManager
 from .grid_core import GridCell, GridGenerator
-from .grid_encode import GridEncoder, encode_grid
+from .grid_encode import GridEncoder, encode_grid, encode_grid_batch
 from .grid_decode import decode_grid
 from .grid_attributes import GridAttributes, GridAttributeManager
 
@@ -18,6 +18,7 @@ __all__ = [
     'GridGenerator',
     'GridEncoder',
     'encode_grid',
+    'encode_grid_batch',
     'decode_grid',
     'GridAttributes',
     'GridAttributeManager'
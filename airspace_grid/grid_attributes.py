@@ -1,8 +1,19 @@
 # airspace_grid/grid_attributes.py
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Optional, Sequence, Tuple
 from dataclasses import dataclass, field
 from datetime import datetime
+from array import array
+import copy
 import json
+import time
+
+import numpy as np
+
+from .grid_changes import AttributeChangeLog, RECORD, REGION, REMOVE, REPLACE, RESET, UPDATE
+
+# 六大类属性
+CATEGORIES = ('flight_rules', 'airspace_status', 'weather_conditions',
+              'risk_assessment', 'control_authority', 'dynamic_updates')
 
 @dataclass
 class GridAttributes:
@@ -112,54 +123,514 @@ class GridAttributes:
         )
 
 
+def _check_category(category: str) -> None:
+    if category not in CATEGORIES:
+        raise ValueError(f"Invalid category: {category}")
+
+
+def _timestamp(t: Any) -> float:
+    """datetime 或 Unix 时间戳 -> 秒"""
+    return t.timestamp() if isinstance(t, datetime) else float(t)
+
+
+def _value_key(value: Any) -> Tuple[type, Any]:
+    """取值的字典键：类型不同的相等值（1 / 1.0 / True）分开保存，不可哈希的值按 JSON 比较"""
+    try:
+        hash(value)
+        return type(value), value
+    except TypeError:
+        return type(value), json.dumps(value, sort_keys=True, default=str)
+
+
+def _in_region(region: Any, code: str, level: Optional[int]) -> bool:
+    """网格是否属于区域：GridRegion 按网格下标运算判断（给定 level 时级别须相同），其他区域对象用 `code in region`"""
+    if hasattr(region, 'index_of'):
+        return (level is None or level == region.level) and region.index_of(code, exact=False) is not None
+    return code in region
+
+
+def _region_mask(region: Any, block: Any) -> np.ndarray:
+    """GridColumns 块中各网格是否属于区域（同 _in_region）"""
+    if hasattr(region, 'covers'):
+        return region.covers(block)
+    return np.array([code in region for code in block.code_list()], dtype=bool)
+
+
+class AttributeHistory:
+    """
+    一个 (类别, 键) 全部网格的时间版本记录（列式）
+
+    四个并行数组：网格序号、有效时间、取值编号、失效时间，按 (网格序号, 有效时间) 排序，每条 32 字节。
+    记录从有效时间起生效，直到同一网格下一条记录的有效时间或自身的失效时间（有效时间 + TTL）。
+    一个预报时次的整批记录一次向量化追加到待合并区，查询前统一排序合并；查询用 np.searchsorted。
+    """
+    __slots__ = ('cells', 'times', 'vids', 'expires', '_pending')
+
+    def __init__(self):
+        self.cells = np.zeros(0, dtype=np.int64)
+        self.times = np.zeros(0, dtype=np.float64)
+        self.vids = np.zeros(0, dtype=np.int64)
+        self.expires = np.zeros(0, dtype=np.float64)
+        self._pending: List[Tuple[np.ndarray, ...]] = []
+
+    def __len__(self) -> int:
+        self._merge()
+        return len(self.cells)
+
+    def record(self, indices: Sequence[int], timestamp: float, vids: Sequence[int], expires: float) -> None:
+        """追加同一有效时间的一批记录（网格序号与取值编号一一对应），同一网格同一有效时间的记录以后写入的为准"""
+        indices = np.asarray(indices, dtype=np.int64)
+        n = len(indices)
+        if n:
+            self._pending.append((indices, np.full(n, timestamp), np.asarray(vids, dtype=np.int64),
+                                  np.full(n, expires)))
+
+    def _merge(self) -> None:
+        """把待合并的记录并入主数组：稳定排序后同一 (网格, 有效时间) 只保留最后写入的一条"""
+        if not self._pending:
+            return
+        parts = [(self.cells, self.times, self.vids, self.expires)] + self._pending
+        self._pending = []
+        cells, times, vids, expires = (np.concatenate(arrays) for arrays in zip(*parts))
+        order = np.lexsort((times, cells))
+        cells, times, vids, expires = cells[order], times[order], vids[order], expires[order]
+        last = np.ones(len(cells), dtype=bool)
+        last[:-1] = (cells[1:] != cells[:-1]) | (times[1:] != times[:-1])
+        self.cells, self.times, self.vids, self.expires = cells[last], times[last], vids[last], expires[last]
+
+    def at(self, index: Optional[int], timestamp: float) -> Optional[int]:
+        """网格在 timestamp 时刻有效的取值编号（二分查找），没有或已失效时返回 None"""
+        if index is None:
+            return None
+        self._merge()
+        lo, hi = np.searchsorted(self.cells, [index, index + 1])
+        i = lo + int(np.searchsorted(self.times[lo:hi], timestamp, side='right')) - 1
+        if i < lo or self.expires[i] <= timestamp:
+            return None
+        return int(self.vids[i])
+
+    def discard(self, index: int) -> None:
+        """删除一个网格的全部记录"""
+        self._merge()
+        lo, hi = np.searchsorted(self.cells, [index, index + 1])
+        if lo < hi:
+            self._keep(np.r_[0:lo, hi:len(self.cells)])
+
+    def prune(self, now: float) -> int:
+        """删除对 now 及以后的查询不再起作用的记录（已被同一网格后续记录取代或已失效），返回删除的条数"""
+        self._merge()
+        keep = self.expires > now
+        # 取代：同一网格的下一条记录在 now 时已生效
+        keep[:-1] &= ~((self.cells[1:] == self.cells[:-1]) & (self.times[1:] <= now))
+        removed = len(keep) - int(keep.sum())
+        if removed:
+            self._keep(keep)
+        return removed
+
+    def _keep(self, selector: np.ndarray) -> None:
+        self.cells, self.times = self.cells[selector], self.times[selector]
+        self.vids, self.expires = self.vids[selector], self.expires[selector]
+
+
+class AttributeColumn:
+    """
+    一个 (类别, 键) 的属性列
+
+    取值按字典编码：不同的取值只保存一份（values），网格只记录取值编号（cells: 网格序号 -> 编号）。
+    区域默认值按写入顺序保存，后写入的优先；网格自己的取值优先于区域默认值。
+    按时间版本写入的取值保存在 history（全部网格一个列式 AttributeHistory），与当前取值共用取值字典。
+    """
+    __slots__ = ('values', '_ids', 'cells', 'defaults', 'history')
+
+    def __init__(self):
+        self.values: List[Any] = []
+        self._ids: Dict[Tuple[type, Any], int] = {}
+        self.cells: Dict[int, int] = {}
+        self.defaults: List[Tuple[Any, int, float]] = []   # (区域, 取值编号, 写入时间)
+        self.history = AttributeHistory()
+
+    def intern(self, value: Any) -> int:
+        """取值 -> 编号（新取值追加到字典）"""
+        key = _value_key(value)
+        vid = self._ids.get(key)
+        if vid is None:
+            vid = self._ids[key] = len(self.values)
+            self.values.append(value)
+        return vid
+
+    def find(self, value: Any) -> Optional[int]:
+        return self._ids.get(_value_key(value))
+
+    def value(self, vid: int) -> Any:
+        """编号 -> 取值（返回副本，避免修改共享的可变取值）"""
+        return copy.deepcopy(self.values[vid])
+
+    def set(self, index: int, value: Any) -> None:
+        self.cells[index] = self.intern(value)
+
+    def set_default(self, region: Any, value: Any, timestamp: float) -> None:
+        self.defaults.append((region, self.intern(value), timestamp))
+
+    def inherited(self, code: str, level: Optional[int] = None) -> Optional[Tuple[int, float]]:
+        """网格从区域默认值继承的 (取值编号, 写入时间)；level 为网格级别，未知时不比较级别"""
+        for region, vid, timestamp in reversed(self.defaults):
+            if _in_region(region, code, level):
+                return vid, timestamp
+        return None
+
+    def lookup(self, index: Optional[int], code: str, level: Optional[int] = None) -> Optional[int]:
+        """网格的取值编号（自己的取值，否则继承区域默认值），没有取值时返回 None"""
+        if index is not None and index in self.cells:
+            return self.cells[index]
+        inherited = self.inherited(code, level)
+        return None if inherited is None else inherited[0]
+
+
 class GridAttributeManager:
-    """网格属性管理器"""
+    """
+    网格属性管理器（列式存储）
+
+    每个 (类别, 键) 一列 AttributeColumn，网格按登记顺序编号。没有属性的网格只占一个编号、
+    几何信息的引用和两个时间戳；区域默认值只写一次，区域内的网格在单独写入之前继承该值。
+    get_grid_attributes 返回按列组装的 GridAttributes 副本，修改副本不会写回。
+    每次写入追加到变更日志 changes（AttributeChangeLog），下游缓存按序号增量同步。
+    """
     
     def __init__(self):
-        self.grid_attributes: Dict[str, GridAttributes] = {}
+        self._index: Dict[str, int] = {}
+        self._codes: List[Optional[str]] = []        # 网格序号 -> 编码（已删除为 None）
+        self._geometry: List[Optional[tuple]] = []   # (level, bbox, center, alt_range)
+        self._created = array('d')
+        self._updated = array('d')
+        self.columns: Dict[Tuple[str, str], AttributeColumn] = {}
+        self.changes = AttributeChangeLog()
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def __contains__(self, grid_code: str) -> bool:
+        return grid_code in self._index
+
+    def _column(self, category: str, key: str) -> AttributeColumn:
+        column = self.columns.get((category, key))
+        if column is None:
+            column = self.columns[(category, key)] = AttributeColumn()
+        return column
+
+    def _register(self, code: str, geometry: tuple, timestamp: float) -> int:
+        """登记网格，已登记的网格清空原有属性（与替换属性对象相同）"""
+        index = self._index.get(code)
+        if index is None:
+            index = self._index[code] = len(self._codes)
+            self._codes.append(code)
+            self._geometry.append(geometry)
+            self._created.append(timestamp)
+            self._updated.append(timestamp)
+            return index
+        for column in self.columns.values():
+            column.cells.pop(index, None)
+            column.history.discard(index)
+        self._geometry[index] = geometry
+        self._created[index] = self._updated[index] = timestamp
+        return index
+
+    def add_grid(self, grid) -> None:
+        """登记网格（GridCell 等带 code/level/bbox/center/alt_range 的对象），不创建属性对象"""
+        self.add_grids([grid])
+
+    def add_grids(self, grids) -> None:
+        """批量登记网格，共用一个创建时间"""
+        now = time.time()
+        replaced = []
+        for grid in grids:
+            if grid.code in self._index:
+                replaced.append(grid.code)
+            self._register(grid.code, (grid.level, grid.bbox, grid.center, grid.alt_range), now)
+        if replaced:
+            self.changes.append(REPLACE, codes=replaced)
     
     def add_grid_attributes(self, attrs: GridAttributes) -> None:
         """添加网格属性"""
-        self.grid_attributes[attrs.grid_code] = attrs
+        self._add_attributes(attrs)
+        self.changes.append(REPLACE, codes=[attrs.grid_code])
+
+    def _add_attributes(self, attrs: GridAttributes) -> None:
+        index = self._register(attrs.grid_code, (attrs.level, attrs.bbox, attrs.center, attrs.alt_range),
+                               attrs.created_time.timestamp())
+        for category in CATEGORIES:
+            for key, value in getattr(attrs, category).items():
+                self._column(category, key).set(index, value)
+        self._updated[index] = attrs.last_updated.timestamp()
+
+    def _view(self, code: str, index: Optional[int], geometry: tuple,
+              created: float, updated: float, at: Optional[float] = None) -> GridAttributes:
+        """按列组装网格的 GridAttributes（含继承的区域默认值；给定 at 时有效的时间版本记录优先）"""
+        data = {category: {} for category in CATEGORIES}
+        for (category, key), column in self.columns.items():
+            vid = None
+            if at is not None:
+                vid = column.history.at(index, at)
+            if vid is None and index is not None:
+                vid = column.cells.get(index)
+            if vid is None:
+                inherited = column.inherited(code, geometry[0])
+                if inherited is None:
+                    continue
+                vid, timestamp = inherited
+                updated = max(updated, timestamp)
+            data[category][key] = column.value(vid)
+        level, bbox, center, alt_range = geometry
+        return GridAttributes(
+            grid_code=code,
+            level=level,
+            bbox=list(bbox),
+            center=list(center),
+            alt_range=list(alt_range),
+            created_time=datetime.fromtimestamp(created),
+            last_updated=datetime.fromtimestamp(updated),
+            **data
+        )
+
+    def _view_index(self, code: str, index: int, at: Optional[float] = None) -> GridAttributes:
+        return self._view(code, index, self._geometry[index], self._created[index], self._updated[index], at)
     
-    def get_grid_attributes(self, grid_code: str) -> Optional[GridAttributes]:
-        """获取网格属性"""
-        return self.grid_attributes.get(grid_code)
+    def get_grid_attributes(self, grid_code: str, at: Any = None) -> Optional[GridAttributes]:
+        """获取网格属性（副本）；给定 at（datetime 或时间戳）时返回该时刻的属性"""
+        index = self._index.get(grid_code)
+        if index is None:
+            return None
+        return self._view_index(grid_code, index, None if at is None else _timestamp(at))
+
+    def build_attributes(self, grid) -> GridAttributes:
+        """未登记网格的属性（只含继承的区域默认值，不登记）"""
+        now = time.time()
+        return self._view(grid.code, None, (grid.level, grid.bbox, grid.center, grid.alt_range), now, now)
+
+    def get_attribute(self, grid_code: str, category: str, key: str) -> Any:
+        """单个属性值（网格自己的取值，否则继承区域默认值），没有时返回 None"""
+        _check_category(category)
+        column = self.columns.get((category, key))
+        if column is None:
+            return None
+        index = self._index.get(grid_code)
+        level = self._geometry[index][0] if index is not None else None
+        vid = column.lookup(index, grid_code, level)
+        return None if vid is None else column.value(vid)
     
     def update_grid_attributes(self, grid_code: str, category: str, key: str, value: Any) -> bool:
         """更新网格属性"""
-        if grid_code in self.grid_attributes:
-            self.grid_attributes[grid_code].update_attribute(category, key, value)
-            return True
-        return False
+        index = self._index.get(grid_code)
+        if index is None:
+            return False
+        _check_category(category)
+        self._column(category, key).set(index, value)
+        self._updated[index] = time.time()
+        self.changes.append(UPDATE, category, key, [grid_code], value=value)
+        return True
+
+    def _bulk_targets(self, grid_codes: Sequence[str], category: str, values: Dict[str, Any],
+                      grids: Sequence[Any]) -> Tuple[List[int], List[int]]:
+        """批量写入前的参数检查与登记 -> (grid_codes 中的位置, 网格序号)，未登记的编码跳过"""
+        _check_category(category)
+        for key, value in values.items():
+            if isinstance(value, np.ndarray) and (value.ndim != 1 or len(value) != len(grid_codes)):
+                raise ValueError(f"取值数组形状 {value.shape} 与网格数 {len(grid_codes)} 不一致: {key}")
+        self.add_grids(grids)
+        positions, indices = [], []
+        for i, code in enumerate(grid_codes):
+            index = self._index.get(code)
+            if index is not None:
+                positions.append(i)
+                indices.append(index)
+        return positions, indices
+
+    @staticmethod
+    def _value_ids(column: AttributeColumn, value: Any, positions: List[int]) -> List[int]:
+        """批量取值 -> 与 positions 逐个对应的取值编号"""
+        if not isinstance(value, np.ndarray):
+            return [column.intern(value)] * len(positions)
+        if value.dtype == object:
+            return [column.intern(v) for v in value[positions]]
+        # 先去重，每个不同取值只入字典一次
+        uniq, inverse = np.unique(value[positions], return_inverse=True)
+        vids = np.array([column.intern(v.item()) for v in uniq], dtype=np.int64)
+        return vids[inverse.ravel()].tolist()
+
+    @staticmethod
+    def _logged_values(column: AttributeColumn, value: Any, vids: List[int]) -> Dict[str, Any]:
+        """变更日志中的取值：逐个网格取值时为 values 列表，否则为单个 value"""
+        if isinstance(value, np.ndarray):
+            return {'values': [column.values[vid] for vid in vids]}
+        return {'value': value}
+
+    def update_many(self, grid_codes: Sequence[str], category: str, values: Dict[str, Any],
+                    grids: Sequence[Any] = ()) -> int:
+        """
+        批量更新一个类别的属性（一次遍历，共用一个更新时间）
+
+        Args:
+            grid_codes: 网格编码列表，未登记的网格跳过；重复的编码以最后一次为准
+            category: 属性类别
+            values: {键: 取值}，取值为 numpy 数组时按 grid_codes 的顺序逐个网格取值，否则全部网格取同一个值
+            grids: 需要先登记的网格（同 add_grids），参数检查通过后才登记
+
+        Returns:
+            更新的网格数
+        """
+        positions, indices = self._bulk_targets(grid_codes, category, values, grids)
+        codes = [grid_codes[i] for i in positions]
+        for key, value in values.items():
+            column = self._column(category, key)
+            vids = self._value_ids(column, value, positions)
+            column.cells.update(zip(indices, vids))
+            if codes:
+                self.changes.append(UPDATE, category, key, codes, **self._logged_values(column, value, vids))
+
+        now = time.time()
+        for index in indices:
+            self._updated[index] = now
+        return len(indices)
+
+    def record_attribute(self, grid_code: str, category: str, key: str, value: Any,
+                         valid_time: Any, ttl: Optional[float] = None) -> bool:
+        """
+        写入按时间版本保存的属性值（预报时次等），不改变当前取值
+
+        Args:
+            valid_time: 生效时间（datetime 或 Unix 时间戳），到下一条记录生效为止
+            ttl: 有效期（秒），超过后该记录失效；None 表示不失效
+        """
+        return self.record_many([grid_code], category, {key: value}, valid_time, ttl) == 1
+
+    def record_many(self, grid_codes: Sequence[str], category: str, values: Dict[str, Any],
+                    valid_time: Any, ttl: Optional[float] = None, grids: Sequence[Any] = ()) -> int:
+        """批量写入同一生效时间的属性值（参数同 update_many / record_attribute），返回写入的网格数"""
+        timestamp = _timestamp(valid_time)
+        expires = timestamp + ttl if ttl is not None else float('inf')
+        positions, indices = self._bulk_targets(grid_codes, category, values, grids)
+        codes = [grid_codes[i] for i in positions]
+        for key, value in values.items():
+            column = self._column(category, key)
+            vids = self._value_ids(column, value, positions)
+            column.history.record(indices, timestamp, vids, expires)
+            if codes:
+                self.changes.append(RECORD, category, key, codes, valid_time=timestamp, expires=expires,
+                                    **self._logged_values(column, value, vids))
+        return len(indices)
+
+    def get_attribute_at(self, grid_code: str, category: str, key: str, at: Any) -> Any:
+        """at 时刻的属性值：有效的时间版本记录，否则为当前取值（get_attribute）"""
+        _check_category(category)
+        column = self.columns.get((category, key))
+        if column is None:
+            return None
+        vid = column.history.at(self._index.get(grid_code), _timestamp(at))
+        return column.value(vid) if vid is not None else self.get_attribute(grid_code, category, key)
+
+    def expire_history(self, now: Any = None) -> int:
+        """清理对 now（默认当前时间）及以后的查询不再起作用的时间版本记录，返回删除的条数"""
+        now = time.time() if now is None else _timestamp(now)
+        return sum(column.history.prune(now) for column in self.columns.values())
+
+    def history_size(self) -> int:
+        """时间版本记录的总条数"""
+        return sum(len(column.history) for column in self.columns.values())
+
+    def set_region_default(self, region: Any, category: str, key: str, value: Any,
+                           override: bool = False) -> None:
+        """
+        设置区域默认值（一次写入）
+
+        Args:
+            region: GridRegion，或支持 `code in region` 并可遍历出区域内 GridCell 的对象
+            category, key, value: 属性类别、键和值
+            override: 为 True 时同时清除区域内网格自己的取值，区域内全部网格都取该值（批量更新整个区域）
+        """
+        _check_category(category)
+        column = self._column(category, key)
+        now = time.time()
+        if override:
+            covered = [index for index in column.cells
+                       if _in_region(region, self._codes[index], self._geometry[index][0])]
+            for index in covered:
+                del column.cells[index]
+                self._updated[index] = now
+        column.set_default(region, value, now)
+        bounds = {name: getattr(region, name) for name in
+                  ('lon_min', 'lon_max', 'lat_min', 'lat_max', 'level', 'alt_min', 'alt_max')
+                  if hasattr(region, name)}
+        if override:
+            bounds['override'] = True
+        self.changes.append(REGION, category, key, value=value, region=bounds or None)
     
     def remove_grid_attributes(self, grid_code: str) -> bool:
         """删除网格属性"""
-        if grid_code in self.grid_attributes:
-            del self.grid_attributes[grid_code]
-            return True
-        return False
+        index = self._index.pop(grid_code, None)
+        if index is None:
+            return False
+        for column in self.columns.values():
+            column.cells.pop(index, None)
+            column.history.discard(index)
+        self._codes[index] = self._geometry[index] = None
+        self.changes.append(REMOVE, codes=[grid_code])
+        return True
     
     def get_grids_by_category_value(self, category: str, key: str, value: Any) -> List[GridAttributes]:
-        """根据类别和键值查找网格"""
-        result = []
-        for attrs in self.grid_attributes.values():
-            if attrs.get_attribute(category, key) == value:
-                result.append(attrs)
+        """
+        根据类别和键值查找网格（含继承区域默认值的网格）
+
+        区域默认值按块整体求出继承该值的网格：区域内的网格减去有自己取值的网格和被更新的
+        区域默认值覆盖的网格，只为结果中的网格组装 GridAttributes
+        """
+        _check_category(category)
+        column = self.columns.get((category, key))
+        vid = column.find(value) if column is not None else None
+        if vid is None:
+            return []
+        result = [self._view_index(self._codes[index], index)
+                  for index, cell_vid in column.cells.items() if cell_vid == vid]
+        own = np.array([self._codes[index].encode('ascii', 'replace') for index in column.cells])
+        for k, (region, default_vid, _) in enumerate(column.defaults):
+            if default_vid != vid:
+                continue
+            newer = [r for r, _, _ in column.defaults[k + 1:]]
+            if not hasattr(region, 'iter_columns'):
+                # 一般的区域对象：逐个网格判断
+                for grid in region:
+                    if grid.code in self._index and self._index[grid.code] in column.cells:
+                        continue
+                    if any(_in_region(r, grid.code, grid.level) for r in newer):
+                        continue
+                    index = self._index.get(grid.code)
+                    result.append(self._view_index(grid.code, index) if index is not None
+                                  else self.build_attributes(grid))
+                continue
+            for block in region.iter_columns():
+                keep = ~np.isin(block.codes, own) if len(own) else np.ones(len(block), dtype=bool)
+                for r in newer:
+                    keep &= ~_region_mask(r, block)
+                for i in np.flatnonzero(keep):
+                    code = block.codes[i].decode('ascii')
+                    index = self._index.get(code)
+                    result.append(self._view_index(code, index) if index is not None
+                                  else self.build_attributes(block.cell(i)))
         return result
     
     def get_all_grid_codes(self) -> List[str]:
         """获取所有网格编码"""
-        return list(self.grid_attributes.keys())
+        return list(self._index.keys())
     
     def to_json(self) -> str:
-        """导出为JSON格式"""
-        data = {code: attrs.to_dict() for code, attrs in self.grid_attributes.items()}
+        """导出为JSON格式（继承的区域默认值按网格展开）"""
+        data = {code: self._view_index(code, index).to_dict() for code, index in self._index.items()}
         return json.dumps(data, indent=2)
     
     def from_json(self, json_str: str) -> None:
         """从JSON导入"""
         data = json.loads(json_str)
-        self.grid_attributes = {
-            code: GridAttributes.from_dict(attrs) for code, attrs in data.items()
-        }
+        changes = self.changes
+        self.__init__()
+        self.changes = changes   # 序号保持单调，客户端收到 reset 后重新下载
+        for attrs in data.values():
+            self._add_attributes(GridAttributes.from_dict(attrs))
+        self.changes.append(RESET)
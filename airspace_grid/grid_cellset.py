@@ -0,0 +1,284 @@
+# airspace_grid/grid_cellset.py
+"""
+紧凑的多级网格集合
+
+每个网格对应第16级三维网格键空间上的一段连续区间：键按层级从粗到细排列各级码元
+（第1级为象限与经纬度行列，第2级起为子网格序号），第6级起每级再附加一位高度位
+（该级高度层把上一级的层一分为二，与 GridGenerator 的 1000 / 2^(level - 5) 米分层一致）。
+第6级以下的网格不分层，表示整个高度范围的柱体。
+
+集合以排序且互不重叠的区间数组存储：
+- 并、交、差是区间运算，与集合中网格的数量无关
+- 完整的兄弟网格组自动合并为父网格（区间相邻即合并），to_cover 输出最紧凑的多级网格
+- expand 按需展开为指定级别的网格编码
+
+编码与索引的换算见 grid_hierarchy。
+"""
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+import numpy as np
+
+from . import grid_hierarchy as gh
+from .grid_index import FULL_CODE_LENGTH, LAT_RADIX, LON_RADIX, MAX_LEVEL
+
+LAYERED_LEVEL = 6               # 开始按高度分层的级别
+MAX_EXPAND_CELLS = 20_000_000
+
+# 第1级：4 个象限 × 30 列 × 23 行（A~W）
+_L1_COLS, _L1_ROWS = 30, 23
+
+# 各级分支数（第1级为全部第1级网格）及第 level 级网格包含的第16级三维网格数
+_BRANCH = [None, 4 * _L1_COLS * _L1_ROWS] + [
+    LON_RADIX[lv] * LAT_RADIX[lv] * (2 if lv >= LAYERED_LEVEL else 1) for lv in range(2, MAX_LEVEL + 1)]
+_SPAN = [1] * (MAX_LEVEL + 1)
+for _lv in range(MAX_LEVEL - 1, -1, -1):
+    _SPAN[_lv] = _SPAN[_lv + 1] * _BRANCH[_lv + 1]
+assert _SPAN[0] < 2 ** 64
+
+_U = np.uint64
+
+
+def _empty() -> np.ndarray:
+    return np.zeros(0, dtype=np.uint64)
+
+
+def _keys_from_index(quad, ax, ay, layer, level: int) -> np.ndarray:
+    """(象限, ax, ay, 高度层) -> level 级网格键（第 level 级网格的序号）"""
+    ax, ay = np.asarray(ax, dtype=np.int64), np.asarray(ay, dtype=np.int64)
+    layer = np.asarray(layer, dtype=np.int64)
+    digits = []
+    for lv in range(level, 1, -1):
+        ax, col = np.divmod(ax, LON_RADIX[lv])
+        ay, row = np.divmod(ay, LAT_RADIX[lv])
+        d = row * LON_RADIX[lv] + col
+        if lv >= LAYERED_LEVEL:
+            d = d * 2 + ((layer >> (level - lv)) & 1)
+        digits.append(d)
+    key = (np.asarray(quad, dtype=np.int64) * (_L1_COLS * _L1_ROWS) + ay * _L1_COLS + ax).astype(np.uint64)
+    for lv, d in zip(range(2, level + 1), reversed(digits)):
+        key = key * _U(_BRANCH[lv]) + d.astype(np.uint64)
+    return key
+
+
+def _index_from_keys(key: np.ndarray, level: int):
+    """level 级网格键 -> (象限, ax, ay, 高度层)"""
+    key = np.asarray(key, dtype=np.uint64)
+    ax = np.zeros(len(key), dtype=np.int64)
+    ay = np.zeros(len(key), dtype=np.int64)
+    layer = np.zeros(len(key), dtype=np.int64)
+    mx = my = 1
+    for lv in range(level, 1, -1):
+        key, d = np.divmod(key, _U(_BRANCH[lv]))
+        d = d.astype(np.int64)
+        if lv >= LAYERED_LEVEL:
+            layer |= (d & 1) << (level - lv)
+            d >>= 1
+        row, col = np.divmod(d, LON_RADIX[lv])
+        ax += col * mx
+        ay += row * my
+        mx *= LON_RADIX[lv]
+        my *= LAT_RADIX[lv]
+    quad, d1 = np.divmod(key.astype(np.int64), _L1_COLS * _L1_ROWS)
+    row, col = np.divmod(d1, _L1_COLS)
+    return quad, ax + col * mx, ay + row * my, layer
+
+
+def _codes_from_keys(key: np.ndarray, level: int) -> List[str]:
+    quad, ax, ay, layer = _index_from_keys(key, level)
+    if level < LAYERED_LEVEL:
+        # 不分层的网格高程码元取 0
+        elevation = np.full((len(key), FULL_CODE_LENGTH - len(gh._PLANE_POSITIONS)), ord('0'), dtype=np.uint8)
+    else:
+        table = np.frombuffer(b''.join(gh._elevation_digits(level, k) for k in range(2 ** (level - 5))),
+                              dtype=np.uint8).reshape(2 ** (level - 5), -1)
+        elevation = table[layer]
+    return gh.index_to_codes(quad, ax, ay, level, elevation)
+
+
+def _normalize(starts: np.ndarray, ends: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """任意区间 -> 排序、合并重叠与相邻后的区间"""
+    keep = starts < ends
+    starts, ends = starts[keep], ends[keep]
+    if not len(starts):
+        return _empty(), _empty()
+    order = np.argsort(starts, kind='stable')
+    starts, ends = starts[order], ends[order]
+    reach = np.maximum.accumulate(ends)
+    # 起点超过此前全部区间终点的位置开始新区间
+    new = np.concatenate([[True], starts[1:] > reach[:-1]])
+    group_end = np.concatenate([np.flatnonzero(new)[1:], [len(starts)]]) - 1
+    return starts[new], reach[group_end]
+
+
+def _contains(starts: np.ndarray, ends: np.ndarray, points: np.ndarray) -> np.ndarray:
+    idx = np.searchsorted(starts, points, side='right').astype(np.int64) - 1
+    return (idx >= 0) & (points < ends[np.maximum(idx, 0)])
+
+
+def _range_keys(first: np.ndarray, last: np.ndarray) -> np.ndarray:
+    """键区间 [first, last) 数组 -> 其中全部键"""
+    counts = np.where(last > first, last - first, _U(0)).astype(np.int64)
+    offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    return np.repeat(first, counts) + offsets.astype(np.uint64)
+
+
+class CellSet:
+    """多级网格集合，内部为第16级三维网格键空间上的排序区间 [starts, ends)"""
+
+    def __init__(self, starts: Sequence[int] = (), ends: Sequence[int] = ()):
+        self.starts, self.ends = _normalize(np.asarray(starts, dtype=np.uint64),
+                                            np.asarray(ends, dtype=np.uint64))
+
+    @classmethod
+    def _from_sorted(cls, starts: np.ndarray, ends: np.ndarray) -> 'CellSet':
+        cell_set = cls.__new__(cls)
+        cell_set.starts, cell_set.ends = starts, ends
+        return cell_set
+
+    @classmethod
+    def from_codes(cls, codes: Iterable[str], level: int) -> 'CellSet':
+        """
+        由同一级别的网格编码构造集合
+
+        Args:
+            codes: 22位或33位编码；第6级起，33位编码按高程码元所在的高度层取三维网格，
+                22位编码表示整个高度范围
+            level: 网格级别
+        """
+        gh._check_level(level)
+        arr = gh._to_array(list(codes))
+        if not len(arr):
+            return cls()
+        plane, elev = gh._split(arr)
+        quad, ax, ay = gh._plane_to_index(plane, level)
+        span = _U(_SPAN[level])
+        if level < LAYERED_LEVEL:
+            keys = _keys_from_index(quad, ax, ay, 0, level)
+            return cls(keys * span, keys * span + span)
+        layers = 2 ** (level - 5)
+        if elev is None:
+            # 整个高度范围：展开为该级全部高度层
+            quad, ax, ay = (np.repeat(v, layers) for v in (quad, ax, ay))
+            layer = np.tile(np.arange(layers), len(plane))
+        else:
+            layer = np.minimum(gh._layer_of(elev, level), layers - 1)
+        keys = _keys_from_index(quad, ax, ay, layer, level)
+        return cls(keys * span, keys * span + span)
+
+    @classmethod
+    def from_cover(cls, cover: Dict[int, Sequence[str]]) -> 'CellSet':
+        """由 {级别: 编码列表} 的多级覆盖（如 grid_polyfill.polyfill 的结果）构造集合"""
+        result = cls()
+        for level, codes in cover.items():
+            result = result | cls.from_codes(codes, level)
+        return result
+
+    # ---- 基本属性 ----
+
+    def __len__(self) -> int:
+        """紧凑表示中的网格数"""
+        return sum(len(keys) for keys in self._cover_keys().values())
+
+    def __bool__(self) -> bool:
+        return bool(len(self.starts))
+
+    def __eq__(self, other) -> bool:
+        return (isinstance(other, CellSet) and np.array_equal(self.starts, other.starts)
+                and np.array_equal(self.ends, other.ends))
+
+    def __repr__(self) -> str:
+        return f"CellSet(intervals={len(self.starts)}, nbytes={self.nbytes})"
+
+    @property
+    def nbytes(self) -> int:
+        return self.starts.nbytes + self.ends.nbytes
+
+    def volume(self, level: int = MAX_LEVEL) -> float:
+        """以 level 级三维网格计的体积（level < 6 时为平面网格柱体数）"""
+        return float(np.sum(self.ends - self.starts, dtype=np.float64) / _SPAN[level])
+
+    def contains(self, code: str, level: int) -> bool:
+        """code 所在的 level 级网格是否完全在集合内"""
+        other = CellSet.from_codes([code], level)
+        return bool(other) and (other - self) == CellSet()
+
+    # ---- 集合运算 ----
+
+    def _combine(self, other: 'CellSet', op) -> 'CellSet':
+        points = np.unique(np.concatenate([self.starts, self.ends, other.starts, other.ends]))
+        if len(points) < 2:
+            return CellSet()
+        left, right = points[:-1], points[1:]
+        keep = op(_contains(self.starts, self.ends, left), _contains(other.starts, other.ends, left))
+        starts, ends = left[keep], right[keep]
+        if not len(starts):
+            return CellSet()
+        breaks = starts[1:] != ends[:-1]
+        return CellSet._from_sorted(starts[np.concatenate([[True], breaks])],
+                                    ends[np.concatenate([breaks, [True]])])
+
+    def union(self, other: 'CellSet') -> 'CellSet':
+        if not other:
+            return self
+        return CellSet(np.concatenate([self.starts, other.starts]), np.concatenate([self.ends, other.ends]))
+
+    def intersection(self, other: 'CellSet') -> 'CellSet':
+        return self._combine(other, np.logical_and)
+
+    def difference(self, other: 'CellSet') -> 'CellSet':
+        return self._combine(other, lambda a, b: a & ~b)
+
+    __or__ = union
+    __and__ = intersection
+    __sub__ = difference
+
+    # ---- 紧凑表示与展开 ----
+
+    def _level_ranges(self):
+        """把区间分解为各级完整网格：逐级返回 (level, 网格键起点, 网格键终点) 数组"""
+        s, e = self.starts, self.ends
+        for level in range(1, MAX_LEVEL + 1):
+            span = _U(_SPAN[level])
+            first, last = (s + span - _U(1)) // span, e // span
+            if level == 1:
+                yield level, first, last
+                continue
+            # 去掉已由上一级网格覆盖的部分 [p0, p1)
+            parent_span, branch = _U(_SPAN[level - 1]), _U(_BRANCH[level])
+            p0 = (s + parent_span - _U(1)) // parent_span * branch
+            p1 = e // parent_span * branch
+            covered = p0 < p1
+            yield level, first, np.where(covered, p0, last)
+            yield level, np.where(covered, p1, last), last
+
+    def _cover_keys(self) -> Dict[int, np.ndarray]:
+        keys: Dict[int, List[np.ndarray]] = {}
+        for level, first, last in self._level_ranges():
+            cells = _range_keys(first, last)
+            if len(cells):
+                keys.setdefault(level, []).append(cells)
+        return {level: np.sort(np.concatenate(parts)) for level, parts in sorted(keys.items())}
+
+    def to_cover(self) -> Dict[int, List[str]]:
+        """最紧凑的多级网格表示 {级别: 33位编码列表}（第6级以下的网格高程码元为 0）"""
+        return {level: _codes_from_keys(keys, level) for level, keys in self._cover_keys().items()}
+
+    def expand(self, level: int) -> List[str]:
+        """展开为集合完全覆盖的全部 level 级网格编码（比 level 更细的部分不计入）"""
+        gh._check_level(level)
+        span = _U(_SPAN[level])
+        first, last = (self.starts + span - _U(1)) // span, self.ends // span
+        total = int(np.sum(np.where(last > first, last - first, _U(0)), dtype=np.float64))
+        if total > MAX_EXPAND_CELLS:
+            raise ValueError(f"展开后的网格数量过多: {total}")
+        return _codes_from_keys(_range_keys(first, last), level)
+
+    # ---- 持久化 ----
+
+    def save(self, path) -> None:
+        np.savez_compressed(path, starts=self.starts, ends=self.ends)
+
+    @classmethod
+    def load(cls, path) -> 'CellSet':
+        with np.load(path) as data:
+            return cls._from_sorted(data['starts'].astype(np.uint64), data['ends'].astype(np.uint64))
@@ -0,0 +1,130 @@
+# airspace_grid/grid_changes.py
+"""
+网格属性变更日志
+
+属性的每次写入追加一条 AttributeChange，序号单调递增（从 1 开始）。日志是有界的环形缓冲区：
+最多保留 capacity 条，且全部变更涉及的网格编码总数不超过 max_codes（批量写入一条变更可能带很多编码），
+超出时丢弃最早的变更；最新的一条总是保留。客户端记住收到的最后一个序号，之后只取该序号以后的变更，
+序号早于缓冲区（或晚于最新序号，如服务重启）时标记为 truncated，需要重新下载全部属性。
+
+批量写入按 (类别, 键) 各记一条，codes 为涉及的全部网格：取值相同时记在 value，
+逐个网格取值时 values 与 codes 一一对应。
+"""
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from itertools import islice
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+DEFAULT_CAPACITY = 10_000
+DEFAULT_MAX_CODES = 1_000_000
+
+# 变更类型
+UPDATE = 'update'     # 当前取值写入
+RECORD = 'record'     # 时间版本记录写入（valid_time / expires）
+REGION = 'region'     # 区域默认值（region 为区域范围，codes 为空；region.override 为真时区域内网格自己的取值被清除）
+REPLACE = 'replace'   # 网格的全部属性被替换（重新登记、导入单个网格）
+REMOVE = 'remove'     # 网格被删除
+RESET = 'reset'       # 全部属性被替换（from_json）
+
+
+@dataclass(frozen=True)
+class AttributeChange:
+    """一条属性变更"""
+    seq: int
+    timestamp: float
+    op: str
+    category: Optional[str] = None
+    key: Optional[str] = None
+    codes: Tuple[str, ...] = ()
+    value: Any = None
+    values: Optional[List[Any]] = None      # 逐个网格的取值，与 codes 对应
+    valid_time: Optional[float] = None
+    expires: Optional[float] = None
+    region: Optional[Dict[str, Any]] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = {'seq': self.seq, 'time': self.timestamp, 'op': self.op}
+        if self.category is not None:
+            data.update(category=self.category, key=self.key)
+        if self.op not in (REGION, RESET):
+            data['codes'] = list(self.codes)
+        if self.op in (UPDATE, RECORD, REGION):
+            if self.values is not None:
+                data['values'] = self.values
+            else:
+                data['value'] = self.value
+        if self.op == RECORD:
+            data['valid_time'] = self.valid_time
+            data['expires'] = self.expires if self.expires != float('inf') else None
+        if self.region is not None:
+            data['region'] = self.region
+        return data
+
+
+class AttributeChangeLog:
+    """有界环形缓冲区中的属性变更日志（按条数和编码总数限制），支持等待新变更（长轮询 / SSE）"""
+
+    def __init__(self, capacity: int = DEFAULT_CAPACITY, max_codes: int = DEFAULT_MAX_CODES):
+        if capacity < 1 or max_codes < 1:
+            raise ValueError(f"无效的日志容量: {capacity} / {max_codes}")
+        self.capacity = capacity
+        self.max_codes = max_codes
+        self._buffer: deque = deque()
+        self._codes = 0           # 缓冲区中的编码总数
+        self._seq = 0
+        self._cond = threading.Condition()
+
+    def __len__(self) -> int:
+        return len(self._buffer)
+
+    @property
+    def code_count(self) -> int:
+        """缓冲区中全部变更涉及的网格编码总数"""
+        return self._codes
+
+    @property
+    def latest(self) -> int:
+        """最新的序号（没有变更时为 0）"""
+        return self._seq
+
+    @property
+    def oldest(self) -> int:
+        """缓冲区中最早的序号（缓冲区为空时为 latest + 1）"""
+        return self._seq - len(self._buffer) + 1
+
+    def append(self, op: str, category: Optional[str] = None, key: Optional[str] = None,
+               codes: Sequence[str] = (), **fields) -> int:
+        """追加一条变更并唤醒等待者，返回其序号"""
+        codes = tuple(codes)
+        with self._cond:
+            self._seq += 1
+            self._buffer.append(AttributeChange(self._seq, time.time(), op, category, key, codes, **fields))
+            self._codes += len(codes)
+            while len(self._buffer) > 1 and (len(self._buffer) > self.capacity or self._codes > self.max_codes):
+                self._codes -= len(self._buffer.popleft().codes)
+            self._cond.notify_all()
+            return self._seq
+
+    def since(self, seq: int, limit: Optional[int] = None) -> Tuple[List[AttributeChange], bool]:
+        """
+        序号大于 seq 的变更（按序号升序，最多 limit 条）
+
+        Returns:
+            (变更列表, truncated)：truncated 为 True 时 seq 之后的部分变更已不在缓冲区中
+            （或 seq 晚于最新序号），客户端需要重新下载全部属性
+        """
+        if limit is not None and limit < 1:
+            raise ValueError(f"无效的条数: {limit}")
+        with self._cond:
+            truncated = seq < self.oldest - 1 or seq > self._seq
+            count = self._seq - max(seq, self.oldest - 1) if seq <= self._seq else 0
+            # 新变更在缓冲区尾部，从尾部取 O(count)
+            changes = list(islice(reversed(self._buffer), count))[::-1]
+        return (changes[:limit] if limit is not None else changes), truncated
+
+    def wait(self, seq: int, timeout: Optional[float] = None) -> bool:
+        """等待直到有序号大于 seq 的变更（或超时），返回是否有新变更；seq 晚于最新序号时立即返回 True（见 since）"""
+        with self._cond:
+            return self._cond.wait_for(lambda: self._seq != seq, timeout)
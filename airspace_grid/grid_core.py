@@ -1,7 +1,7 @@
 # airspace_grid/grid_core.py
 import sys
 import math
-from typing import List, Dict, Tuple
+from typing import List, Dict, Optional, Tuple
 from dataclasses import dataclass
 from decimal import Decimal, getcontext
 import re
@@ -34,6 +34,26 @@ class GridCell:
 
 class GridGenerator:
     """网格生成器"""
+
+    # 网格参数配置
+    GRID_LEVELS = [
+        {'level': 1, 'lon_deg': 6.0, 'lat_deg': 4.0, 'approx_lon': 768, 'approx_lat': 512, 'unit': 'km'},
+        {'level': 2, 'lon_deg': 3.0, 'lat_deg': 2.0, 'approx_lon': 384, 'approx_lat': 256, 'unit': 'km'},
+        {'level': 3, 'lon_deg': 0.5, 'lat_deg': 0.5, 'approx_lon': 55.66, 'approx_lat': 55.66, 'unit': 'km'},
+        {'level': 4, 'lon_deg': 0.25, 'lat_deg': 1/6, 'approx_lon': 27.83, 'approx_lat': 18.55, 'unit': 'km'},
+        {'level': 5, 'lon_deg': 1/12, 'lat_deg': 1/12, 'approx_lon': 9.27, 'approx_lat': 9.27, 'unit': 'km'},
+        {'level': 6, 'lon_deg': 1/60, 'lat_deg': 1/60, 'approx_lon': 1.85, 'approx_lat': 1.85, 'unit': 'km'},
+        {'level': 7, 'lon_deg': 1/300, 'lat_deg': 1/300, 'approx_lon': 0.37106, 'approx_lat': 0.37106, 'unit': 'km'},
+        {'level': 8, 'lon_deg': 1/900, 'lat_deg': 1/900, 'approx_lon': 0.12369, 'approx_lat': 0.12369, 'unit': 'km'},
+        {'level': 9, 'lon_deg': 1/1800, 'lat_deg': 1/1800, 'approx_lon': 0.06184, 'approx_lat': 0.06184, 'unit': 'km'},
+        {'level': 10, 'lon_deg': 1/3600, 'lat_deg': 1/3600, 'approx_lon': 0.0309, 'approx_lat': 0.0309, 'unit': 'km'},
+        {'level': 11, 'lon_deg': 1/7200, 'lat_deg': 1/7200, 'approx_lon': 0.01546, 'approx_lat': 0.01546, 'unit': 'km'},
+        {'level': 12, 'lon_deg': 1/14400, 'lat_deg': 1/14400, 'approx_lon': 0.00773, 'approx_lat': 0.00773, 'unit': 'km'},
+        {'level': 13, 'lon_deg': 1/28800, 'lat_deg': 1/28800, 'approx_lon': 0.00386, 'approx_lat': 0.00386, 'unit': 'km'},
+        {'level': 14, 'lon_deg': 1/57600, 'lat_deg': 1/57600, 'approx_lon': 0.00193, 'approx_lat': 0.00193, 'unit': 'km'},
+        {'level': 15, 'lon_deg': 1/115200, 'lat_deg': 1/115200, 'approx_lon': 0.00097, 'approx_lat': 0.00097, 'unit': 'km'},
+        {'level': 16, 'lon_deg': 1/230400, 'lat_deg': 1/230400, 'approx_lon': 0.00048, 'approx_lat': 0.00048, 'unit': 'km'}
+    ]
     
     @classmethod
     def generate_starts(cls, min_val: float, max_val: float, step: float) -> List[float]:
@@ -57,29 +77,17 @@ class GridGenerator:
     def get_grids(cls, lon_min: float, lon_max: float,
                  lat_min: float, lat_max: float,
                  level_max: int, 
-                 alt_min: float = 0.0, alt_max: float = 1000) -> List[GridCell]:
-        # 网格参数配置
-        grid_levels = [
-            {'level': 1, 'lon_deg': 6.0, 'lat_deg': 4.0, 'approx_lon': 768, 'approx_lat': 512, 'unit': 'km'},
-            {'level': 2, 'lon_deg': 3.0, 'lat_deg': 2.0, 'approx_lon': 384, 'approx_lat': 256, 'unit': 'km'},
-            {'level': 3, 'lon_deg': 0.5, 'lat_deg': 0.5, 'approx_lon': 55.66, 'approx_lat': 55.66, 'unit': 'km'},
-            {'level': 4, 'lon_deg': 0.25, 'lat_deg': 1/6, 'approx_lon': 27.83, 'approx_lat': 18.55, 'unit': 'km'},
-            {'level': 5, 'lon_deg': 1/12, 'lat_deg': 1/12, 'approx_lon': 9.27, 'approx_lat': 9.27, 'unit': 'km'},
-            {'level': 6, 'lon_deg': 1/60, 'lat_deg': 1/60, 'approx_lon': 1.85, 'approx_lat': 1.85, 'unit': 'km'},
-            {'level': 7, 'lon_deg': 1/300, 'lat_deg': 1/300, 'approx_lon': 0.37106, 'approx_lat': 0.37106, 'unit': 'km'},
-            {'level': 8, 'lon_deg': 1/900, 'lat_deg': 1/900, 'approx_lon': 0.12369, 'approx_lat': 0.12369, 'unit': 'km'},
-            {'level': 9, 'lon_deg': 1/1800, 'lat_deg': 1/1800, 'approx_lon': 0.06184, 'approx_lat': 0.06184, 'unit': 'km'},
-            {'level': 10, 'lon_deg': 1/3600, 'lat_deg': 1/3600, 'approx_lon': 0.0309, 'approx_lat': 0.0309, 'unit': 'km'},
-            {'level': 11, 'lon_deg': 1/7200, 'lat_deg': 1/7200, 'approx_lon': 0.01546, 'approx_lat': 0.01546, 'unit': 'km'},
-            {'level': 12, 'lon_deg': 1/14400, 'lat_deg': 1/14400, 'approx_lon': 0.00773, 'approx_lat': 0.00773, 'unit': 'km'},
-            {'level': 13, 'lon_deg': 1/28800, 'lat_deg': 1/28800, 'approx_lon': 0.00386, 'approx_lat': 0.00386, 'unit': 'km'},
-            {'level': 14, 'lon_deg': 1/57600, 'lat_deg': 1/57600, 'approx_lon': 0.00193, 'approx_lat': 0.00193, 'unit': 'km'},
-            {'level': 15, 'lon_deg': 1/115200, 'lat_deg': 1/115200, 'approx_lon': 0.00097, 'approx_lat': 0.00097, 'unit': 'km'},
-            {'level': 16, 'lon_deg': 1/230400, 'lat_deg': 1/230400, 'approx_lon': 0.00048, 'approx_lat': 0.00048, 'unit': 'km'}
-        ]
+                 alt_min: float = 0.0, alt_max: float = 1000,
+                 order: Optional[str] = None) -> List[GridCell]:
+        """
+        生成区域内的网格
+
+        order 为 'morton' / 'hilbert' 时按空间填充曲线（经度、纬度、高度层索引）排序输出，
+        并把网格的全球 Morton 键（grid_sfc.grid_keys）写入 cellid；默认按经度、纬度循环的顺序。
+        """
         
         all_grids = []
-        for level_info in [x for x in grid_levels if x['level'] == level_max]:
+        for level_info in [x for x in cls.GRID_LEVELS if x['level'] == level_max]:
             lon_step = level_info['lon_deg']
             lat_step = level_info['lat_deg']
             
@@ -114,4 +122,18 @@ class GridGenerator:
                     else:
                         base_grid.code = encode_grid(center_lon,center_lat,height=alt_min)
                         all_grids.append(base_grid)
+        if order is not None:
+            all_grids = cls.sort_grids(all_grids, level_max, order)
         return all_grids
+
+    @staticmethod
+    def sort_grids(grids: List[GridCell], level: int, order: str = 'morton') -> List[GridCell]:
+        """按空间填充曲线排序网格，并以全球 Morton 键作为 cellid"""
+        from .grid_sfc import grid_keys, sort_order
+        lons = [g.center[0] for g in grids]
+        lats = [g.center[1] for g in grids]
+        alts = [(g.alt_range[0] + g.alt_range[1]) / 2 for g in grids]
+        keys = grid_keys(lons, lats, alts, level).tolist()
+        for grid, key in zip(grids, keys):
+            grid.cellid = key
+        return [grids[i] for i in sort_order(lons, lats, alts, level, order)]
@@ -5,12 +5,23 @@ import math
 from decimal import Decimal, getcontext
 from dataclasses import dataclass
 
+try:
+    import numpy as np
+except ImportError:  # 批量编码需要 numpy，缺失时逐点编码
+    np = None
+
 # 设置足够精度处理小数
 getcontext().prec = 24
 
 MAX_ELEVATION = 1000  # 最大高程1000米
 ELEVATION_BITS = 6   # 高程编码位数
 
+# 第五级纬度方向：10'（1/6°）网格内按 5'（1/12°）分上下两行。
+# 早期版本使用近似值 0.1667 / 0.0833，约 5% 的纬度（每个 10' 带中靠近行边界的部分）第五级行号与
+# 第四级父网格不一致，改为精确值后这些位置的编码（第9位码元起）发生变化，见 README_API.md「编码变更」
+L5_LAT_PERIOD = 1 / 6
+L5_LAT_STEP = 1 / 12
+
 class Hemisphere(Enum):
     NORTH = "North"
     SOUTH = "South"
@@ -199,13 +210,13 @@ class GridEncoder:
         Returns:
             第五级网格编码（0~5）
         """
-        # 1. 计算当前经纬度在第五级网格内的余数（5'≈0.0833°）
+        # 1. 计算当前经纬度在第五级网格内的余数（5'=1/12°）
         lon_remain = abs(lon) % 0.25  # 在15'网格内再分3份
-        lat_remain = abs(lat) % 0.1667  # 在10'网格内再分2份
+        lat_remain = abs(lat) % L5_LAT_PERIOD  # 在10'网格内再分2份
         
         # 2. 转换为行列索引
         col = int(lon_remain // (0.25/3))  # 经度方向（0=左, 1=中, 2=右）
-        row = 0 if lat_remain < 0.0833 else 1  # 纬度方向（0=上, 1=下）
+        row = 0 if lat_remain < L5_LAT_STEP else 1  # 纬度方向（0=上, 1=下）
         
         # 3. 根据半球选择Z序表
         if lon < 0 and lat >= 0:    # 西北半球（NW）
@@ -714,4 +725,151 @@ def encode_grid(lon: float, lat: float, height: float = 0, level: int = 6) -> st
     return encoder.generate_code(lon, lat, height, level)
 
 
+# 批量编码使用的Z序表，按象限 [NW, NE, SW, SE] 排列，与各级 encode_levelN 中的表一致
+_Z_TABLE_L4 = [
+    [[5, 4], [3, 2], [1, 0]],
+    [[4, 5], [2, 3], [0, 1]],
+    [[1, 0], [3, 2], [5, 4]],
+    [[0, 1], [2, 3], [4, 5]],
+]
+_Z_TABLE_L5 = [
+    [[5, 3, 4], [2, 1, 0]],
+    [[3, 5, 4], [0, 1, 2]],
+    [[2, 0, 1], [5, 3, 4]],
+    [[0, 2, 1], [3, 5, 4]],
+]
+_Z_TABLE_L8 = [
+    [[8, 6, 7], [5, 4, 3], [2, 1, 0]],
+    [[6, 8, 7], [3, 4, 5], [0, 1, 2]],
+    [[2, 0, 1], [5, 4, 3], [8, 6, 7]],
+    [[0, 2, 1], [3, 4, 5], [6, 8, 7]],
+]
+_Z_TABLE_2X2 = [
+    [[3, 2], [1, 0]],
+    [[2, 3], [0, 1]],
+    [[1, 0], [3, 2]],
+    [[0, 1], [2, 3]],
+]
+# 第九~十六级：(上一级网格边长, 本级网格边长)，单位度
+_LEVEL_2X2_SIZES = [
+    (4/3600, 2/3600), (2/3600, 1/3600), (1/3600, 0.5/3600), (0.5/3600, 0.25/3600),
+    (0.25/3600, 0.125/3600), (0.125/3600, 0.0625/3600), (0.0625/3600, 0.03125/3600),
+    (0.03125/3600, 0.015625/3600),
+]
+# 高程码元在最终编码中的位置（与 generate_code 中逐个插入的结果一致）
+_ELEV_POSITIONS = [12, 15, 17, 19, 21, 23, 25, 27, 29, 31, 32]
+
+
+def encode_grid_batch(lons, lats, heights=0, level: int = 6) -> List[str]:
+    """批量编码，结果与逐点调用 encode_grid 完全一致
+
+    Args:
+        lons: 经度数组
+        lats: 纬度数组
+        heights: 高程数组或单个高程
+        level: 网格级别（≥6 时包含高程码元）
+
+    Returns:
+        网格编码列表
+    """
+    if np is None:
+        lons, lats = list(lons), list(lats)
+        if not hasattr(heights, '__len__'):
+            heights = [heights] * len(lons)
+        return [encode_grid(lon, lat, h, level) for lon, lat, h in zip(lons, lats, heights)]
+
+    lon = np.asarray(lons, dtype=np.float64).ravel()
+    lat = np.asarray(lats, dtype=np.float64).ravel()
+    height = np.broadcast_to(np.asarray(heights), lon.shape)
+    n = len(lon)
+    if n == 0:
+        return []
+
+    alon, alat = np.abs(lon), np.abs(lat)
+    west, north = lon < 0, lat >= 0
+    # 象限索引：NW=0, NE=1, SW=2, SE=3
+    quad = np.where(north, np.where(west, 0, 1), np.where(west, 2, 3))
+    digits = []  # 除半球、经度区号、纬度区号外的各码元
+
+    # 第一级
+    lon1 = np.where(lon == 180, -180.0, lon)
+    zone = np.floor_divide(lon1 + 180, 6).astype(np.int64) + 1
+    lat_char = np.where(alat == 90, 22, np.floor_divide(alat, 4)).astype(np.int64)
+
+    # 第二级
+    lon_par = np.floor_divide(alon, 3).astype(np.int64) % 2
+    lat_par = np.floor_divide(alat, 2).astype(np.int64) % 2
+    digits.append(np.where(north, lat_par, 1 - lat_par) * 2 + np.where(west, lon_par, 1 - lon_par))
+
+    # 第三级
+    col = np.floor_divide(alon % 3, 0.5).astype(np.int64)
+    row = np.floor_divide(alat % 2, 0.5).astype(np.int64)
+    digits.append(np.where(west, 5 - col, col))
+    digits.append(np.where(north, 3 - row, row))
+
+    invalid = np.zeros(n, dtype=bool)
+
+    def lookup(table, row, col):
+        table = np.asarray(table)
+        bad = (row < 0) | (row >= table.shape[1]) | (col < 0) | (col >= table.shape[2])
+        invalid[bad] = True
+        return table[quad, np.clip(row, 0, table.shape[1] - 1), np.clip(col, 0, table.shape[2] - 1)]
+
+    # 第四级
+    col = np.where(alon % 0.5 < 0.25, 0, 1)
+    row = np.floor_divide(alat % 0.5, 1/6).astype(np.int64)
+    digits.append(lookup(_Z_TABLE_L4, row, col))
+
+    # 第五级
+    col = np.floor_divide(alon % 0.25, 0.25/3).astype(np.int64)
+    row = np.where(alat % L5_LAT_PERIOD < L5_LAT_STEP, 0, 1)
+    digits.append(lookup(_Z_TABLE_L5, row, col))
+
+    # 第六、七级
+    for cell, sub in ((5/60, 1/60), (1/60, 12/3600)):
+        col = np.floor_divide(alon % cell, sub).astype(np.int64)
+        row = np.floor_divide(alat % cell, sub).astype(np.int64)
+        digits.append(np.where(west, 4 - col, col))
+        digits.append(np.where(north, 4 - row, row))
+
+    # 第八级
+    col = np.floor_divide(alon % (12/3600), 4/3600).astype(np.int64)
+    row = np.floor_divide(alat % (12/3600), 4/3600).astype(np.int64)
+    digits.append(lookup(_Z_TABLE_L8, row, col))
+
+    # 第九~十六级
+    for cell, half in _LEVEL_2X2_SIZES:
+        col = np.where(alon % cell < half, 0, 1)
+        row = np.where(alat % cell < half, 0, 1)
+        digits.append(lookup(_Z_TABLE_2X2, row, col))
+
+    digits = np.stack(digits, axis=1)
+    invalid |= (digits < 0).any(axis=1) | (digits > 9).any(axis=1)
+    invalid |= (zone < 1) | (zone > 99) | (lat_char < 0) | (lat_char > 25)
+    invalid |= ~(np.isfinite(lon) & np.isfinite(lat))
+
+    # 组装为 ASCII 字节矩阵（22 个平面码元）
+    chars = np.empty((n, 22), dtype=np.uint8)
+    chars[:, 0] = np.where(north, ord('N'), ord('S'))
+    chars[:, 1] = ord('0') + np.clip(zone, 0, 99) // 10
+    chars[:, 2] = ord('0') + np.clip(zone, 0, 99) % 10
+    chars[:, 3] = ord('A') + np.clip(lat_char, 0, 25)
+    chars[:, 4:] = ord('0') + np.clip(digits, 0, 9)
+
+    if level >= 6:
+        # 相同高程只编码一次
+        unique_heights, inverse = np.unique(height, return_inverse=True)
+        elev = np.array([[ord(c) for c in GridEncoder.encode_elevation(h.item())] for h in unique_heights],
+                        dtype=np.uint8).reshape(len(unique_heights), 11)
+        full = np.empty((n, 33), dtype=np.uint8)
+        plane_positions = [i for i in range(33) if i not in _ELEV_POSITIONS]
+        full[:, plane_positions] = chars
+        full[:, _ELEV_POSITIONS] = elev[inverse.ravel()]
+        chars = full
+
+    codes = chars.view(f'S{chars.shape[1]}').ravel().astype(str).tolist()
+    # 边界外等特殊输入交给逐点编码，保证结果（或异常）与 encode_grid 一致
+    for i in np.flatnonzero(invalid):
+        codes[i] = encode_grid(float(lon[i]), float(lat[i]), height[i].item(), level)
+    return codes
 
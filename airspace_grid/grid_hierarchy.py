@@ -0,0 +1,400 @@
+# airspace_grid/grid_hierarchy.py
+"""
+纯编码运算的网格层级操作：父网格、子网格、邻居、k 环
+
+编码总是包含全部 16 级平面码元，本身不记录网格级别，因此各操作都需要给出级别。
+某一级网格的“规范编码”为：该级及以上的码元 + 网格精确中心在更细各级的码元
+（偶数细分时中心落在子网格边界上，取序号较大的一侧）。更细各级的码元只与级别有关，
+可按象限预先算好：父/子网格只需替换码元，邻居在整数网格索引上运算再按 Z 序表拼回码元，
+都不经过经纬度几何。高程码元保持不变；垂直邻居按 GridGenerator 的高度分层
+（1000 / 2^(level - 5) 米）取相邻层中心的高程码元。
+
+判断两个编码是否属于同一网格应比较 grid_index.cell_index，而不是比较字符串。
+
+批量函数（*_batch）以 numpy 数组整体运算；单个编码的函数是批量函数的简单封装。
+"""
+from fractions import Fraction
+from functools import lru_cache
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .grid_encode import (GridEncoder, _ELEV_POSITIONS, _Z_TABLE_2X2, _Z_TABLE_L4,
+                          _Z_TABLE_L5, _Z_TABLE_L8)
+from .grid_index import (FULL_CODE_LENGTH, LAT_BANDS, LAT_CELL_SIZE, LAT_RADIX, LON_CELL_SIZE, LON_RADIX,
+                         MAX_LEVEL, NE, NW, PLANE_CODE_LENGTH, SE, SW)
+
+# 33位编码中平面码元的位置
+_PLANE_POSITIONS = [i for i in range(FULL_CODE_LENGTH) if i not in _ELEV_POSITIONS]
+
+# 各级码元在22位平面编码中的位置（第1级为 [0:4]）
+_LEVEL_POSITIONS = {2: [4], 3: [5, 6], 4: [7], 5: [8], 6: [9, 10], 7: [11, 12], 8: [13]}
+_LEVEL_POSITIONS.update({lv: [lv + 5] for lv in range(9, MAX_LEVEL + 1)})
+
+# Z序表 [象限, 行, 列] -> 码元，以及反查表 [象限, 码元] -> (行, 列)
+_Z_TABLES = {4: np.array(_Z_TABLE_L4), 5: np.array(_Z_TABLE_L5), 8: np.array(_Z_TABLE_L8),
+             2: np.array(_Z_TABLE_2X2)}
+
+
+def _inverse_table(table):
+    inv = np.full((4, 10, 2), -1, dtype=np.int64)
+    for q in range(4):
+        for r in range(table.shape[1]):
+            for c in range(table.shape[2]):
+                inv[q, table[q, r, c]] = (r, c)
+    return inv
+
+
+_Z_INVERSE = {k: _inverse_table(v) for k, v in _Z_TABLES.items()}
+
+# 各级每个象限内经纬方向的网格数（第1级纬度方向为字母 A~W）
+LON_CELLS = [None] + [round(180 / s) for s in LON_CELL_SIZE[1:]]
+LAT_CELLS = [None, LAT_BANDS] + [LAT_BANDS * int(np.prod([LAT_RADIX[k] for k in range(2, lv + 1)]))
+                                 for lv in range(2, MAX_LEVEL + 1)]
+
+
+@lru_cache(maxsize=None)
+def _center_path(level: int) -> Tuple[Tuple[int, int], ...]:
+    """level 级网格精确中心在更细各级的 (列, 行)，与具体网格无关"""
+    path = []
+    fx = fy = Fraction(1, 2)
+    for lv in range(level + 1, MAX_LEVEL + 1):
+        col, row = int(fx * LON_RADIX[lv]), int(fy * LAT_RADIX[lv])
+        fx, fy = fx * LON_RADIX[lv] - col, fy * LAT_RADIX[lv] - row
+        path.append((col, row))
+    return tuple(path)
+
+
+@lru_cache(maxsize=None)
+def _elevation_digits(level: int, layer: int) -> bytes:
+    """level 级第 layer 个高度层中心的11位高程码元"""
+    step = 1000 / 2 ** (level - 5)
+    return GridEncoder.encode_elevation(round((layer + 0.5) * step, 9)).encode('ascii')
+
+
+def _check_level(level: int) -> None:
+    if not 1 <= level <= MAX_LEVEL:
+        raise ValueError(f"无效的网格级别: {level}")
+
+
+def _to_array(codes: Sequence[str]) -> np.ndarray:
+    """编码列表 -> (n, 22 或 33) 的 uint8 字符数组"""
+    codes = list(codes)
+    if not codes:
+        return np.zeros((0, PLANE_CODE_LENGTH), dtype=np.uint8)
+    length = len(codes[0])
+    if length not in (PLANE_CODE_LENGTH, FULL_CODE_LENGTH):
+        raise ValueError(f"无效的网格编码长度: {length}")
+    raw = ''.join(codes).encode('ascii')
+    if len(raw) != length * len(codes):
+        raise ValueError("批量编码的长度必须一致")
+    return np.frombuffer(raw, dtype=np.uint8).reshape(len(codes), length)
+
+
+def _to_codes(arr: np.ndarray) -> List[str]:
+    raw = arr.astype(np.uint8).tobytes().decode('ascii')
+    width = arr.shape[1]
+    return [raw[i:i + width] for i in range(0, len(raw), width)]
+
+
+def _split(arr: np.ndarray) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+    """字符数组 -> (平面码元, 高程码元或 None)"""
+    if arr.shape[1] == FULL_CODE_LENGTH:
+        return arr[:, _PLANE_POSITIONS], arr[:, _ELEV_POSITIONS]
+    return arr, None
+
+
+def _join(plane: np.ndarray, elev: Optional[np.ndarray]) -> np.ndarray:
+    if elev is None:
+        return plane
+    full = np.empty((len(plane), FULL_CODE_LENGTH), dtype=np.uint8)
+    full[:, _PLANE_POSITIONS] = plane
+    full[:, _ELEV_POSITIONS] = elev
+    return full
+
+
+def _plane_to_index(plane: np.ndarray, level: int, strict: bool = True):
+    """平面码元数组 -> (象限, ax, ay) 数组，与 grid_index.cell_index 一致
+
+    strict 为 False 时不因无效编码报错，而是额外返回有效标记数组（无效行的索引无意义）
+    """
+    north = plane[:, 0] == ord('N')
+    zone = (plane[:, 1].astype(np.int64) - 48) * 10 + plane[:, 2] - 48
+    west = zone <= 30
+    quad = np.where(north, np.where(west, NW, NE), np.where(west, SW, SE))
+    ax = np.where(west, 30 - zone, zone - 31)
+    ay = plane[:, 3].astype(np.int64) - ord('A')
+    digits = plane.astype(np.int64) - 48
+    valid = ((plane[:, 0] == ord('N')) | (plane[:, 0] == ord('S'))) & (zone >= 1) & (zone <= 60) \
+        & (ay >= 0) & (ay < LAT_CELLS[1])
+
+    for lv in range(2, level + 1):
+        pos = _LEVEL_POSITIONS[lv]
+        d = digits[:, pos[0]]
+        if lv == 2:
+            hi, lo = d // 2, d % 2
+            col, row = np.where(west, lo, 1 - lo), np.where(north, hi, 1 - hi)
+            valid &= (d >= 0) & (d < 4)
+        elif len(pos) == 2:
+            c, r = d, digits[:, pos[1]]
+            cmax, rmax = LON_RADIX[lv] - 1, LAT_RADIX[lv] - 1
+            col, row = np.where(west, cmax - c, c), np.where(north, rmax - r, r)
+            valid &= (c >= 0) & (c <= cmax) & (r >= 0) & (r <= rmax)
+        else:
+            inv = _Z_INVERSE[lv if lv in (4, 5, 8) else 2]
+            rc = inv[quad, np.clip(d, 0, 9)]
+            row, col = rc[:, 0], rc[:, 1]
+            valid &= (d >= 0) & (d <= 9) & (row >= 0)
+        ax = ax * LON_RADIX[lv] + col
+        ay = ay * LAT_RADIX[lv] + row
+    if not strict:
+        return quad, ax, ay, valid
+    if not valid.all():
+        raise ValueError("无效的网格编码")
+    return quad, ax, ay
+
+
+def _index_to_plane(quad, ax, ay, level: int) -> np.ndarray:
+    """(象限, ax, ay) 数组 -> 22位平面码元数组，比 level 更细的各级取网格中心"""
+    n = len(quad)
+    quad = np.asarray(quad, dtype=np.int64)
+    west = (quad == NW) | (quad == SW)
+    north = (quad == NW) | (quad == NE)
+    cols, rows = {}, {}
+    ax, ay = np.asarray(ax, dtype=np.int64), np.asarray(ay, dtype=np.int64)
+    for lv in range(level, 1, -1):
+        ax, cols[lv] = np.divmod(ax, LON_RADIX[lv])
+        ay, rows[lv] = np.divmod(ay, LAT_RADIX[lv])
+    for lv, (col, row) in zip(range(level + 1, MAX_LEVEL + 1), _center_path(level)):
+        cols[lv], rows[lv] = np.full(n, col), np.full(n, row)
+
+    plane = np.empty((n, PLANE_CODE_LENGTH), dtype=np.int64)
+    plane[:, 0] = np.where(north, ord('N'), ord('S'))
+    zone = np.where(west, 30 - ax, ax + 31)
+    plane[:, 1], plane[:, 2] = zone // 10 + 48, zone % 10 + 48
+    plane[:, 3] = ay + ord('A')
+    for lv in range(2, MAX_LEVEL + 1):
+        col, row = cols[lv], rows[lv]
+        pos = _LEVEL_POSITIONS[lv]
+        if lv == 2:
+            d = np.where(north, row, 1 - row) * 2 + np.where(west, col, 1 - col)
+            plane[:, pos[0]] = d + 48
+        elif len(pos) == 2:
+            cmax, rmax = LON_RADIX[lv] - 1, LAT_RADIX[lv] - 1
+            plane[:, pos[0]] = np.where(west, cmax - col, col) + 48
+            plane[:, pos[1]] = np.where(north, rmax - row, row) + 48
+        else:
+            table = _Z_TABLES[lv if lv in (4, 5, 8) else 2]
+            plane[:, pos[0]] = table[quad, row, col] + 48
+    return plane.astype(np.uint8)
+
+
+def _normalize(quad, ax, ay, level: int):
+    """越过本初子午线、赤道或180°经线的索引换算到相邻象限；越过极点的返回 valid=False"""
+    quad = np.asarray(quad, dtype=np.int64)
+    west = (quad == NW) | (quad == SW)
+    north = (quad == NW) | (quad == NE)
+    n_lon = LON_CELLS[level]
+
+    cross = ax < 0                       # 本初子午线
+    ax = np.where(cross, -ax - 1, ax)
+    west = west ^ cross
+    cross = ax >= n_lon                  # 180°经线
+    ax = np.where(cross, 2 * n_lon - 1 - ax, ax)
+    west = west ^ cross
+    cross = ay < 0                       # 赤道
+    ay = np.where(cross, -ay - 1, ay)
+    north = north ^ cross
+
+    valid = (ay < LAT_CELLS[level]) & (ay * LAT_CELL_SIZE[level] < 90)
+    quad = np.where(north, np.where(west, NW, NE), np.where(west, SW, SE))
+    return quad, ax, ay, valid
+
+
+def index_to_codes(quad, ax, ay, level: int, elevation: Optional[np.ndarray] = None) -> List[str]:
+    """网格索引数组 -> 规范编码列表
+
+    Args:
+        quad, ax, ay: 象限与网格索引数组
+        level: 网格级别
+        elevation: (n, 11) 高程码元数组（uint8 字符），为 None 时返回22位平面编码
+
+    Returns:
+        编码列表
+    """
+    _check_level(level)
+    return _to_codes(_join(_index_to_plane(quad, ax, ay, level), elevation))
+
+
+def codes_to_index(codes: Sequence[str], level: int, return_valid: bool = False):
+    """编码列表 -> (象限, ax, ay) 数组，与逐个调用 grid_index.cell_index 一致
+
+    return_valid 为 True 时码元无效的编码不报错，返回 (象限, ax, ay, 有效标记)；
+    编码长度仍须一致且为 22 或 33 位
+    """
+    _check_level(level)
+    plane, _ = _split(_to_array(codes))
+    return _plane_to_index(plane, level, strict=not return_valid)
+
+
+def cell_center_batch(quad, ax, ay, level: int) -> Tuple[np.ndarray, np.ndarray]:
+    """网格索引数组 -> 中心经纬度数组，与逐个调用 grid_index.cell_center 一致"""
+    lon = (np.asarray(ax) + 0.5) * LON_CELL_SIZE[level]
+    lat = (np.asarray(ay) + 0.5) * LAT_CELL_SIZE[level]
+    quad = np.asarray(quad)
+    return (np.where((quad == NW) | (quad == SW), -lon, lon),
+            np.where((quad == NW) | (quad == NE), lat, -lat))
+
+
+def elevation_batch(codes: Sequence[str]) -> np.ndarray:
+    """33位编码列表 -> 高程数组（米），与逐个调用 grid_index.elevation_of 一致；高程码元无效时为 nan"""
+    arr = _to_array(codes)
+    if len(arr) and arr.shape[1] != FULL_CODE_LENGTH:
+        raise ValueError("编码不含高程码元")
+    digits = arr[:, _ELEV_POSITIONS].astype(np.int64) - 48
+    weights = 10 ** np.arange(len(_ELEV_POSITIONS) - 1, -1, -1, dtype=np.int64)
+    elev = (digits @ weights) / 10**8
+    return np.where(((digits >= 0) & (digits <= 9)).all(axis=1), elev, np.nan)
+
+
+@lru_cache(maxsize=None)
+def _finer_digits(level: int, length: int):
+    """比 level 更细的各级码元在长度为 length 的编码中的位置，及各象限对应的规范码元 (4, m)"""
+    plane_positions = [p for lv in range(level + 1, MAX_LEVEL + 1) for p in _LEVEL_POSITIONS[lv]]
+    quads = np.arange(4)
+    digits = _index_to_plane(quads, np.zeros(4, dtype=np.int64), np.zeros(4, dtype=np.int64), level)
+    positions = plane_positions if length == PLANE_CODE_LENGTH else [_PLANE_POSITIONS[p] for p in plane_positions]
+    return np.array(positions, dtype=np.int64), digits[:, plane_positions]
+
+
+@lru_cache(maxsize=None)
+def _child_digits(level: int):
+    """level 级的全部码元取值（每个子网格一行），按码元顺序排列"""
+    pos = _LEVEL_POSITIONS[level]
+    if level == 2:
+        values = [(d,) for d in range(4)]
+    elif len(pos) == 2:
+        values = [(c, r) for r in range(LAT_RADIX[level]) for c in range(LON_RADIX[level])]
+    else:
+        values = [(d,) for d in range(LON_RADIX[level] * LAT_RADIX[level])]
+    return np.array(values, dtype=np.uint8) + 48
+
+
+def _quad_of(arr: np.ndarray) -> np.ndarray:
+    north = arr[:, 0] == ord('N')
+    zone = (arr[:, 1].astype(np.int64) - 48) * 10 + arr[:, 2] - 48
+    if not ((north | (arr[:, 0] == ord('S'))) & (zone >= 1) & (zone <= 60)).all():
+        raise ValueError("无效的网格编码")
+    west = zone <= 30
+    return np.where(north, np.where(west, NW, NE), np.where(west, SW, SE))
+
+
+def parent_batch(codes: Sequence[str], level: int) -> List[str]:
+    """批量求 level 级祖先网格的规范编码：更细各级码元替换为该象限的中心码元，高程码元不变"""
+    _check_level(level)
+    arr = _to_array(codes).copy()
+    positions, digits = _finer_digits(level, arr.shape[1])
+    if len(positions):
+        arr[:, positions] = digits[_quad_of(arr)]
+    return _to_codes(arr)
+
+
+def children_batch(codes: Sequence[str], level: int) -> List[List[str]]:
+    """批量求 level 级网格的全部 level + 1 级子网格（按子网格码元顺序）"""
+    _check_level(level)
+    if level >= MAX_LEVEL:
+        raise ValueError("第16级网格没有子网格")
+    arr = _to_array(codes)
+    n, length = arr.shape
+    values = _child_digits(level + 1)
+    per = len(values)
+    plane_pos = _LEVEL_POSITIONS[level + 1]
+    child_pos = plane_pos if length == PLANE_CODE_LENGTH else [_PLANE_POSITIONS[p] for p in plane_pos]
+    positions, digits = _finer_digits(level + 1, length)
+
+    out = np.repeat(arr, per, axis=0)
+    out[:, child_pos] = np.tile(values, (n, 1))
+    if len(positions):
+        out[:, positions] = np.repeat(digits[_quad_of(arr)], per, axis=0)
+    flat = _to_codes(out)
+    return [flat[i:i + per] for i in range(0, len(flat), per)]
+
+
+def _layer_of(elev: np.ndarray, level: int) -> np.ndarray:
+    value = np.zeros(len(elev), dtype=np.int64)
+    for k in range(elev.shape[1]):
+        value = value * 10 + (elev[:, k].astype(np.int64) - 48)
+    step = 1000 / 2 ** (level - 5)
+    return np.floor(value / 1e8 / step).astype(np.int64)
+
+
+def _offset_codes(plane, elev, level, offsets):
+    """对每个编码按 (dx, dy, dz) 偏移列表求相邻网格，返回按编码分组的列表（无效位置省略）"""
+    quad, ax, ay = _plane_to_index(plane, level)
+    n, m = len(quad), len(offsets)
+    off = np.array(offsets, dtype=np.int64).reshape(m, 3)
+    nq, nx, ny, valid = _normalize(np.repeat(quad, m), (ax[:, None] + off[None, :, 0]).ravel(),
+                                   (ay[:, None] + off[None, :, 1]).ravel(), level)
+    result_elev = None
+    if elev is not None:
+        result_elev = np.repeat(elev, m, axis=0)
+        dz = np.tile(off[:, 2], n)
+        if (dz != 0).any():
+            layers = np.repeat(_layer_of(elev, level), m) + dz
+            valid &= (layers >= 0) & (layers < 2 ** (level - 5))
+            moved = np.flatnonzero((dz != 0) & valid)
+            if len(moved):
+                result_elev[moved] = np.frombuffer(
+                    b''.join(_elevation_digits(level, int(k)) for k in layers[moved]),
+                    dtype=np.uint8).reshape(len(moved), len(_ELEV_POSITIONS))
+    flat = _to_codes(_join(_index_to_plane(np.where(valid, nq, NE), np.where(valid, nx, 0),
+                                           np.where(valid, ny, 0), level),
+                           result_elev))
+    valid = valid.reshape(n, m)
+    return [[flat[i * m + j] for j in range(m) if valid[i, j]] for i in range(n)]
+
+
+_HORIZONTAL = [(dx, dy, 0) for dy in (-1, 0, 1) for dx in (-1, 0, 1) if dx or dy]
+
+
+def neighbors_batch(codes: Sequence[str], level: int, include_vertical: bool = True) -> List[List[str]]:
+    """批量求 level 级网格的 8 个水平邻居（及上下两层，需33位编码且 level >= 6）"""
+    _check_level(level)
+    plane, elev = _split(_to_array(codes))
+    offsets = list(_HORIZONTAL)
+    if include_vertical and elev is not None and level >= 6:
+        offsets += [(0, 0, -1), (0, 0, 1)]
+    return _offset_codes(plane, elev, level, offsets)
+
+
+def k_ring_batch(codes: Sequence[str], level: int, k: int, include_vertical: bool = False) -> List[List[str]]:
+    """批量求切比雪夫距离不超过 k 的全部网格（含自身），include_vertical 时包括上下 k 层"""
+    _check_level(level)
+    if k < 0:
+        raise ValueError("k 不能为负")
+    plane, elev = _split(_to_array(codes))
+    dzs = range(-k, k + 1) if include_vertical and elev is not None and level >= 6 else (0,)
+    offsets = [(dx, dy, dz) for dz in dzs for dy in range(-k, k + 1) for dx in range(-k, k + 1)]
+    rings = _offset_codes(plane, elev, level, offsets)
+    # 高纬度或跨越180°经线时不同偏移可能落在同一网格
+    return [list(dict.fromkeys(ring)) for ring in rings]
+
+
+def parent(code: str, level: int) -> str:
+    """code 所在的 level 级网格的规范编码"""
+    return parent_batch([code], level)[0]
+
+
+def children(code: str, level: int) -> List[str]:
+    """code 所在的 level 级网格的全部子网格（level + 1 级）"""
+    return children_batch([code], level)[0]
+
+
+def neighbors(code: str, level: int, include_vertical: bool = True) -> List[str]:
+    """code 所在的 level 级网格的相邻网格"""
+    return neighbors_batch([code], level, include_vertical)[0]
+
+
+def k_ring(code: str, level: int, k: int, include_vertical: bool = False) -> List[str]:
+    """code 所在的 level 级网格周围 k 圈内的全部网格（含自身）"""
+    return k_ring_batch([code], level, k, include_vertical)[0]
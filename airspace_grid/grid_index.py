@@ -0,0 +1,153 @@
+# airspace_grid/grid_index.py
+"""
+网格编码与整数网格索引的互相转换
+
+每一级网格在所在象限内可表示为一对绝对整数索引 (ax, ay)：
+    ax = floor(|lon| / 该级经度边长),  ay = floor(|lat| / 该级纬度边长)
+它们由编码中各级码元按混合进制累积得到（各级经/纬方向的细分数见 LON_RADIX / LAT_RADIX），
+Z序码元按 grid_encode 中的同一张表反查。与 decode_grid 不同，这里严格按
+encode_grid 的码元布局解析，可用于把编码映射为数组下标。
+"""
+from typing import List, Tuple
+
+from .grid_encode import (_Z_TABLE_L4, _Z_TABLE_L5, _Z_TABLE_L8, _Z_TABLE_2X2,
+                          _ELEV_POSITIONS)
+
+MAX_LEVEL = 16
+
+# 各级相对上一级的细分数（下标为级别，第1级为全球绝对索引，记为 None）
+LON_RADIX = [None, None, 2, 6, 2, 3, 5, 5, 3] + [2] * 8
+LAT_RADIX = [None, None, 2, 4, 3, 2, 5, 5, 3] + [2] * 8
+
+# 各级网格边长（度），下标为级别
+LON_CELL_SIZE = [None, 6.0, 3.0, 0.5, 0.25, 1/12, 1/60, 1/300, 1/900] + [1/1800 / 2**k for k in range(8)]
+LAT_CELL_SIZE = [None, 4.0, 2.0, 0.5, 1/6, 1/12, 1/60, 1/300, 1/900] + [1/1800 / 2**k for k in range(8)]
+
+# 第1级纬度带数（A~W，每带 4°）
+LAT_BANDS = 23
+
+# 象限索引，与 grid_encode 中Z序表的排列一致
+NW, NE, SW, SE = 0, 1, 2, 3
+
+
+def _invert(table) -> List[dict]:
+    """Z序表 [象限][行][列] -> 每个象限的 {码元: (行, 列)}"""
+    return [{value: (r, c) for r, row in enumerate(quad) for c, value in enumerate(row)} for quad in table]
+
+
+_Z_INVERSE = {4: _invert(_Z_TABLE_L4), 5: _invert(_Z_TABLE_L5), 8: _invert(_Z_TABLE_L8),
+              'quad': _invert(_Z_TABLE_2X2)}
+
+PLANE_CODE_LENGTH = 22
+FULL_CODE_LENGTH = 33
+
+
+def quadrant_of(west: bool, north: bool) -> int:
+    """由东西、南北半球得到象限索引"""
+    if north:
+        return NW if west else NE
+    return SW if west else SE
+
+
+def plane_code(code: str) -> str:
+    """去掉高程码元，返回22位平面编码"""
+    if len(code) == FULL_CODE_LENGTH:
+        return ''.join(ch for i, ch in enumerate(code) if i not in _ELEV_POSITIONS)
+    if len(code) == PLANE_CODE_LENGTH:
+        return code
+    raise ValueError(f"无效的网格编码长度: {len(code)}")
+
+
+def elevation_of(code: str) -> float:
+    """从33位编码的11位高程码元还原高程（米，取所在最细高程区间的下界）"""
+    if len(code) != FULL_CODE_LENGTH:
+        raise ValueError("编码不含高程码元")
+    digits = ''.join(code[i] for i in _ELEV_POSITIONS)
+    return int(digits) / 10**8
+
+
+# 经、纬各一位码元的级别 -> 经度码元位置；单个Z序码元的级别 -> 码元位置（第9级起为 级别+5）
+_PAIR_POSITIONS = {3: 5, 6: 9, 7: 11}
+_Z_POSITIONS = {4: 7, 5: 8, 8: 13}
+
+
+def _digit(ch: str, high: int) -> int:
+    """单个码元 -> 整数，不是 0~high 的数字时抛出 ValueError"""
+    if len(ch) != 1 or ch not in '0123456789' or int(ch) > high:
+        raise ValueError(f"无效的网格码元: {ch!r}")
+    return int(ch)
+
+
+def _level_step(p: str, lv: int, quad: int, west: bool, north: bool) -> Tuple[int, int]:
+    """第 lv 级码元 -> (列, 行)：列为|经度|方向索引，行为|纬度|方向索引"""
+    if lv == 2:
+        hi, lo = divmod(_digit(p[4], 3), 2)
+        return (lo if west else 1 - lo), (hi if north else 1 - hi)
+    if lv in _PAIR_POSITIONS:
+        pos = _PAIR_POSITIONS[lv]
+        cmax, rmax = LON_RADIX[lv] - 1, LAT_RADIX[lv] - 1
+        c, r = _digit(p[pos], cmax), _digit(p[pos + 1], rmax)
+        return (cmax - c if west else c), (rmax - r if north else r)
+    inverse = _Z_INVERSE[lv if lv in (4, 5, 8) else 'quad'][quad]
+    d = _digit(p[_Z_POSITIONS.get(lv, lv + 5)], 9)
+    if d not in inverse:
+        raise ValueError(f"无效的网格码元: {d}")
+    r, c = inverse[d]
+    return c, r
+
+
+def cell_index(code: str, level: int = MAX_LEVEL) -> Tuple[int, int, int]:
+    """解析编码在指定级别的网格索引
+
+    Args:
+        code: 22位平面编码或33位三维编码
+        level: 目标级别（1~16），取编码中该级及以上的码元
+
+    Returns:
+        (象限, ax, ay)
+
+    Raises:
+        ValueError: 编码无效（半球不是 N/S、经度带不在 1~60、纬度带超出 A~W，或该级及以上的码元超出范围）
+    """
+    if not 1 <= level <= MAX_LEVEL:
+        raise ValueError(f"无效的网格级别: {level}")
+    p = plane_code(code)
+    if p[0] not in ('N', 'S') or not (p[1] in '0123456789' and p[2] in '0123456789') \
+            or not 1 <= int(p[1:3]) <= 60 or not 0 <= ord(p[3]) - ord('A') < LAT_BANDS:
+        raise ValueError(f"无效的网格编码: {code}")
+    north = p[0] == 'N'
+    zone = int(p[1:3])
+    west = zone <= 30
+    quad = quadrant_of(west, north)
+
+    ax = 30 - zone if west else zone - 31
+    ay = ord(p[3]) - ord('A')
+    for lv in range(2, level + 1):
+        col, row = _level_step(p, lv, quad, west, north)
+        ax = ax * LON_RADIX[lv] + col
+        ay = ay * LAT_RADIX[lv] + row
+    return quad, ax, ay
+
+
+def cell_center(quad: int, ax: int, ay: int, level: int) -> Tuple[float, float]:
+    """网格索引对应的中心经纬度"""
+    lon = (ax + 0.5) * LON_CELL_SIZE[level]
+    lat = (ay + 0.5) * LAT_CELL_SIZE[level]
+    return (-lon if quad in (NW, SW) else lon), (lat if quad in (NW, NE) else -lat)
+
+
+def cell_bbox(quad: int, ax: int, ay: int, level: int) -> List[float]:
+    """网格索引对应的边界 [min_lon, min_lat, max_lon, max_lat]"""
+    lon0, lon1 = ax * LON_CELL_SIZE[level], (ax + 1) * LON_CELL_SIZE[level]
+    lat0, lat1 = ay * LAT_CELL_SIZE[level], (ay + 1) * LAT_CELL_SIZE[level]
+    if quad in (NW, SW):
+        lon0, lon1 = -lon1, -lon0
+    if quad in (SW, SE):
+        lat0, lat1 = -lat1, -lat0
+    return [lon0, lat0, lon1, lat1]
+
+
+def point_index(lon: float, lat: float, level: int) -> Tuple[int, int, int]:
+    """经纬度所在网格的索引（按边长直接计算，网格边界上的点可能与编码结果相差一格）"""
+    quad = quadrant_of(lon < 0, lat >= 0)
+    return quad, int(abs(lon) // LON_CELL_SIZE[level]), int(abs(lat) // LAT_CELL_SIZE[level])
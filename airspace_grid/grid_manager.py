@@ -1,9 +1,15 @@
 # airspace_grid/grid_manager.py
-from typing import List, Dict, Optional, Tuple
+from typing import Any, List, Dict, Optional, Tuple
 from .grid_core import GridGenerator, GridCell
 from .grid_encode import *
 from .grid_attributes import GridAttributes, GridAttributeManager
+from .grid_cellset import CellSet
+from .grid_parallel import GridColumns, generate_grid_columns
+from .grid_polyfill import _as_geometry
+from .grid_region import GridRegion
 import json
+import time
+import numpy as np
 from . import grid_encode as ge
 from .grid_decode import *
 
@@ -12,33 +18,87 @@ class AirspaceGridManager:
     
     def __init__(self):
         self.grid_cells: Dict[str, GridCell] = {}
+        self.grid_columns: List[GridColumns] = []  # 并行生成的列式网格块
+        self.regions: List[GridRegion] = []        # 按需计算的虚拟网格区域
         self.attribute_manager = GridAttributeManager()
     
     def generate_grids(self, lon_min: float, lon_max: float,
                       lat_min: float, lat_max: float,
                       level: int, alt_min: float = 0.0, 
-                      alt_max: float = 1000) -> List[GridCell]:
-        """生成指定区域的网格"""
+                      alt_max: float = 1000,
+                      order: Optional[str] = None) -> List[GridCell]:
+        """生成指定区域的网格（order 见 GridGenerator.get_grids）"""
         grids = GridGenerator.get_grids(
-            lon_min, lon_max, lat_min, lat_max, level, alt_min, alt_max
+            lon_min, lon_max, lat_min, lat_max, level, alt_min, alt_max, order
         )
         
         # 存储网格
         for grid in grids:
             self.grid_cells[grid.code] = grid
             
-            # 创建对应的属性对象
-            attrs = GridAttributes(
-                grid_code=grid.code,
-                level=grid.level,
-                bbox=grid.bbox,
-                center=grid.center,
-                alt_range=list(grid.alt_range)
-            )
-            self.attribute_manager.add_grid_attributes(attrs)
+        # 登记属性（不创建属性对象，属性按列存储）
+        self.attribute_manager.add_grids(grids)
             
         return grids
     
+    def generate_grids_parallel(self, lon_min: float, lon_max: float,
+                                lat_min: float, lat_max: float,
+                                level: int, alt_min: float = 0.0,
+                                alt_max: float = 1000,
+                                workers: Optional[int] = None) -> List[GridColumns]:
+        """多进程生成大范围网格，结果为列式块（不创建 GridCell / GridAttributes 对象）
+
+        各块直接追加到 grid_columns，不复制数据；块的顺序与内容与 generate_grids 一致，与进程数无关。
+        """
+        blocks = generate_grid_columns(lon_min, lon_max, lat_min, lat_max,
+                                       level, alt_min, alt_max, workers)
+        self.grid_columns.extend(blocks)
+        return blocks
+
+    def generate_region(self, lon_min: float, lon_max: float,
+                        lat_min: float, lat_max: float,
+                        level: int, alt_min: float = 0.0,
+                        alt_max: float = 1000) -> GridRegion:
+        """登记虚拟网格区域（O(1)），网格与属性对象在使用时才生成"""
+        region = GridRegion(lon_min, lon_max, lat_min, lat_max, level, alt_min, alt_max)
+        self.regions.append(region)
+        return region
+
+    def _iter_blocks(self):
+        """列式网格块与虚拟区域的网格（分块）"""
+        yield from self.grid_columns
+        for region in self.regions:
+            yield from region.iter_columns()
+
+    def _find_cells(self, grid_codes) -> Dict[str, GridCell]:
+        """在已生成的网格、虚拟区域和列式网格块中批量查找网格，找不到的编码不出现在结果中"""
+        found, rest = {}, []
+        for code in dict.fromkeys(grid_codes):
+            grid = self.grid_cells.get(code)
+            if grid is not None:
+                found[code] = grid
+            else:
+                rest.append(code)
+        for region in self.regions:
+            if not rest:
+                break
+            indices = region.index_of_many(rest)
+            hits = np.flatnonzero(indices >= 0)
+            block = region.take(indices[hits])
+            for n, h in enumerate(hits):
+                found[rest[h]] = block.cell(n)
+            rest = [rest[h] for h in np.flatnonzero(indices < 0)]
+        if rest and self.grid_columns:
+            keys = np.array([code.encode('ascii', 'replace') for code in rest])
+            for block in self.grid_columns:
+                for i in np.flatnonzero(np.isin(block.codes, keys)):
+                    found.setdefault(block.codes[i].decode('ascii'), block.cell(i))
+        return found
+
+    def _find_cell(self, grid_code: str) -> Optional[GridCell]:
+        """在已生成的网格、虚拟区域和列式网格块中查找网格"""
+        return self._find_cells([grid_code]).get(grid_code)
+
     def get_grid_by_code(self, code: str) -> Optional[GridCell]:
         """根据编码获取网格"""
         return decode_grid(code)   
@@ -52,7 +112,25 @@ class AirspaceGridManager:
             if (grid.bbox[2] >= lon_min and grid.bbox[0] <= lon_max and
                 grid.bbox[3] >= lat_min and grid.bbox[1] <= lat_max):
                 result.append(grid)
+        for block in self.grid_columns:
+            bbox = block.bbox
+            hits = np.flatnonzero((bbox[:, 2] >= lon_min) & (bbox[:, 0] <= lon_max) &
+                                  (bbox[:, 3] >= lat_min) & (bbox[:, 1] <= lat_max))
+            result.extend(block.cell(i) for i in hits)
+        for region in self.regions:
+            result.extend(region.cells_in_area(lon_min, lon_max, lat_min, lat_max).to_cells())
         return result
+
+    def get_cell_set(self) -> CellSet:
+        """当前全部网格的紧凑集合（完整的兄弟网格合并为父网格）"""
+        by_level: Dict[int, List[str]] = {}
+        for code, grid in self.grid_cells.items():
+            by_level.setdefault(grid.level, []).append(code)
+        result = CellSet.from_cover(by_level)
+        for block in self._iter_blocks():
+            result = result | CellSet.from_codes(block.code_list(), block.level)
+        return result
+
     def get_grid_code_by_coordinates(self, lon: float, lat: float, alt: float, level: int) -> str:        
         """根据经纬度、高程和level获取网格编码"""        
         return encode_grid(lon, lat, alt, level)    
@@ -63,22 +141,174 @@ class AirspaceGridManager:
     
     def update_grid_attribute(self, grid_code: str, category: str, 
                              key: str, value: any) -> bool:
-        """更新网格属性"""
-        return self.attribute_manager.update_grid_attributes(
-            grid_code, category, key, value
-        )
+        """更新网格属性（虚拟区域和列式网格块中的网格在第一次写入时才登记）"""
+        if self.attribute_manager.update_grid_attributes(grid_code, category, key, value):
+            return True
+        grid = self._find_cell(grid_code)
+        if grid is None:
+            return False
+        self.attribute_manager.add_grid(grid)
+        return self.attribute_manager.update_grid_attributes(grid_code, category, key, value)
     
-    def get_grid_attributes(self, grid_code: str) -> Optional[GridAttributes]:
-        """获取网格属性"""
-        return self.attribute_manager.get_grid_attributes(grid_code)
+    def record_grid_attribute(self, grid_code: str, category: str, key: str, value: any,
+                              valid_time, ttl: Optional[float] = None) -> bool:
+        """写入按时间版本保存的属性值（valid_time 起生效，ttl 秒后失效），不改变当前取值"""
+        if grid_code not in self.attribute_manager:
+            grid = self._find_cell(grid_code)
+            if grid is None:
+                return False
+            self.attribute_manager.add_grid(grid)
+        return self.attribute_manager.record_attribute(grid_code, category, key, value, valid_time, ttl)
+
+    def expire_attributes(self, now=None) -> int:
+        """清理已被取代或已失效的时间版本记录，返回删除的条数"""
+        return self.attribute_manager.expire_history(now)
+
+    def get_attribute_changes(self, since: int = 0, limit: Optional[int] = None,
+                              timeout: Optional[float] = None) -> Dict[str, any]:
+        """
+        序号 since 之后的属性变更（增量同步）
+
+        Args:
+            since: 客户端收到的最后一个序号（0 表示从头开始）
+            limit: 最多返回的条数
+            timeout: 没有新变更时最多等待的秒数（长轮询），None 或 0 表示不等待
+
+        Returns:
+            {"changes": [变更字典, ...], "next": 下次请求的 since, "latest": 最新序号,
+             "truncated": 部分变更已不在日志中（需要重新下载全部属性）}
+        """
+        log = self.attribute_manager.changes
+        if timeout:
+            log.wait(since, timeout)
+        changes, truncated = log.since(since, limit)
+        return {
+            "changes": [change.to_dict() for change in changes],
+            "next": changes[-1].seq if changes else min(since, log.latest),
+            "latest": log.latest,
+            "truncated": truncated
+        }
+
+    def get_grid_attributes(self, grid_code: str, at=None) -> Optional[GridAttributes]:
+        """获取网格属性副本（尚未登记的虚拟网格只含继承的区域默认值）；给定 at 时返回该时刻的属性"""
+        attrs = self.attribute_manager.get_grid_attributes(grid_code, at)
+        if attrs is None:
+            grid = self._find_cell(grid_code)
+            if grid is not None:
+                return self.attribute_manager.build_attributes(grid)
+        return attrs
+
+    def set_region_attribute(self, region: GridRegion, category: str,
+                             key: str, value: any) -> None:
+        """设置区域内全部网格的属性默认值（一次写入，单独更新过的网格保留自己的取值）"""
+        self.attribute_manager.set_region_default(region, category, key, value)
+    
+    def _select(self, selector) -> Tuple[List[str], Dict[str, GridCell]]:
+        """批量选择器 -> (网格编码列表, 选择时已得到的未登记网格)"""
+        cells = {}
+        if isinstance(selector, GridRegion):
+            codes = []
+            for block in selector.iter_columns():
+                block_codes = block.code_list()
+                codes.extend(block_codes)
+                cells.update((code, block.cell(i)) for i, code in enumerate(block_codes)
+                             if code not in self.attribute_manager)
+            return codes, cells
+        if isinstance(selector, str):
+            return [selector], cells
+        if isinstance(selector, np.ndarray) and selector.dtype.kind in 'SU':
+            return selector.astype(str).tolist(), cells
+
+        items = selector if hasattr(selector, 'geom_type') else list(selector)
+        if hasattr(items, 'geom_type') or (items and not isinstance(items[0], (str, int, float))):
+            # 多边形：中心点在多边形内的网格
+            import shapely
+            geom = _as_geometry(items)
+            lon_min, lat_min, lon_max, lat_max = geom.bounds
+            grids = list({g.code: g for g in self.get_grids_by_area(lon_min, lon_max, lat_min, lat_max)}.values())
+            centers = np.array([g.center for g in grids], dtype=np.float64).reshape(-1, 2)
+            grids = [g for g, inside in zip(grids, shapely.contains_xy(geom, centers[:, 0], centers[:, 1]))
+                     if inside]
+        elif len(items) == 4 and all(isinstance(v, (int, float)) for v in items):
+            # 范围 [min_lon, min_lat, max_lon, max_lat]，相交判定与 get_grids_by_area 相同
+            lon_min, lat_min, lon_max, lat_max = map(float, items)
+            grids = list({g.code: g for g in self.get_grids_by_area(lon_min, lon_max, lat_min, lat_max)}.values())
+        else:
+            if not all(isinstance(code, str) for code in items):
+                raise ValueError("无效的选择器：需要 GridRegion、范围、多边形或网格编码列表")
+            return items, cells
+        cells.update((g.code, g) for g in grids if g.code not in self.attribute_manager)
+        return [g.code for g in grids], cells
+
+    def bulk_update_attributes(self, selector, category: str, values: Dict[str, Any],
+                               valid_time=None, ttl: Optional[float] = None) -> Dict[str, Any]:
+        """
+        批量更新一批网格的属性（一次遍历，未登记的网格批量登记）
+
+        Args:
+            selector: 网格选择器，可以是
+                - GridRegion：区域内全部网格；单一取值写成区域默认值（set_region_default，覆盖区域内网格
+                  自己的取值），不逐个登记网格，只有逐个网格取值的数组才登记区域内的网格
+                - [min_lon, min_lat, max_lon, max_lat]：与范围相交的已生成网格（同 get_grids_by_area）
+                - 多边形顶点列表或 shapely 面要素：中心点在多边形内的已生成网格
+                - 网格编码列表（或 numpy 字符串数组）
+            category: 属性类别
+            values: {键: 取值}；取值为 numpy 数组时与选中的网格逐个对应
+                （编码列表按给定顺序，区域按编号顺序，范围 / 多边形按 get_grids_by_area 的顺序），
+                其他取值对全部网格相同
+            valid_time, ttl: 给定 valid_time 时写入时间版本记录（同 record_grid_attribute），不改变当前取值
+
+        Returns:
+            {"selected": 选中数, "updated": 更新数, "registered": 新登记数,
+             "missing": 找不到的编码数, "timings": {"select", "resolve", "apply": 秒}}
+        """
+        region_values = {}
+        if isinstance(selector, GridRegion) and valid_time is None:
+            # 区域的单一取值写成区域默认值，不逐个登记网格
+            region_values = {k: v for k, v in values.items() if not isinstance(v, np.ndarray)}
+            values = {k: v for k, v in values.items() if isinstance(v, np.ndarray)}
+
+        timings = {"select": 0.0, "resolve": 0.0}
+        codes, new, grids = [], [], []
+        per_cell = bool(values) or not region_values
+        if per_cell:
+            start = time.perf_counter()
+            codes, cells = self._select(selector)
+            timings["select"] = time.perf_counter() - start
+
+            start = time.perf_counter()
+            new = [code for code in dict.fromkeys(codes) if code not in self.attribute_manager]
+            unresolved = [code for code in new if code not in cells]
+            if unresolved:
+                cells.update(self._find_cells(unresolved))
+            grids = [cells[code] for code in new if code in cells]
+            timings["resolve"] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        updated = 0
+        if valid_time is not None:
+            updated = self.attribute_manager.record_many(codes, category, values, valid_time, ttl, grids)
+        elif per_cell:
+            updated = self.attribute_manager.update_many(codes, category, values, grids)
+        for key, value in region_values.items():
+            self.attribute_manager.set_region_default(selector, category, key, value, override=True)
+        timings["apply"] = time.perf_counter() - start
+        selected = len(selector) if region_values else len(codes)
+        return {
+            "selected": selected,
+            "updated": selected if region_values else updated,
+            "registered": len(grids),
+            "missing": len(new) - len(grids),
+            "timings": {k: round(v, 6) for k, v in timings.items()}
+        }
     
     def search_grids(self, category: str, key: str, value: any) -> List[GridCell]:
         """根据属性搜索网格"""
         attrs_list = self.attribute_manager.get_grids_by_category_value(
             category, key, value
         )
-        return [self.grid_cells[attrs.grid_code] for attrs in attrs_list 
-                if attrs.grid_code in self.grid_cells]
+        found = self._find_cells([attrs.grid_code for attrs in attrs_list])
+        return [found[attrs.grid_code] for attrs in attrs_list if attrs.grid_code in found]
     
     def get_statistics(self) -> Dict[str, any]:
         """获取网格统计信息"""
@@ -90,6 +320,9 @@ class AirspaceGridManager:
             if level not in level_counts:
                 level_counts[level] = 0
             level_counts[level] += 1
+        for block in self.grid_columns + self.regions:
+            total_grids += len(block)
+            level_counts[block.level] = level_counts.get(block.level, 0) + len(block)
             
         return {
             "total_grids": total_grids,
@@ -97,7 +330,10 @@ class AirspaceGridManager:
         }
     
     def export_to_json(self, filename: str) -> None:
-        """导出网格数据到JSON文件"""
+        """导出网格数据到JSON文件（列式网格块和虚拟区域展开为逐个网格）"""
+        grids = dict(self.grid_cells)
+        for block in self._iter_blocks():
+            grids.update((cell.code, cell) for cell in block.to_cells())
         data = {
             "grids": {code: {
                 "level": grid.level,
@@ -107,7 +343,7 @@ class AirspaceGridManager:
                 "code": grid.code,
                 "alt_range": grid.alt_range,
                 "cellid": grid.cellid
-            } for code, grid in self.grid_cells.items()},
+            } for code, grid in grids.items()},
             "attributes": json.loads(self.attribute_manager.to_json())
         }
         
@@ -0,0 +1,184 @@
+# airspace_grid/grid_parallel.py
+"""
+大范围网格的并行列式生成
+
+把区域按经度方向切成若干条带（每条带若干整列网格），提交到进程池，每个工作进程
+以 numpy 批量编码生成一个列式块 GridColumns（编码、边界、中心、高度范围各一个数组），
+不创建 GridCell 对象。
+
+与 GridGenerator.get_grids 的结果逐项一致：
+- 起点序列由 generate_starts 对整个区域一次算出，再按列切分，各条带不会重叠或遗漏
+- 每个起点的舍入与 get_grids 相同（Python round），编码用 encode_grid_batch
+- 块按条带顺序返回，与 get_grids 的“经度、纬度、高度”循环顺序相同，
+  结果与工作进程数无关
+
+进程池在首次并行生成时创建（GRID_WORKERS 环境变量个进程，未设置时为 CPU 数），
+之后各次调用共用，进程退出时关闭。
+"""
+import atexit
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import List, Optional, Sequence
+
+import numpy as np
+
+from .grid_core import GridCell, GridGenerator
+from .grid_encode import encode_grid_batch
+
+DEFAULT_TILE_CELLS = 200_000   # 每个条带的目标网格数
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _default_workers() -> int:
+    """默认并行度（GRID_WORKERS 环境变量，未设置时为 CPU 数），也是进程池的大小"""
+    return int(os.environ.get("GRID_WORKERS", 0)) or os.cpu_count() or 1
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    """
+    进程内共享的固定大小进程池（_default_workers 个进程）
+
+    首次使用时在锁内创建，之后不再重建或关闭（直到进程退出），并发调用可安全共用；
+    各次调用的 workers 只决定是否并行，不改变进程池大小。
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(max_workers=_default_workers())
+        return _executor
+
+
+@atexit.register
+def _shutdown_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown()
+            _executor = None
+
+
+@dataclass
+class GridColumns:
+    """同一级别的一批网格，按列存储"""
+    level: int
+    codes: np.ndarray       # (n,) 'S33'
+    bbox: np.ndarray        # (n, 4) [min_lon, min_lat, max_lon, max_lat]
+    center: np.ndarray      # (n, 2) [lon, lat]
+    alt_range: np.ndarray   # (n, 2) [min_alt, max_alt]
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    @property
+    def nbytes(self) -> int:
+        return self.codes.nbytes + self.bbox.nbytes + self.center.nbytes + self.alt_range.nbytes
+
+    def code_list(self) -> List[str]:
+        return np.char.decode(self.codes, 'ascii').tolist()
+
+    def cell(self, i: int) -> GridCell:
+        """第 i 个网格的 GridCell"""
+        info = GridGenerator.GRID_LEVELS[self.level - 1]
+        return GridCell(
+            level=self.level,
+            bbox=self.bbox[i].tolist(),
+            center=self.center[i].tolist(),
+            size={'lon': info['approx_lon'], 'lat': info['approx_lat'], 'unit': info['unit']},
+            code=self.codes[i].decode('ascii'),
+            alt_range=tuple(self.alt_range[i].tolist()),
+        )
+
+    def to_cells(self) -> List[GridCell]:
+        return [self.cell(i) for i in range(len(self))]
+
+    @classmethod
+    def concat(cls, blocks: Sequence['GridColumns']) -> 'GridColumns':
+        """合并为一个块（会复制数据，仅在需要连续数组时使用）"""
+        levels = {b.level for b in blocks}
+        if len(levels) != 1:
+            raise ValueError("只能合并同一级别的网格块")
+        return cls(levels.pop(), *(np.concatenate([getattr(b, name) for b in blocks])
+                                   for name in ('codes', 'bbox', 'center', 'alt_range')))
+
+
+def _axis(starts: Sequence[float], step: float, ndigits: int):
+    """起点序列 -> (起点, 终点, 中心) 数组，舍入与 get_grids 相同"""
+    return (np.array([round(v, ndigits) for v in starts], dtype=np.float64),
+            np.array([round(v + step, ndigits) for v in starts], dtype=np.float64),
+            np.array([round(v + step / 2, ndigits) for v in starts], dtype=np.float64))
+
+
+def _alt_axis(level: int, alt_min: float, alt_max: float):
+    """高度方向的 (起点, 终点, 编码高程) 数组；第6级以下不分层，高度范围为 GridCell 默认值，编码高程取 alt_min"""
+    if level >= 6:
+        alt_step = 1000 / (2 ** (level - 5))
+        return _axis(GridGenerator.generate_starts(alt_min, alt_max, alt_step), alt_step, 2)
+    return np.array([0.0]), np.array([1000.0]), np.array([float(alt_min)])
+
+
+def _build_columns(level: int, lon_axis, lat_axis, alt_axis, i, j, k) -> GridColumns:
+    """各轴取值与下标数组 -> GridColumns"""
+    (lon0, lon1, lon_c), (lat0, lat1, lat_c), (alt0, alt1, alt_c) = lon_axis, lat_axis, alt_axis
+    codes = encode_grid_batch(lon_c[i], lat_c[j], alt_c[k])
+    return GridColumns(
+        level=level,
+        codes=np.array(codes, dtype='S33').reshape(-1),
+        bbox=np.stack([lon0[i], lat0[j], lon1[i], lat1[j]], axis=1),
+        center=np.stack([lon_c[i], lat_c[j]], axis=1),
+        alt_range=np.stack([alt0[k], alt1[k]], axis=1),
+    )
+
+
+def _generate_tile(level: int, lon_starts: List[float], lat_starts: List[float],
+                   alt_min: float, alt_max: float) -> GridColumns:
+    """生成一个条带（工作进程中执行）"""
+    info = GridGenerator.GRID_LEVELS[level - 1]
+    lon_axis = _axis(lon_starts, info['lon_deg'], 9)
+    lat_axis = _axis(lat_starts, info['lat_deg'], 9)
+    alt_axis = _alt_axis(level, alt_min, alt_max)
+    # 与 get_grids 相同的循环顺序：经度、纬度、高度
+    i, j, k = (a.ravel() for a in np.meshgrid(np.arange(len(lon_starts)), np.arange(len(lat_starts)),
+                                             np.arange(len(alt_axis[0])), indexing='ij'))
+    return _build_columns(level, lon_axis, lat_axis, alt_axis, i, j, k)
+
+
+def generate_grid_columns(lon_min: float, lon_max: float, lat_min: float, lat_max: float,
+                          level: int, alt_min: float = 0.0, alt_max: float = 1000,
+                          workers: Optional[int] = None,
+                          tile_cells: int = DEFAULT_TILE_CELLS) -> List[GridColumns]:
+    """
+    并行生成区域内的网格
+
+    Args:
+        lon_min, lon_max, lat_min, lat_max: 区域范围
+        level: 网格级别
+        alt_min, alt_max: 高度范围（米）
+        workers: 并行度，默认 _default_workers()；为 1 或只有一个条带时在当前进程生成，
+            否则提交到共享进程池（池大小固定，不随 workers 变化）
+        tile_cells: 每个条带的目标网格数
+
+    Returns:
+        按条带顺序排列的 GridColumns 列表，依次拼接即为 get_grids 的结果
+    """
+    if not 1 <= level <= len(GridGenerator.GRID_LEVELS):
+        raise ValueError(f"无效的网格级别: {level}")
+    info = GridGenerator.GRID_LEVELS[level - 1]
+    lon_starts = GridGenerator.generate_starts(lon_min, lon_max, info['lon_deg'])
+    lat_starts = GridGenerator.generate_starts(lat_min, lat_max, info['lat_deg'])
+    layers = len(GridGenerator.generate_starts(alt_min, alt_max, 1000 / 2 ** (level - 5))) if level >= 6 else 1
+    if not lon_starts or not lat_starts or not layers:
+        return []
+
+    # 按整列切分条带
+    columns = max(1, tile_cells // (len(lat_starts) * layers))
+    tiles = [lon_starts[i:i + columns] for i in range(0, len(lon_starts), columns)]
+    args = [(level, tile, lat_starts, alt_min, alt_max) for tile in tiles]
+
+    workers = workers or _default_workers()
+    if workers == 1 or len(tiles) == 1:
+        return [_generate_tile(*a) for a in args]
+    return list(_get_executor().map(_generate_tile, *zip(*args)))
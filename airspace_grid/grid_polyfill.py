@@ -0,0 +1,213 @@
+# airspace_grid/grid_polyfill.py
+"""
+多边形 / 多面体（多边形 × 高度范围）的网格覆盖
+
+从第1级开始逐级细分：完全位于多边形内的网格整体输出，只有与边界相交的网格继续细分，
+得到由不同级别网格组成的紧凑覆盖；expand=True 时展开为目标级别的单级覆盖。
+
+高度方向与 GridGenerator 一致，第6级起每级按 1000 / 2^(level - 5) 米分层。
+高度范围先对齐到目标级别的层边界（intersect 向外、contain 向内取整），
+平面完全在内的网格在本级输出完全落在范围内的整层，其余不足一层的上下部分随子网格继续细分。
+目标级别低于6时不分层，编码高程取 alt_min（与 GridGenerator.get_grids 相同）。
+
+输出编码为 grid_hierarchy 的规范编码（网格精确中心、高度层中心）。
+"""
+import math
+from typing import Dict, List
+
+import numpy as np
+
+from . import grid_hierarchy as gh
+from .grid_encode import GridEncoder
+from .grid_index import LAT_CELL_SIZE, LAT_RADIX, LON_CELL_SIZE, LON_RADIX, MAX_LEVEL, NE, NW, SE, SW
+
+MAX_ELEVATION = 1000
+LAYERED_LEVEL = 6               # 开始按高度分层的级别
+MAX_POLYFILL_CELLS = 20_000_000
+
+# 各象限的经纬度范围 (min_lon, min_lat, max_lon, max_lat)
+_QUADRANT_BOUNDS = {NW: (-180, 0, 0, 90), NE: (0, 0, 180, 90), SW: (-180, -90, 0, 0), SE: (0, -90, 180, 0)}
+
+
+def _as_geometry(polygon):
+    """[(lon, lat[, alt]), ...] 或 shapely 面要素 -> shapely 几何"""
+    from shapely.geometry import Polygon
+    geom = polygon if hasattr(polygon, 'geom_type') else Polygon([(p[0], p[1]) for p in polygon])
+    if geom.geom_type not in ('Polygon', 'MultiPolygon') or geom.is_empty:
+        raise ValueError("需要非空的多边形")
+    if not geom.is_valid:
+        raise ValueError("多边形无效（自相交等）")
+    return geom
+
+
+def _cell_boxes(quad, ax, ay, level):
+    """网格索引数组 -> 带符号的网格边界数组"""
+    lon0, lon1 = ax * LON_CELL_SIZE[level], (ax + 1) * LON_CELL_SIZE[level]
+    lat0, lat1 = ay * LAT_CELL_SIZE[level], np.minimum((ay + 1) * LAT_CELL_SIZE[level], 90)
+    west = (quad == NW) | (quad == SW)
+    south = (quad == SW) | (quad == SE)
+    return (np.where(west, -lon1, lon0), np.where(south, -lat1, lat0),
+            np.where(west, -lon0, lon1), np.where(south, -lat0, lat1))
+
+
+def _initial_cells(geom):
+    """与多边形外包矩形相交的第1级网格"""
+    from shapely.geometry import box
+    quads, axs, ays = [], [], []
+    for quad, bounds in _QUADRANT_BOUNDS.items():
+        part = geom.intersection(box(*bounds))
+        if part.is_empty or part.area == 0:
+            continue
+        min_lon, min_lat, max_lon, max_lat = part.bounds
+        lons, lats = sorted((abs(min_lon), abs(max_lon))), sorted((abs(min_lat), abs(max_lat)))
+        ax = np.arange(int(lons[0] // LON_CELL_SIZE[1]), min(int(lons[1] // LON_CELL_SIZE[1]), gh.LON_CELLS[1] - 1) + 1)
+        ay = np.arange(int(lats[0] // LAT_CELL_SIZE[1]), min(int(lats[1] // LAT_CELL_SIZE[1]), gh.LAT_CELLS[1] - 1) + 1)
+        gx, gy = np.meshgrid(ax, ay)
+        quads.append(np.full(gx.size, quad))
+        axs.append(gx.ravel())
+        ays.append(gy.ravel())
+    if not quads:
+        return (np.zeros(0, dtype=np.int64),) * 3
+    return np.concatenate(quads), np.concatenate(axs), np.concatenate(ays)
+
+
+def _layer_range(level, alt_min, alt_max, mode):
+    """高度范围对齐到 level 级高度层，返回 [zlo, zhi)"""
+    step = MAX_ELEVATION / 2 ** (level - 5)
+    if mode == 'intersect':
+        zlo, zhi = math.floor(alt_min / step), math.ceil(alt_max / step)
+        return zlo, max(zhi, zlo + 1)
+    return math.ceil(alt_min / step), math.floor(alt_max / step)
+
+
+def _codes(level, quad, ax, ay, layer, alt_min):
+    """网格索引与高度层 -> 33位规范编码"""
+    if level < LAYERED_LEVEL:
+        digits = np.frombuffer(GridEncoder.encode_elevation(alt_min).encode('ascii'), dtype=np.uint8)
+        elevation = np.broadcast_to(digits, (len(quad), len(digits)))
+    else:
+        table = np.frombuffer(b''.join(gh._elevation_digits(level, k) for k in range(2 ** (level - 5))),
+                              dtype=np.uint8).reshape(-1, 11)
+        elevation = table[layer]
+    return gh.index_to_codes(quad, ax, ay, level, elevation)
+
+
+def _children(level, quad, ax, ay, *columns):
+    """level 级网格 -> 全部 level + 1 级子网格，其余列按子网格重复"""
+    rx, ry = LON_RADIX[level + 1], LAT_RADIX[level + 1]
+    per = rx * ry
+    dx, dy = np.tile(np.arange(rx), ry), np.repeat(np.arange(ry), rx)
+    return ((np.repeat(quad, per), (ax[:, None] * rx + dx).ravel(), (ay[:, None] * ry + dy).ravel())
+            + tuple(np.repeat(c, per) for c in columns))
+
+
+def _expand(level, target, quad, ax, ay, layer):
+    """level 级网格（含高度层）展开为 target 级网格"""
+    while level < target:
+        quad, ax, ay, layer = _children(level, quad, ax, ay, layer)
+        level += 1
+        if level > LAYERED_LEVEL:
+            # 每层分为上下两层
+            quad, ax, ay = np.repeat(quad, 2), np.repeat(ax, 2), np.repeat(ay, 2)
+            layer = (layer[:, None] * 2 + np.arange(2)).ravel()
+    return quad, ax, ay, layer
+
+
+def polyfill(polygon, level: int, alt_min: float = 0.0, alt_max: float = MAX_ELEVATION,
+             mode: str = 'intersect', expand: bool = False) -> Dict[int, List[str]]:
+    """
+    计算多边形（及高度范围）的网格覆盖
+
+    Args:
+        polygon: [(lon, lat[, alt]), ...] 顶点列表，或 shapely Polygon / MultiPolygon
+        level: 目标（最细）网格级别
+        alt_min, alt_max: 高度范围（米，0~1000）
+        mode: 'intersect' 输出与区域有重叠的全部网格；'contain' 只输出完全在区域内的网格
+        expand: 为 True 时全部展开为 level 级网格
+
+    Returns:
+        {级别: [33位编码, ...]}，按级别从粗到细排列
+    """
+    import shapely
+
+    gh._check_level(level)
+    if mode not in ('intersect', 'contain'):
+        raise ValueError(f"无效的覆盖模式: {mode}")
+    if not 0 <= alt_min <= alt_max <= MAX_ELEVATION:
+        raise ValueError(f"无效的高度范围: {alt_min} ~ {alt_max}")
+    geom = _as_geometry(polygon)
+    shapely.prepare(geom)
+
+    layered = level >= LAYERED_LEVEL
+    zlo, zhi = _layer_range(level, alt_min, alt_max, mode) if layered else (0, 1)
+    if zlo >= zhi:
+        return {}
+
+    quad, ax, ay = _initial_cells(geom)
+    n = len(quad)
+    inside = np.zeros(n, dtype=bool)
+    lo, hi = np.full(n, zlo), np.full(n, zhi)
+    emitted = {}
+
+    for lv in range(1, level + 1):
+        # 与边界相交的网格重新判断：完全在内 / 有重叠 / 无关
+        test = np.flatnonzero(~inside)
+        if len(test):
+            boxes = shapely.box(*_cell_boxes(quad[test], ax[test], ay[test], lv))
+            covered = shapely.covers(geom, boxes)
+            overlap = shapely.intersects(geom, boxes) & ~shapely.touches(geom, boxes)
+            inside[test] = covered
+            keep = np.ones(len(quad), dtype=bool)
+            keep[test] = overlap
+            if not keep.all():
+                quad, ax, ay, inside, lo, hi = (c[keep] for c in (quad, ax, ay, inside, lo, hi))
+        if mode == 'contain' and lv == level:
+            quad, ax, ay, lo, hi = (c[inside] for c in (quad, ax, ay, lo, hi))
+            inside = np.ones(len(quad), dtype=bool)
+
+        if lv == level or (inside.any() and not layered):
+            done = np.ones(len(quad), dtype=bool) if lv == level else inside
+            if lv == level and layered:
+                # 目标级别：每个网格输出剩余的全部层
+                counts = hi - lo
+                idx = np.repeat(np.arange(len(quad)), counts)
+                layers = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts) + lo[idx]
+                emitted[lv] = (quad[idx], ax[idx], ay[idx], layers)
+            else:
+                emitted[lv] = (quad[done], ax[done], ay[done], np.zeros(done.sum(), dtype=np.int64))
+            quad, ax, ay, inside, lo, hi = (c[~done] for c in (quad, ax, ay, inside, lo, hi))
+        elif lv >= LAYERED_LEVEL and inside.any():
+            # 平面在内：输出完全落在剩余范围内的本级整层，不足一层的上下部分继续细分
+            f = 2 ** (level - lv)
+            k0, k1 = -(-lo // f), hi // f
+            whole = inside & (k0 < k1)
+            counts = np.where(whole, k1 - k0, 0)
+            idx = np.repeat(np.arange(len(quad)), counts)
+            layers = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts) + k0[idx]
+            emitted[lv] = (quad[idx], ax[idx], ay[idx], layers)
+
+            below = np.where(whole, k0 * f, hi)      # 剩余下部 [lo, below)
+            above = np.where(whole, k1 * f, hi)      # 剩余上部 [above, hi)
+            low_part, high_part = lo < below, whole & (above < hi)
+            sel = np.concatenate([np.flatnonzero(low_part), np.flatnonzero(high_part)])
+            lo, hi = (np.concatenate([lo[low_part], above[high_part]]),
+                      np.concatenate([below[low_part], hi[high_part]]))
+            quad, ax, ay, inside = (c[sel] for c in (quad, ax, ay, inside))
+
+        if lv == level or not len(quad):
+            break
+        if len(quad) * LON_RADIX[lv + 1] * LAT_RADIX[lv + 1] > MAX_POLYFILL_CELLS:
+            raise ValueError("覆盖网格数量过多，请降低级别或缩小范围")
+        quad, ax, ay, inside, lo, hi = _children(lv, quad, ax, ay, inside, lo, hi)
+
+    result = {}
+    for lv, (q, x, y, layers) in sorted(emitted.items()):
+        if not len(q):
+            continue
+        if expand and lv < level:
+            q, x, y, layers = _expand(lv, level, q, x, y, layers)
+            if sum(len(v) for v in result.values()) + len(q) > MAX_POLYFILL_CELLS:
+                raise ValueError("展开后的网格数量过多")
+            lv = level
+        result.setdefault(lv, []).extend(_codes(lv, q, x, y, layers, alt_min))
+    return result
@@ -0,0 +1,189 @@
+# airspace_grid/grid_region.py
+"""
+虚拟网格区域
+
+只记录 (范围, 级别, 高度范围)，不生成网格对象：网格数量、编码、几何都按需计算。
+网格按 GridGenerator.get_grids 的顺序（经度、纬度、高度）编号，第 i 个网格与
+get_grids 结果中的第 i 个逐项一致。各轴的起点序列在第一次使用时才计算，
+只与各轴网格数成正比；创建区域本身是 O(1) 的。
+"""
+import math
+from dataclasses import dataclass, field
+from functools import cached_property
+from typing import Iterator, List, Optional, Sequence
+
+import numpy as np
+
+from . import grid_hierarchy as gh
+from . import grid_index as gi
+from .grid_core import GridCell, GridGenerator
+from .grid_parallel import DEFAULT_TILE_CELLS, GridColumns, _alt_axis, _axis, _build_columns
+
+
+@dataclass(eq=False)
+class GridRegion:
+    """按需计算网格的区域"""
+    lon_min: float
+    lon_max: float
+    lat_min: float
+    lat_max: float
+    level: int
+    alt_min: float = 0.0
+    alt_max: float = 1000
+    info: dict = field(init=False, repr=False)
+
+    def __post_init__(self):
+        if not 1 <= self.level <= len(GridGenerator.GRID_LEVELS):
+            raise ValueError(f"无效的网格级别: {self.level}")
+        self.info = GridGenerator.GRID_LEVELS[self.level - 1]
+
+    # ---- 各轴（按需计算并缓存） ----
+
+    @cached_property
+    def _lon(self):
+        step = self.info['lon_deg']
+        return _axis(GridGenerator.generate_starts(self.lon_min, self.lon_max, step), step, 9)
+
+    @cached_property
+    def _lat(self):
+        step = self.info['lat_deg']
+        return _axis(GridGenerator.generate_starts(self.lat_min, self.lat_max, step), step, 9)
+
+    @cached_property
+    def _alt(self):
+        return _alt_axis(self.level, self.alt_min, self.alt_max)
+
+    @property
+    def shape(self):
+        """(经度方向网格数, 纬度方向网格数, 高度层数)"""
+        return len(self._lon[0]), len(self._lat[0]), len(self._alt[0])
+
+    def __len__(self) -> int:
+        nx, ny, nz = self.shape
+        return nx * ny * nz
+
+    # ---- 按编号取网格 ----
+
+    def _unravel(self, index):
+        nx, ny, nz = self.shape
+        i, rest = np.divmod(np.asarray(index, dtype=np.int64), ny * nz)
+        j, k = np.divmod(rest, nz)
+        return i, j, k
+
+    def columns(self, start: int = 0, stop: Optional[int] = None) -> GridColumns:
+        """编号 [start, stop) 的网格，列式返回"""
+        stop = len(self) if stop is None else min(stop, len(self))
+        return self.take(np.arange(start, max(start, stop)))
+
+    def take(self, indices) -> GridColumns:
+        """按编号数组取网格，列式返回"""
+        i, j, k = self._unravel(indices)
+        return _build_columns(self.level, self._lon, self._lat, self._alt, i, j, k)
+
+    def iter_columns(self, chunk: int = DEFAULT_TILE_CELLS) -> Iterator[GridColumns]:
+        """分块遍历全部网格"""
+        for start in range(0, len(self), chunk):
+            yield self.columns(start, start + chunk)
+
+    def cell(self, index: int) -> GridCell:
+        """第 index 个网格"""
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        return self.columns(index, index + 1).cell(0)
+
+    def __iter__(self) -> Iterator[GridCell]:
+        for block in self.iter_columns():
+            yield from block.to_cells()
+
+    def codes(self) -> List[str]:
+        return [code for block in self.iter_columns() for code in block.code_list()]
+
+    # ---- 按编码 / 范围查找 ----
+
+    def index_of(self, code: str, exact: bool = True) -> Optional[int]:
+        """编码在区域中的编号，不属于该区域时返回 None
+
+        exact 为 False 时只按网格下标运算判断（编码所在的网格属于区域即可，不再生成编码比较低级码元）
+        """
+        try:
+            quad, ax, ay = gi.cell_index(code, self.level)
+        except (ValueError, KeyError, IndexError):
+            return None
+        lon, lat = gi.cell_center(quad, ax, ay, self.level)
+        (lon0, _, _), (lat0, _, _), (alt0, _, _) = self._lon, self._lat, self._alt
+        if not len(lon0) or not len(lat0) or not len(alt0):
+            return None
+        i = math.floor((lon - lon0[0]) / self.info['lon_deg'])
+        j = math.floor((lat - lat0[0]) / self.info['lat_deg'])
+        k = 0
+        if self.level >= 6:
+            if len(code) != gi.FULL_CODE_LENGTH:
+                return None
+            try:
+                alt = gi.elevation_of(code)
+            except ValueError:
+                return None
+            k = math.floor((alt - alt0[0]) / (1000 / 2 ** (self.level - 5)))
+        nx, ny, nz = self.shape
+        if not (0 <= i < nx and 0 <= j < ny and 0 <= k < nz):
+            return None
+        index = (i * ny + j) * nz + k
+        if not exact:
+            return index
+        # 用生成的编码确认（编码中低于该级别的码元必须一致）
+        return index if self.columns(index, index + 1).codes[0].decode('ascii') == code else None
+
+    def index_of_many(self, codes: Sequence[str]) -> np.ndarray:
+        """批量版 index_of：按网格下标批量运算，再一次批量生成编码确认，不属于该区域的位置为 -1"""
+        result = np.full(len(codes), -1, dtype=np.int64)
+        (lon0, _, _), (lat0, _, _), (alt0, _, _) = self._lon, self._lat, self._alt
+        if not len(lon0) or not len(lat0) or not len(alt0):
+            return result
+        lengths = np.array([len(c) if c.isascii() else 0 for c in codes], dtype=np.int64)
+        nx, ny, nz = self.shape
+        for length in (gi.PLANE_CODE_LENGTH, gi.FULL_CODE_LENGTH):
+            pos = np.flatnonzero(lengths == length)
+            if not len(pos) or (self.level >= 6 and length != gi.FULL_CODE_LENGTH):
+                continue
+            group = [codes[p] for p in pos]
+            quad, ax, ay, ok = gh.codes_to_index(group, self.level, return_valid=True)
+            lon, lat = gh.cell_center_batch(quad, ax, ay, self.level)
+            i = np.floor((lon - lon0[0]) / self.info['lon_deg']).astype(np.int64)
+            j = np.floor((lat - lat0[0]) / self.info['lat_deg']).astype(np.int64)
+            k = np.zeros(len(group), dtype=np.int64)
+            if self.level >= 6:
+                elev = gh.elevation_batch(group)
+                ok &= ~np.isnan(elev)
+                k = np.floor((np.nan_to_num(elev) - alt0[0]) / (1000 / 2 ** (self.level - 5))).astype(np.int64)
+            ok &= (i >= 0) & (i < nx) & (j >= 0) & (j < ny) & (k >= 0) & (k < nz)
+            pos, index = pos[ok], ((i * ny + j) * nz + k)[ok]
+            # 用生成的编码确认（同 index_of）
+            match = self.take(index).codes == np.array([codes[p].encode('ascii') for p in pos], dtype='S33')
+            result[pos[match]] = index[match]
+        return result
+
+    def __contains__(self, code: str) -> bool:
+        return self.index_of(code) is not None
+
+    def covers(self, block: GridColumns) -> np.ndarray:
+        """块中各网格是否属于区域（按中心所在的网格下标运算判断，级别不同时都不属于）"""
+        (lon0, _, _), (lat0, _, _), (alt0, _, _) = self._lon, self._lat, self._alt
+        if block.level != self.level or not len(lon0) or not len(lat0) or not len(alt0):
+            return np.zeros(len(block), dtype=bool)
+        i = np.floor((block.center[:, 0] - lon0[0]) / self.info['lon_deg'])
+        j = np.floor((block.center[:, 1] - lat0[0]) / self.info['lat_deg'])
+        k = np.zeros(len(block))
+        if self.level >= 6:
+            k = np.floor((block.alt_range.mean(axis=1) - alt0[0]) / (1000 / 2 ** (self.level - 5)))
+        nx, ny, nz = self.shape
+        return (i >= 0) & (i < nx) & (j >= 0) & (j < ny) & (k >= 0) & (k < nz)
+
+    def cells_in_area(self, lon_min: float, lon_max: float,
+                      lat_min: float, lat_max: float) -> GridColumns:
+        """与指定范围相交（含边界相接）的网格，判定方式与 get_grids_by_area 相同"""
+        (lon0, lon1, _), (lat0, lat1, _) = self._lon, self._lat
+        i = np.flatnonzero((lon1 >= lon_min) & (lon0 <= lon_max))
+        j = np.flatnonzero((lat1 >= lat_min) & (lat0 <= lat_max))
+        nz = self.shape[2]
+        ii, jj, kk = (a.ravel() for a in np.meshgrid(i, j, np.arange(nz), indexing='ij'))
+        return _build_columns(self.level, self._lon, self._lat, self._alt, ii, jj, kk)
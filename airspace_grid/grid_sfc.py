@@ -0,0 +1,124 @@
+# airspace_grid/grid_sfc.py
+"""
+网格的空间填充曲线排序
+
+- grid_keys: 全球统一的 Morton（Z序）整数键。经度、纬度、高度层按该级别的全球网格索引
+  （floor(lon / 经度边长)、floor(lat / 纬度边长) 平移为非负，alt / 层高）逐位交错，
+  位数不同的维度用完后只交错其余维度；第16级为 27 + 26 + 11 = 64 位。键只保证空间局部性
+  （相近的网格键通常相近），不与编码层级对齐：各级细分数为 6 / 5 / 3 等非 2 的幂，且索引经过平移，
+  同一父网格的子网格不构成连续的键区间（例如一个第2级网格的 24 个第3级子网格分布在约 360 个键的
+  范围内，2×2 细分的级别也夹有其他网格的键）。需要“父网格 = 连续区间”时使用 grid_cellset 的层级键。
+- sort_order: 按 Morton 或 Hilbert 曲线排序的下标。Hilbert 曲线没有 Morton 的跳跃，
+  局部性更好，但只在给定网格集合的范围内（相对索引）计算，不能跨数据集比较。
+
+第6级起按 GridGenerator 的 1000 / 2^(level - 5) 米分层，低于6级的网格不分层（只排平面）。
+"""
+import math
+from typing import List, Sequence
+
+import numpy as np
+
+from .grid_index import LAT_CELL_SIZE, LON_CELL_SIZE, MAX_LEVEL
+
+MAX_ELEVATION = 1000
+LAYERED_LEVEL = 6
+CURVES = ('morton', 'hilbert')
+
+
+def _bits(count: int) -> int:
+    return max(0, math.ceil(math.log2(count))) if count > 1 else 0
+
+
+def _half_cells(level: int):
+    """半球内经度、纬度方向的网格数（第1级纬度 4° 不整除 90°，按向上取整计）"""
+    return math.ceil(180 / LON_CELL_SIZE[level] - 1e-9), math.ceil(90 / LAT_CELL_SIZE[level] - 1e-9)
+
+
+def level_bits(level: int) -> List[int]:
+    """level 级全球网格索引的位数 [经度, 纬度, 高度层]"""
+    lon_half, lat_half = _half_cells(level)
+    lon_bits, lat_bits = _bits(2 * lon_half), _bits(2 * lat_half)
+    alt_bits = level - 5 if level >= LAYERED_LEVEL else 0
+    return [lon_bits, lat_bits, alt_bits]
+
+
+def interleave(coords: Sequence[np.ndarray], bits: Sequence[int]) -> np.ndarray:
+    """各维整数坐标按位交错为 Morton 键（高位在前，位数不同的维度用完后跳过）"""
+    if sum(bits) > 64:
+        raise ValueError("Morton 键超过 64 位")
+    coords = [np.asarray(c, dtype=np.uint64) for c in coords]
+    key = np.zeros(np.broadcast(*coords).shape, dtype=np.uint64)
+    for b in range(max(bits) - 1, -1, -1):
+        for c, nbits in zip(coords, bits):
+            if b < nbits:
+                key = (key << np.uint64(1)) | ((c >> np.uint64(b)) & np.uint64(1))
+    return key
+
+
+def hilbert(coords: Sequence[np.ndarray], bits: int) -> np.ndarray:
+    """n 维整数坐标（各维 bits 位）-> Hilbert 曲线序号（Skilling 转置算法）"""
+    n = len(coords)
+    if n * bits > 64:
+        raise ValueError("Hilbert 序号超过 64 位")
+    x = [np.array(c, dtype=np.uint64) for c in coords]
+    if bits == 0:
+        return np.zeros(np.broadcast(*x).shape, dtype=np.uint64)
+    # 逆向消除
+    q = 1 << (bits - 1)
+    while q > 1:
+        p = np.uint64(q - 1)
+        for i in range(n):
+            high = (x[i] & np.uint64(q)) != 0
+            t = (x[0] ^ x[i]) & p
+            x[0] = np.where(high, x[0] ^ p, x[0] ^ t)
+            if i:
+                x[i] = np.where(high, x[i], x[i] ^ t)
+        q >>= 1
+    # 格雷编码
+    for i in range(1, n):
+        x[i] ^= x[i - 1]
+    t = np.zeros_like(x[0])
+    q = 1 << (bits - 1)
+    while q > 1:
+        t = np.where((x[n - 1] & np.uint64(q)) != 0, t ^ np.uint64(q - 1), t)
+        q >>= 1
+    for i in range(n):
+        x[i] ^= t
+    return interleave(x, [bits] * n)
+
+
+def grid_index_arrays(lons, lats, alts, level: int):
+    """经纬度高程数组 -> level 级全球网格索引 [经度, 纬度, (高度层)]"""
+    lons, lats = np.asarray(lons, dtype=np.float64), np.asarray(lats, dtype=np.float64)
+    lon_half, lat_half = _half_cells(level)
+    # 网格以赤道和本初子午线为界，先按边长取整再平移，保证一个网格对应一个索引
+    ix = np.floor(lons / LON_CELL_SIZE[level]).astype(np.int64) + lon_half
+    iy = np.floor(lats / LAT_CELL_SIZE[level]).astype(np.int64) + lat_half
+    coords = [ix, iy]
+    if level >= LAYERED_LEVEL:
+        alt_step = MAX_ELEVATION / 2 ** (level - 5)
+        iz = np.floor(np.asarray(alts, dtype=np.float64) / alt_step).astype(np.int64)
+        coords.append(np.clip(iz, 0, 2 ** (level - 5) - 1))
+    return coords
+
+
+def grid_keys(lons, lats, alts, level: int) -> np.ndarray:
+    """经纬度高程（通常取网格中心）-> level 级网格的全球 Morton 键（uint64）"""
+    if not 1 <= level <= MAX_LEVEL:
+        raise ValueError(f"无效的网格级别: {level}")
+    coords = grid_index_arrays(lons, lats, alts, level)
+    return interleave(coords, level_bits(level)[:len(coords)])
+
+
+def sort_order(lons, lats, alts, level: int, curve: str = 'morton') -> np.ndarray:
+    """按空间填充曲线排序的下标（稳定排序，相同网格保持原顺序）"""
+    if curve not in CURVES:
+        raise ValueError(f"无效的曲线类型: {curve}，可选 {CURVES}")
+    if curve == 'morton':
+        keys = grid_keys(lons, lats, alts, level)
+    else:
+        coords = grid_index_arrays(lons, lats, alts, level)
+        coords = [c - c.min() for c in coords] if len(coords[0]) else coords
+        bits = max([_bits(int(c.max()) + 1) for c in coords if len(c)] + [0])
+        keys = hilbert(coords, bits)
+    return np.argsort(keys, kind='stable')
@@ -1,9 +1,13 @@
 import json
-from risk_assessment import risk_by_code
-from flask import Flask, request, jsonify, send_from_directory
+import numpy as np
+from risk_layer import risk_by_code
+from risk_planner import plan_least_risk_route
+from flask import Flask, Response, request, jsonify, send_from_directory, stream_with_context
 from flask_cors import CORS
 import logging
+import math
 import os
+from datetime import datetime
 from airspace_grid.grid_manager import AirspaceGridManager
 
 logging.basicConfig(level=logging.INFO)
@@ -14,6 +18,9 @@ CORS(app)
 
 grid_manager = AirspaceGridManager()
 
+MAX_POLL_TIMEOUT = 60       # 长轮询最长等待（秒）
+SSE_KEEPALIVE = 15          # SSE 无变更时发送注释行的间隔（秒）
+
 # 静态文件路由
 @app.route('/')
 def index():
@@ -36,6 +43,8 @@ def get_grid_risk(grid_code: str):
     try:
         risk = risk_by_code(grid_code)
         return jsonify({"success": True, "grid_code": grid_code, "risk_level": risk})
+    except ValueError as e:
+        return jsonify({"error": f"参数无效: {str(e)}"}), 400
     except Exception as e:
         return jsonify({"error": f"服务器内部错误: {str(e)}"}), 500
 
@@ -120,10 +129,39 @@ def encode_coordinates():
     except Exception as e:
         return jsonify({"error": f"服务器内部错误: {str(e)}"}), 500
 
+def _time_arg(value):
+    """时间参数：Unix 时间戳（秒）或 ISO 8601 字符串，缺省为 None；无效时抛出 ValueError / TypeError"""
+    if value is None:
+        return None
+    if isinstance(value, bool) or not isinstance(value, (int, float, str)):
+        raise TypeError(f"无效的时间: {value!r}")
+    try:
+        value = float(value)
+    except ValueError:
+        return datetime.fromisoformat(value)
+    if not math.isfinite(value):
+        raise ValueError(f"无效的时间: {value}")
+    return value
+
+def _ttl_arg(value):
+    """有效期参数（秒，正数），缺省为 None；无效时抛出 ValueError / TypeError"""
+    if value is None:
+        return None
+    if isinstance(value, bool) or not isinstance(value, (int, float, str)):
+        raise TypeError(f"无效的 ttl: {value!r}")
+    ttl = float(value)
+    if not (math.isfinite(ttl) and ttl > 0):
+        raise ValueError(f"无效的 ttl: {value}")
+    return ttl
+
 @app.route('/api/grids/<grid_code>/attributes', methods=['GET'])
 def get_grid_attributes(grid_code: str):
     try:
-        attrs = grid_manager.get_grid_attributes(grid_code)
+        try:
+            at = _time_arg(request.args.get('at'))
+        except ValueError:
+            return jsonify({"error": "参数无效: at"}), 400
+        attrs = grid_manager.get_grid_attributes(grid_code, at)
         if attrs is None:
             return jsonify({"error": f"未找到网格属性: {grid_code}"}), 404
         
@@ -149,12 +187,30 @@ def update_grid_attribute(grid_code: str):
             if field not in data:
                 return jsonify({"error": f"缺少必需参数: {field}"}), 400
         
-        success = grid_manager.update_grid_attribute(
-            grid_code=grid_code,
-            category=data['category'],
-            key=data['key'],
-            value=data['value']
-        )
+        if 'valid_time' in data:
+            # 按时间版本写入（预报时次等），不改变当前取值
+            try:
+                valid_time = _time_arg(data['valid_time'])
+                ttl = _ttl_arg(data.get('ttl'))
+                if valid_time is None:
+                    raise ValueError("valid_time 不能为空")
+            except (TypeError, ValueError) as e:
+                return jsonify({"error": f"参数无效: {str(e)}"}), 400
+            success = grid_manager.record_grid_attribute(
+                grid_code=grid_code,
+                category=data['category'],
+                key=data['key'],
+                value=data['value'],
+                valid_time=valid_time,
+                ttl=ttl
+            )
+        else:
+            success = grid_manager.update_grid_attribute(
+                grid_code=grid_code,
+                category=data['category'],
+                key=data['key'],
+                value=data['value']
+            )
         
         if not success:
             return jsonify({"error": f"更新属性失败: {grid_code}"}), 400
@@ -166,6 +222,90 @@ def update_grid_attribute(grid_code: str):
     except Exception as e:
         return jsonify({"error": f"服务器内部错误: {str(e)}"}), 500
 
+def _cell_column(column) -> np.ndarray:
+    """JSON 数组 -> 一维取值数组：同一类型的标量转为 numpy 类型数组，其余（混合类型、列表 / 对象）逐个保存"""
+    if not isinstance(column, list):
+        raise ValueError("cell_values 的取值需要是数组")
+    kinds = {type(v) for v in column}
+    if len(kinds) == 1 and kinds <= {bool, int, float, str}:
+        return np.asarray(column)
+    result = np.empty(len(column), dtype=object)
+    for i, value in enumerate(column):
+        result[i] = value
+    return result
+
+@app.route('/api/grids/attributes/batch', methods=['POST'])
+def bulk_update_grid_attributes():
+    # 选择器为 codes / bbox / polygon 之一；values 对全部网格相同，cell_values 按选中顺序逐个网格取值
+    try:
+        data = request.get_json(silent=True) or {}
+        selectors = [name for name in ('codes', 'bbox', 'polygon') if name in data]
+        if len(selectors) != 1:
+            return jsonify({"error": "需要且只能提供 codes、bbox、polygon 之一"}), 400
+        if 'category' not in data:
+            return jsonify({"error": "缺少必需参数: category"}), 400
+        values = dict(data.get('values') or {})
+        values.update((key, _cell_column(column)) for key, column in (data.get('cell_values') or {}).items())
+        if not values:
+            return jsonify({"error": "缺少必需参数: values 或 cell_values"}), 400
+
+        report = grid_manager.bulk_update_attributes(data[selectors[0]], data['category'], values,
+                                                     valid_time=_time_arg(data.get('valid_time')),
+                                                     ttl=_ttl_arg(data.get('ttl')))
+        return jsonify({
+            "success": True,
+            "message": f"成功更新 {report['updated']} 个网格",
+            "data": report
+        })
+    except (TypeError, ValueError) as e:
+        return jsonify({"error": f"参数无效: {str(e)}"}), 400
+    except Exception as e:
+        logger.error(f"批量更新属性失败: {str(e)}")
+        return jsonify({"error": f"服务器内部错误: {str(e)}"}), 500
+
+@app.route('/api/attributes/changes', methods=['GET'])
+def get_attribute_changes():
+    # 增量同步：返回序号 since 之后的属性变更；timeout > 0 时没有新变更则等待（长轮询）
+    try:
+        since = int(request.args.get('since', 0))
+        limit = request.args.get('limit')
+        limit = int(limit) if limit is not None else None
+        timeout = float(request.args.get('timeout', 0))
+        if (limit is not None and limit < 1) or not math.isfinite(timeout) or timeout < 0:
+            raise ValueError
+        timeout = min(timeout, MAX_POLL_TIMEOUT)
+    except ValueError:
+        return jsonify({"error": "参数无效: since / limit（>= 1）/ timeout（有限非负秒数）"}), 400
+    try:
+        return jsonify({
+            "success": True,
+            "data": grid_manager.get_attribute_changes(since, limit, timeout)
+        })
+    except Exception as e:
+        return jsonify({"error": f"服务器内部错误: {str(e)}"}), 500
+
+@app.route('/api/attributes/changes/stream', methods=['GET'])
+def stream_attribute_changes():
+    # Server-Sent Events：每条变更一个事件（id 为序号），断线重连时按 Last-Event-ID 续传
+    try:
+        since = int(request.headers.get('Last-Event-ID') or request.args.get('since', 0))
+    except ValueError:
+        return jsonify({"error": "参数无效: since"}), 400
+
+    def events(seq):
+        while True:
+            result = grid_manager.get_attribute_changes(seq, timeout=SSE_KEEPALIVE)
+            if result["truncated"]:
+                yield f"event: reset\ndata: {json.dumps({'latest': result['latest']})}\n\n"
+            if not result["changes"]:
+                yield ": keep-alive\n\n"
+            for change in result["changes"]:
+                yield f"id: {change['seq']}\ndata: {json.dumps(change, ensure_ascii=False, default=str)}\n\n"
+            seq = result["next"]
+
+    return Response(stream_with_context(events(since)), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
 @app.route('/api/grids/search', methods=['POST'])
 def search_grids():
     try:
@@ -234,6 +374,57 @@ def calculate_route_grids():
     except Exception as e:
         return jsonify({"error": f"服务器内部错误: {str(e)}"}), 500
 
+def _point_arg(value, name):
+    """航点参数：[经度, 纬度, 高度] 三个有限数值；无效时抛出 ValueError"""
+    if not isinstance(value, (list, tuple)) or len(value) != 3 \
+            or any(isinstance(v, bool) or not isinstance(v, (int, float)) for v in value) \
+            or not all(math.isfinite(v) for v in value):
+        raise ValueError(f"{name} 应为 [经度, 纬度, 高度] 三个数值: {value!r}")
+    return tuple(float(v) for v in value)
+
+# 基于风险代价场规划风险最小的航线
+@app.route('/api/grids/route/plan', methods=['POST'])
+def plan_route_grids():
+    try:
+        data = request.get_json() or {}
+        for field in ('start', 'goal'):
+            if field not in data:
+                return jsonify({"error": f"缺少必需参数: {field}"}), 400
+        try:
+            start = _point_arg(data['start'], 'start')
+            goal = _point_arg(data['goal'], 'goal')
+            level = int(data.get('level', 11))
+            if not 1 <= level <= 16:
+                raise ValueError(f"无效的网格级别: {level}")
+            distance_weight = float(data.get('distance_weight', 1.0))
+            if not (math.isfinite(distance_weight) and distance_weight >= 0):
+                raise ValueError(f"distance_weight 应为非负数: {distance_weight}")
+            alt_min = float(data.get('alt_min', 0.0))
+            alt_max = float(data.get('alt_max', 300.0))
+            margin = float(data.get('margin', 0.01))
+        except (TypeError, ValueError) as e:
+            return jsonify({"error": str(e)}), 400
+        result = plan_least_risk_route(
+            start, goal, level=level, alt_min=alt_min, alt_max=alt_max,
+            margin=margin, distance_weight=distance_weight
+        )
+        return jsonify({
+            "success": True,
+            "data": {
+                "grid_codes": result['codes'],
+                "cells": result['cells'],
+                "count": len(result['codes']),
+                "level": level,
+                "length": result['length'],
+                "risk_integral": result['risk_integral'],
+                "max_risk": result['max_risk']
+            }
+        })
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": f"服务器内部错误: {str(e)}"}), 500
+
 # 加载航线数据接口
 @app.route('/api/routes', methods=['GET'])
 def get_routes():
@@ -0,0 +1,95 @@
+"""
+航线通道数据的向量化加载
+
+将解析后的航线（parse_channel_data 的输出）一次性展开为扁平的 NumPy 数组
+(route_idx, t, x, y, z)，再通过花式索引散射到 (航线数, 时间步, 3) 的稠密字段中。
+有效掩码由写入的位置显式给出，不再依赖坐标是否为0来推断。
+"""
+from dataclasses import dataclass
+from typing import List, Tuple
+
+import numpy as np
+
+
+@dataclass
+class ChannelPoints:
+    """展开后的航点数组"""
+    route_idx: np.ndarray  # (N,) int32 航线索引
+    t: np.ndarray          # (N,) int64 时间步（秒）
+    xyz: np.ndarray        # (N, 3) float32 坐标 (经度, 纬度, 高度)
+    total_points: int = 0  # 输入航点总数
+    skipped_points: int = 0  # 因字段缺失、越界或时间步重复而跳过的航点数
+
+
+def flatten_channels(channels: List[dict], max_time_steps: int = 86400) -> ChannelPoints:
+    """
+    将航线列表展开为扁平数组
+
+    跳过规则与原逐点实现一致：缺少 expected_time_seconds、坐标无效、
+    时间步越界的航点被丢弃；同一航线同一时间步只保留第一个有效航点。
+
+    参数:
+    - channels: 航线列表，每个元素包含 'points'
+    - max_time_steps: 最大时间步
+
+    返回:
+    - ChannelPoints
+    """
+    route_idx = []
+    times = []
+    coords = []
+    total_points = 0
+
+    for i, channel in enumerate(channels):
+        points = channel.get('points', [])
+        total_points += len(points)
+        for point in points:
+            try:
+                t = int(point['expected_time_seconds'])
+                c = point['geometry']['coordinates']
+                if not isinstance(c, (list, tuple)) or len(c) < 3:
+                    continue
+                coords.append((float(c[0]), float(c[1]), float(c[2])))
+            except (ValueError, KeyError, TypeError):
+                continue
+            route_idx.append(i)
+            times.append(t)
+
+    route_idx = np.asarray(route_idx, dtype=np.int32)
+    times = np.asarray(times, dtype=np.int64)
+    xyz = np.asarray(coords, dtype=np.float32).reshape(-1, 3)
+
+    # 时间步越界
+    in_range = (times >= 0) & (times < max_time_steps)
+    route_idx, times, xyz = route_idx[in_range], times[in_range], xyz[in_range]
+
+    # 同一航线同一时间步只保留第一个点（np.unique 返回首次出现的位置）
+    keys = route_idx.astype(np.int64) * max_time_steps + times
+    _, first = np.unique(keys, return_index=True)
+    first.sort()
+    route_idx, times, xyz = route_idx[first], times[first], xyz[first]
+
+    return ChannelPoints(
+        route_idx=route_idx,
+        t=times,
+        xyz=xyz,
+        total_points=total_points,
+        skipped_points=total_points - len(first)
+    )
+
+
+def scatter_channel_field(points: ChannelPoints, num_channel: int,
+                          max_time_steps: int = 86400,
+                          num_dimensions: int = 3) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    将扁平航点散射为稠密通道字段和有效掩码
+
+    返回:
+    - channel_np: (num_channel, max_time_steps, num_dimensions) float32
+    - valid_mask: (num_channel, max_time_steps) bool，写入过的位置为 True
+    """
+    channel_np = np.zeros((num_channel, max_time_steps, num_dimensions), dtype=np.float32)
+    valid_mask = np.zeros((num_channel, max_time_steps), dtype=bool)
+    channel_np[points.route_idx, points.t] = points.xyz[:, :num_dimensions]
+    valid_mask[points.route_idx, points.t] = True
+    return channel_np, valid_mask
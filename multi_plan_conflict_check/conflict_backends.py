@@ -0,0 +1,322 @@
+"""
+冲突检测计算后端
+
+- taichi: 原有的 Taichi 内核（需要安装 taichi）
+- numpy: 纯 NumPy 实现，按时间轴分区后交给进程池并行计算，
+  航线数组通过 multiprocessing.shared_memory 共享，不在进程间复制
+
+两个后端返回相同的结果：按 (t, 已有航线索引, 新航线全局索引) 排序的 int32 三元组，
+距离比较均在 float32 下进行，与 Taichi 内核的精度一致。
+后端可通过参数或环境变量 CONFLICT_BACKEND（auto / taichi / numpy）选择，
+auto 优先使用 Taichi，不可用或 JIT 失败时回退到 NumPy。
+"""
+import atexit
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+from conflict_logging import LOGGER_NAME
+from conflict_results import collect_triplets
+
+try:
+    import taichi as ti
+except ImportError:  # 未安装 Taichi 时只提供 NumPy 后端
+    ti = None
+
+logger = logging.getLogger(LOGGER_NAME)
+
+BACKENDS = ("auto", "taichi", "numpy")
+
+# 单次向量化比较的组合数上限，控制峰值内存
+CHUNK_ELEMENTS = 4_000_000
+# 比较次数低于该值时直接在当前进程计算，避免进程池开销
+MIN_PARALLEL_ELEMENTS = 20_000_000
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _default_workers() -> int:
+    """默认并行度（CONFLICT_WORKERS 环境变量，未设置时为 CPU 数），也是进程池的大小"""
+    return int(os.environ.get("CONFLICT_WORKERS", 0)) or os.cpu_count() or 1
+
+
+def available_backends():
+    """返回当前环境可用的后端"""
+    return ["taichi", "numpy"] if ti is not None else ["numpy"]
+
+
+def resolve_backend(name: Optional[str] = None) -> str:
+    """解析后端名称，未指定时读取 CONFLICT_BACKEND 环境变量"""
+    name = (name or os.environ.get("CONFLICT_BACKEND", "auto")).lower()
+    if name not in BACKENDS:
+        raise ValueError(f"未知的冲突检测后端: {name}，可选: {', '.join(BACKENDS)}")
+    if name == "taichi" and ti is None:
+        raise ValueError("Taichi 后端不可用：未安装 taichi")
+    if name == "auto":
+        return "taichi" if ti is not None else "numpy"
+    return name
+
+
+def detect_triplets(channel_np: np.ndarray, valid_mask: np.ndarray, existing_count: int,
+                    epsilon: float, backend: Optional[str] = None, workers: Optional[int] = None,
+                    timings: Optional[Dict[str, float]] = None) -> Tuple[np.ndarray, str]:
+    """
+    检测新航线与已有航线之间的冲突
+
+    参数:
+    - channel_np: (航线数, 时间步, 3) float32，前 existing_count 条为已有航线
+    - valid_mask: (航线数, 时间步) bool
+    - existing_count: 已有航线数量
+    - epsilon: 冲突距离阈值
+    - backend: auto / taichi / numpy，默认读取 CONFLICT_BACKEND
+    - workers: NumPy 后端的并行度（分区数 = workers × 4），默认读取 CONFLICT_WORKERS，未设置时为 CPU 核数；
+      进程池大小固定为默认并行度，不随 workers 变化
+    - timings: 可选字典，写入 'jit'（后端准备）和 'kernel'（检测计算）耗时
+
+    返回:
+    - (triplets, 实际使用的后端)
+    """
+    requested = (backend or os.environ.get("CONFLICT_BACKEND", "auto")).lower()
+    name = resolve_backend(requested)
+    timings = timings if timings is not None else {}
+
+    if name == "taichi":
+        try:
+            return _detect_taichi(channel_np, valid_mask, existing_count, epsilon, timings), "taichi"
+        except Exception:
+            if requested != "auto":
+                raise
+            logger.warning("Taichi 后端执行失败，回退到 NumPy 后端", exc_info=True)
+
+    return _detect_numpy(channel_np, valid_mask, existing_count, epsilon, workers, timings), "numpy"
+
+
+# ---------------------------------------------------------------- Taichi 后端
+
+if ti is not None:
+    @ti.kernel
+    def collect_conflicts_between_groups(channel_field: ti.template(), valid_mask: ti.template(),
+                                       existing_count: int, epsilon: float,
+                                       result_triplets: ti.types.ndarray(),
+                                       result_count: ti.types.ndarray(),
+                                       conflict_flags: ti.types.ndarray()):
+        """检测新航线与已有航线之间的冲突"""
+        n = channel_field.shape[0]  # 总航线数
+        tmax = channel_field.shape[1]
+        epsilon_sq = epsilon * epsilon
+
+        # 只检测新航线与已有航线之间的冲突
+        for t in range(tmax):
+            for i in range(existing_count, n):  # i: 新航线索引
+                for j in range(0, existing_count):  # j: 已有航线索引
+                    if valid_mask[i, t] and valid_mask[j, t]:
+                        p1 = channel_field[i, t]
+                        p2 = channel_field[j, t]
+                        dist_sq = (p1 - p2).norm_sqr()
+                        if dist_sq < epsilon_sq:
+                            ti.atomic_max(conflict_flags[t], 1)
+                            idx = ti.atomic_add(result_count[0], 1)
+                            if idx < result_triplets.shape[0]:
+                                result_triplets[idx, 0] = t
+                                result_triplets[idx, 1] = j  # 已有航线索引
+                                result_triplets[idx, 2] = i  # 新航线索引
+
+
+def _detect_taichi(channel_np, valid_mask, existing_count, epsilon, timings):
+    num_channel, max_time_steps, _ = channel_np.shape
+    start = time.perf_counter()
+
+    # 初始化 Taichi
+    ti.init(arch=ti.cpu)
+
+    # 创建 Taichi 字段
+    valid_mask_field = ti.field(dtype=ti.i8, shape=(num_channel, max_time_steps))
+    valid_mask_field.from_numpy(valid_mask.astype(np.int8))
+
+    # 定义稀疏字段
+    channel_field = ti.Vector.field(3, dtype=ti.f32)
+    ti.root.dense(ti.i, num_channel).pointer(ti.j, max_time_steps).place(channel_field)
+
+    # 填充稀疏字段
+    @ti.kernel
+    def fill_sparse_channel(channel_np: ti.types.ndarray()):
+        for i in range(num_channel):
+            for t in range(max_time_steps):
+                if valid_mask_field[i, t] == 1:
+                    channel_field[i, t] = ti.Vector([
+                        channel_np[i, t, 0],
+                        channel_np[i, t, 1],
+                        channel_np[i, t, 2]
+                    ])
+
+    fill_sparse_channel(channel_np)
+    timings["jit"] = time.perf_counter() - start
+
+    # 缓冲区不足时按精确计数重新分配并重跑
+    conflict_flags = np.zeros(max_time_steps, dtype=np.int32)
+    result_count = np.zeros(1, dtype=np.int32)
+
+    def run_kernel(result_triplets):
+        conflict_flags[:] = 0
+        result_count[:] = 0
+        collect_conflicts_between_groups(channel_field, valid_mask_field, existing_count, epsilon,
+                                         result_triplets, result_count, conflict_flags)
+        return int(result_count[0])
+
+    start = time.perf_counter()
+    triplets = collect_triplets(run_kernel)
+    timings["kernel"] = time.perf_counter() - start
+    return triplets
+
+
+# ---------------------------------------------------------------- NumPy 后端
+
+def _detect_numpy(channel_np, valid_mask, existing_count, epsilon, workers, timings):
+    eps_sq = np.float32(epsilon) * np.float32(epsilon)
+    if workers is None:
+        workers = _default_workers()
+
+    # 每个时间步需要比较的组合数：有效已有航线数 × 有效新航线数
+    pairs = (valid_mask[:existing_count].sum(axis=0, dtype=np.int64) *
+             valid_mask[existing_count:].sum(axis=0, dtype=np.int64))
+    active = np.flatnonzero(pairs)
+    work = int(pairs.sum())
+
+    if workers <= 1 or work < MIN_PARALLEL_ELEMENTS:
+        timings["jit"] = 0.0
+        start = time.perf_counter()
+        triplets = _detect_time_range(channel_np, valid_mask, existing_count, eps_sq, active)
+        timings["kernel"] = time.perf_counter() - start
+        return triplets
+
+    start = time.perf_counter()
+    executor = _get_executor()
+    channel_shm = _to_shared(channel_np)
+    mask_shm = _to_shared(valid_mask)
+    timings["jit"] = time.perf_counter() - start
+
+    try:
+        start = time.perf_counter()
+        # 按时间轴分区，按比较量均分，分区数多于进程数以平衡负载
+        parts_count = workers * 4
+        cuts = np.searchsorted(np.cumsum(pairs[active]), work * np.arange(1, parts_count) / parts_count)
+        partitions = [p for p in np.split(active, cuts) if len(p)]
+        futures = [
+            executor.submit(_detect_partition, channel_shm.name, channel_np.shape, channel_np.dtype.str,
+                            mask_shm.name, valid_mask.shape, existing_count, eps_sq, part)
+            for part in partitions
+        ]
+        parts = [f.result() for f in futures]
+        timings["kernel"] = time.perf_counter() - start
+    finally:
+        for shm in (channel_shm, mask_shm):
+            shm.close()
+            shm.unlink()
+
+    # 分区按时间升序排列，拼接后仍按 (t, j, i) 有序
+    return np.concatenate(parts) if parts else np.zeros((0, 3), dtype=np.int32)
+
+
+def _detect_time_range(channel_np, valid_mask, existing_count, eps_sq, times):
+    """
+    在给定时间步上比较有效的 (新航线, 已有航线) 对，返回按 (t, j, i) 排序的三元组
+
+    只枚举同一时间步内双方都有效的组合，航线稀疏分布在时间轴上时
+    计算量与实际组合数成正比，而不是 航线数² × 时间步。
+    """
+    if len(times) == 0:
+        return np.zeros((0, 3), dtype=np.int32)
+
+    # 有效点按 (时间, 航线) 排序
+    tt_e, jj = np.nonzero(valid_mask[:existing_count, times].T)
+    tt_n, ii = np.nonzero(valid_mask[existing_count:, times].T)
+    e_xyz = channel_np[jj, times[tt_e]]
+    n_xyz = channel_np[ii + existing_count, times[tt_n]]
+
+    ce = np.bincount(tt_e, minlength=len(times))
+    cn = np.bincount(tt_n, minlength=len(times))
+    e_off = np.cumsum(ce) - ce
+    n_off = np.cumsum(cn) - cn
+    pairs = ce * cn
+    cum = np.cumsum(pairs)
+
+    results = []
+    lo = 0
+    while lo < len(times):
+        # 每块的组合数不超过 CHUNK_ELEMENTS（单个时间步超出时独立成块）
+        base = cum[lo - 1] if lo else 0
+        hi = max(lo + 1, int(np.searchsorted(cum, base + CHUNK_ELEMENTS, side="right")))
+        block = np.arange(lo, min(hi, len(times)))
+        lo = hi
+        counts = pairs[block]
+        total = int(counts.sum())
+        if total == 0:
+            continue
+
+        # 展开块内每个时间步的 已有 × 新 组合，已有航线为外层，保证 (t, j, i) 顺序
+        bid = np.repeat(block, counts)
+        local = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+        width = cn[bid]
+        ej = e_off[bid] + local // width
+        ni = n_off[bid] + local % width
+
+        diff = n_xyz[ni] - e_xyz[ej]  # float32
+        dist_sq = diff[:, 0] * diff[:, 0] + diff[:, 1] * diff[:, 1] + diff[:, 2] * diff[:, 2]
+        hit = np.flatnonzero(dist_sq < eps_sq)
+        if len(hit):
+            results.append(np.stack([times[bid[hit]], jj[ej[hit]], ii[ni[hit]] + existing_count],
+                                    axis=1).astype(np.int32))
+
+    return np.concatenate(results) if results else np.zeros((0, 3), dtype=np.int32)
+
+
+def _detect_partition(channel_name, channel_shape, channel_dtype, mask_name, mask_shape,
+                      existing_count, eps_sq, times):
+    """进程池任务：附加到共享内存并计算一个时间分区"""
+    channel_shm = shared_memory.SharedMemory(name=channel_name)
+    mask_shm = shared_memory.SharedMemory(name=mask_name)
+    try:
+        channel_np = np.ndarray(channel_shape, dtype=np.dtype(channel_dtype), buffer=channel_shm.buf)
+        valid_mask = np.ndarray(mask_shape, dtype=bool, buffer=mask_shm.buf)
+        triplets = _detect_time_range(channel_np, valid_mask, existing_count, eps_sq, times)
+        del channel_np, valid_mask
+        return triplets
+    finally:
+        channel_shm.close()
+        mask_shm.close()
+
+
+def _to_shared(arr: np.ndarray) -> shared_memory.SharedMemory:
+    shm = shared_memory.SharedMemory(create=True, size=max(1, arr.nbytes))
+    np.ndarray(arr.shape, dtype=arr.dtype, buffer=shm.buf)[...] = arr
+    return shm
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    """
+    进程内共享的固定大小进程池（_default_workers 个进程）
+
+    首次使用时在锁内创建，之后不再重建或关闭（直到进程退出），并发请求可安全共用；
+    各请求的 workers 只决定分区数，不改变进程池大小。
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(max_workers=_default_workers())
+        return _executor
+
+
+@atexit.register
+def _shutdown_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown()
+            _executor = None
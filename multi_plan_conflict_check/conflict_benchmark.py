@@ -0,0 +1,264 @@
+"""
+冲突检测基准测试
+
+生成 parse_channel_data 格式（{"channels": [...]}）的合成航线，按规模扫描运行
+与 detect_conflicts 相同的流水线，输出 JSON 格式的结果，便于做性能回归跟踪：
+
+- 各阶段耗时：ingest（航点展开与填充）、jit（后端准备/编译）、kernel（冲突计算）、
+  extraction（事件合并与格式化）
+- 吞吐量：每秒比较的 (新航线, 已有航线, 时间步) 组合数
+- 峰值内存：tracemalloc 峰值与进程最大常驻内存 (ru_maxrss)
+
+用法:
+    python conflict_benchmark.py --sizes 10x10,100x100 --backends numpy,taichi --output bench.json
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+from typing import Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from channel_field import flatten_channels, scatter_channel_field
+from conflict_backends import available_backends, detect_triplets
+from conflict_results import aggregate_episodes, format_episodes
+
+try:
+    import resource
+except ImportError:  # Windows 没有 resource 模块
+    resource = None
+
+# 惠州空域边界
+LON_RANGE = (113.7550, 114.6380)
+LAT_RANGE = (22.4480, 22.8340)
+ALT_RANGE = (50.0, 300.0)
+
+DEFAULT_SIZES = [(10, 10), (50, 50), (100, 100), (200, 200)]
+
+
+def generate_fleet(num_existing: int, num_new: int, duration: int = 1800, interval: int = 1,
+                   conflict_rate: float = 0.1, max_time_steps: int = 20000, epsilon: float = 0.001,
+                   seed: int = 0) -> Tuple[dict, dict]:
+    """
+    生成合成航线
+
+    参数:
+    - num_existing / num_new: 已有航线数与新航线数
+    - duration: 每条航线的飞行时长（秒）
+    - interval: 航点间隔（秒），决定航点密度
+    - conflict_rate: 新航线中跟随某条已有航线飞行（间距小于 epsilon）的比例
+    - max_time_steps: 时间范围，航线起飞时间在其中随机分布
+    - epsilon: 冲突距离阈值
+    - seed: 随机种子
+
+    返回:
+    - (已有航线数据, 新航线数据)，均为 {"channels": [...]} 格式
+    """
+    rng = np.random.default_rng(seed)
+    duration = max(2, min(duration, max_time_steps))
+    offsets = np.arange(0, duration, max(1, interval))
+
+    def random_track():
+        start = rng.uniform([LON_RANGE[0], LAT_RANGE[0]], [LON_RANGE[1], LAT_RANGE[1]])
+        end = rng.uniform([LON_RANGE[0], LAT_RANGE[0]], [LON_RANGE[1], LAT_RANGE[1]])
+        frac = offsets[:, None] / offsets[-1]
+        lonlat = start + (end - start) * frac
+        alt = np.full((len(offsets), 1), rng.uniform(*ALT_RANGE))
+        t0 = int(rng.integers(0, max_time_steps - duration + 1))
+        return np.hstack([lonlat, alt]), offsets + t0
+
+    def to_channel(idx, prefix, coords, times):
+        return {
+            "id": idx,
+            "code": f"{prefix}-{idx:05d}",
+            "name": f"{prefix}_{idx}",
+            "points": [
+                {
+                    "num": k + 1,
+                    "geometry": {"coordinates": [float(c[0]), float(c[1]), float(c[2])]},
+                    "expected_time_seconds": int(t)
+                }
+                for k, (c, t) in enumerate(zip(coords, times))
+            ]
+        }
+
+    existing_tracks = [random_track() for _ in range(num_existing)]
+    existing = [to_channel(i, "existing", c, t) for i, (c, t) in enumerate(existing_tracks)]
+
+    new = []
+    for i in range(num_new):
+        if existing_tracks and rng.random() < conflict_rate:
+            # 跟随一条已有航线，经度方向偏移半个阈值
+            coords, times = existing_tracks[rng.integers(len(existing_tracks))]
+            coords = coords + np.array([epsilon * 0.5, 0.0, 0.0])
+        else:
+            coords, times = random_track()
+        new.append(to_channel(num_existing + i, "new", coords, times))
+
+    return {"channels": existing}, {"channels": new}
+
+
+def run_case(existing_data: dict, new_data: dict, backend: str = "auto", epsilon: float = 0.001,
+             max_time_steps: int = 20000, workers: Optional[int] = None,
+             trace_memory: bool = True) -> dict:
+    """
+    对一组航线运行一次完整检测并记录各阶段指标
+
+    与 detect_conflicts 相同：航点展开 -> 后端检测 -> 事件合并 -> 结果格式化
+    """
+    existing_routes = existing_data["channels"]
+    new_routes = new_data["channels"]
+    routes = existing_routes + new_routes
+    existing_count = len(existing_routes)
+
+    if trace_memory:
+        tracemalloc.start()
+    timings = {}
+    try:
+        start = time.perf_counter()
+        points = flatten_channels(routes, max_time_steps=max_time_steps)
+        channel_np, valid_mask = scatter_channel_field(points, len(routes), max_time_steps)
+        timings["ingest"] = time.perf_counter() - start
+
+        triplets, backend_used = detect_triplets(channel_np, valid_mask, existing_count, epsilon,
+                                                 backend=backend, workers=workers, timings=timings)
+
+        start = time.perf_counter()
+        episodes = aggregate_episodes(triplets, existing_count)
+        conflicts = format_episodes(episodes, existing_routes, new_routes)
+        timings["extraction"] = time.perf_counter() - start
+        peak_bytes = tracemalloc.get_traced_memory()[1] if trace_memory else None
+    finally:
+        if trace_memory:
+            tracemalloc.stop()
+
+    # 实际参与比较的组合数：每个时间步有效的已有航线数 × 有效的新航线数
+    pair_steps = int(np.dot(valid_mask[:existing_count].sum(axis=0, dtype=np.int64),
+                            valid_mask[existing_count:].sum(axis=0, dtype=np.int64)))
+    total = sum(timings.values())
+
+    return {
+        "backend": backend_used,
+        "num_existing_routes": existing_count,
+        "num_new_routes": len(new_routes),
+        "valid_points": int(len(points.t)),
+        "pair_time_steps": pair_steps,
+        "conflict_count": int(len(triplets)),
+        "episode_count": len(conflicts),
+        "timings": {k: round(v, 6) for k, v in timings.items()},
+        "total_time": round(total, 6),
+        "kernel_throughput": round(pair_steps / timings["kernel"], 1) if timings.get("kernel") else None,
+        "end_to_end_throughput": round(pair_steps / total, 1) if total else None,
+        "peak_traced_bytes": peak_bytes,
+        "max_rss_kb": _max_rss_kb()
+    }
+
+
+def run_sweep(sizes: Iterable[Tuple[int, int]] = DEFAULT_SIZES, backends: Iterable[str] = ("auto",),
+              repeat: int = 1, **options) -> dict:
+    """
+    按规模与后端扫描运行基准测试
+
+    参数:
+    - sizes: (已有航线数, 新航线数) 列表
+    - backends: 后端列表
+    - repeat: 每个组合重复次数
+    - options: duration / interval / conflict_rate / max_time_steps / epsilon / seed / workers /
+      trace_memory
+
+    返回:
+    - {"meta": 运行环境, "config": 参数, "results": 每次运行的记录}
+    """
+    gen_keys = ("duration", "interval", "conflict_rate", "max_time_steps", "epsilon", "seed")
+    gen_options = {k: options[k] for k in gen_keys if k in options}
+    run_options = {k: options[k] for k in ("epsilon", "max_time_steps", "workers", "trace_memory")
+                   if k in options}
+
+    results = []
+    for num_existing, num_new in sizes:
+        existing_data, new_data = generate_fleet(num_existing, num_new, **gen_options)
+        for backend in backends:
+            for run in range(repeat):
+                record = run_case(existing_data, new_data, backend=backend, **run_options)
+                record["run"] = run
+                results.append(record)
+                print(f"[bench] {num_existing}x{num_new} {record['backend']} #{run}: "
+                      f"{record['total_time']:.3f}s, {record['conflict_count']} conflicts",
+                      file=sys.stderr)
+
+    return {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "available_backends": available_backends()
+        },
+        "config": {"sizes": [list(s) for s in sizes], "backends": list(backends), "repeat": repeat,
+                   **{k: v for k, v in options.items()}},
+        "results": results
+    }
+
+
+def _max_rss_kb() -> Optional[int]:
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS 以字节为单位，Linux 以 KB 为单位
+    return rss // 1024 if sys.platform == "darwin" else rss
+
+
+def _parse_sizes(text: str) -> List[Tuple[int, int]]:
+    sizes = []
+    for item in text.split(","):
+        n, _, m = item.strip().lower().partition("x")
+        sizes.append((int(n), int(m or n)))
+    return sizes
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="冲突检测基准测试")
+    parser.add_argument("--sizes", default=",".join(f"{n}x{m}" for n, m in DEFAULT_SIZES),
+                        help="规模列表，如 10x10,100x50（已有航线数x新航线数）")
+    parser.add_argument("--backends", default="auto", help="后端列表，如 numpy,taichi")
+    parser.add_argument("--duration", type=int, default=1800, help="每条航线飞行时长（秒）")
+    parser.add_argument("--interval", type=int, default=1, help="航点间隔（秒）")
+    parser.add_argument("--conflict-rate", type=float, default=0.1, help="冲突航线比例")
+    parser.add_argument("--max-time-steps", type=int, default=20000, help="最大时间步")
+    parser.add_argument("--epsilon", type=float, default=0.001, help="冲突距离阈值")
+    parser.add_argument("--workers", type=int, default=None, help="NumPy 后端进程数")
+    parser.add_argument("--repeat", type=int, default=1, help="每个组合重复次数")
+    parser.add_argument("--seed", type=int, default=0, help="随机种子")
+    parser.add_argument("--no-tracemalloc", action="store_true", help="不统计 tracemalloc 峰值（减少计时干扰）")
+    parser.add_argument("--output", help="结果输出文件，默认输出到 stdout")
+    args = parser.parse_args(argv)
+
+    report = run_sweep(
+        _parse_sizes(args.sizes),
+        [b.strip() for b in args.backends.split(",") if b.strip()],
+        repeat=args.repeat,
+        duration=args.duration,
+        interval=args.interval,
+        conflict_rate=args.conflict_rate,
+        max_time_steps=args.max_time_steps,
+        epsilon=args.epsilon,
+        seed=args.seed,
+        workers=args.workers,
+        trace_memory=not args.no_tracemalloc
+    )
+
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
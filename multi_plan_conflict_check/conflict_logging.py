@@ -0,0 +1,88 @@
+"""
+冲突检测服务的日志配置
+
+请求线程只把日志记录放入内存队列（QueueHandler），由后台 QueueListener 线程
+统一写文件和 stderr，避免每条日志都同步打开文件、刷新输出。
+日志级别可通过环境变量 CONFLICT_LOG_LEVEL 设置（默认 INFO），
+低于该级别的记录在调用处即被丢弃，不做任何格式化。
+"""
+import atexit
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+
+LOGGER_NAME = "conflict_detection"
+DEFAULT_LOG_FILE = "debug.log"
+LOG_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+
+_listener = None
+_queue_handler = None
+
+
+class StructuredFormatter(logging.Formatter):
+    """在消息后以 key=value 形式追加 extra={'fields': {...}} 中的结构化字段"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        message = super().format(record)
+        fields = getattr(record, 'fields', None)
+        if fields:
+            message += " | " + " ".join(f"{k}={v}" for k, v in fields.items())
+        return message
+
+
+def setup_logging(level=None, log_file=None) -> logging.Logger:
+    """
+    初始化异步日志（重复调用只会调整级别）
+
+    参数:
+    - level: 日志级别，默认读取 CONFLICT_LOG_LEVEL，未设置时为 INFO
+    - log_file: 日志文件路径，默认读取 CONFLICT_LOG_FILE，未设置时为 debug.log
+
+    返回:
+    - 冲突检测模块使用的 logger
+    """
+    global _listener, _queue_handler
+
+    if level is None:
+        level = os.environ.get("CONFLICT_LOG_LEVEL", "INFO")
+    if isinstance(level, str):
+        level = logging.getLevelName(level.upper())
+        if not isinstance(level, int):
+            level = logging.INFO
+
+    logger = logging.getLogger(LOGGER_NAME)
+    logger.setLevel(level)
+
+    if _listener is None:
+        log_file = log_file or os.environ.get("CONFLICT_LOG_FILE", DEFAULT_LOG_FILE)
+        formatter = StructuredFormatter(LOG_FORMAT)
+        file_handler = logging.FileHandler(log_file, encoding="utf-8")
+        file_handler.setFormatter(formatter)
+        stream_handler = logging.StreamHandler(sys.stderr)
+        stream_handler.setFormatter(formatter)
+
+        log_queue = queue.SimpleQueue()
+        _queue_handler = logging.handlers.QueueHandler(log_queue)
+        logger.addHandler(_queue_handler)
+        logger.propagate = False
+
+        _listener = logging.handlers.QueueListener(
+            log_queue, file_handler, stream_handler, respect_handler_level=True
+        )
+        _listener.start()
+        atexit.register(shutdown_logging)
+
+    return logger
+
+
+def shutdown_logging() -> None:
+    """停止后台写日志线程并刷新剩余记录"""
+    global _listener, _queue_handler
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+    if _queue_handler is not None:
+        logging.getLogger(LOGGER_NAME).removeHandler(_queue_handler)
+        _queue_handler = None
@@ -0,0 +1,142 @@
+"""
+冲突检测结果提取
+
+- collect_triplets: 先用较小的缓冲区运行检测，若计数溢出则按精确计数重新分配后再运行一次，
+  不再预分配固定的 1,000,000 行，也不会静默丢弃超出部分
+- aggregate_episodes: 把逐秒的 (t, 已有航线, 新航线) 三元组合并为
+  (航线对, 连续时间区间) 冲突事件
+- iter_result_json: 以流式 JSON 输出检测结果，冲突事件和冲突时间步等数组分批序列化
+"""
+import json
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterator, List
+
+import numpy as np
+
+DEFAULT_INITIAL_CAPACITY = 65536
+JSON_CHUNK_EPISODES = 1000
+JSON_CHUNK_VALUES = 65536
+
+
+@dataclass
+class ConflictEpisodes:
+    """冲突事件（同一航线对在连续时间步内的冲突合并为一条）"""
+    existing_idx: np.ndarray  # (K,) 已有航线索引
+    new_idx: np.ndarray       # (K,) 新航线索引（相对于新航线列表）
+    start_t: np.ndarray       # (K,) 起始时间步
+    end_t: np.ndarray         # (K,) 结束时间步（含）
+
+    def __len__(self) -> int:
+        return len(self.start_t)
+
+
+def collect_triplets(run_detection: Callable[[np.ndarray], int],
+                     initial_capacity: int = DEFAULT_INITIAL_CAPACITY) -> np.ndarray:
+    """
+    收集全部冲突三元组
+
+    参数:
+    - run_detection: 检测函数，接收 (capacity, 3) int32 缓冲区，
+      写入不超过容量的三元组并返回冲突总数（可能大于容量）
+    - initial_capacity: 首次运行的缓冲区行数
+
+    返回:
+    - (count, 3) int32 数组，列为 (t, 已有航线索引, 新航线全局索引)，按该顺序排序
+    """
+    buffer = np.zeros((max(1, initial_capacity), 3), dtype=np.int32)
+    count = run_detection(buffer)
+    if count > buffer.shape[0]:
+        # 计数溢出：按精确数量重新分配并再运行一次
+        buffer = np.zeros((count, 3), dtype=np.int32)
+        count = run_detection(buffer)
+    triplets = buffer[:count]
+    # 并行内核写入顺序不确定，统一排序保证结果稳定
+    order = np.lexsort((triplets[:, 2], triplets[:, 1], triplets[:, 0]))
+    return triplets[order]
+
+
+def aggregate_episodes(triplets: np.ndarray, existing_count: int) -> ConflictEpisodes:
+    """
+    将冲突三元组合并为冲突事件
+
+    参数:
+    - triplets: (N, 3) 数组，列为 (t, 已有航线索引, 新航线全局索引)
+    - existing_count: 已有航线数量，用于把新航线全局索引换算为新航线列表下标
+    """
+    if len(triplets) == 0:
+        empty = np.zeros(0, dtype=np.int64)
+        return ConflictEpisodes(empty, empty, empty, empty)
+
+    t = triplets[:, 0].astype(np.int64)
+    j = triplets[:, 1].astype(np.int64)
+    i = triplets[:, 2].astype(np.int64)
+    order = np.lexsort((t, i, j))
+    t, j, i = t[order], j[order], i[order]
+
+    # 航线对变化或时间不连续处开始新事件
+    breaks = np.ones(len(t), dtype=bool)
+    breaks[1:] = (j[1:] != j[:-1]) | (i[1:] != i[:-1]) | (t[1:] != t[:-1] + 1)
+    starts = np.flatnonzero(breaks)
+    ends = np.append(starts[1:], len(t)) - 1
+
+    return ConflictEpisodes(
+        existing_idx=j[starts],
+        new_idx=i[starts] - existing_count,
+        start_t=t[starts],
+        end_t=t[ends]
+    )
+
+
+def format_episodes(episodes: ConflictEpisodes, existing_routes: List[dict],
+                    new_routes: List[dict], start: int = 0, stop: int = None) -> List[dict]:
+    """将冲突事件格式化为接口返回的字典列表"""
+    stop = len(episodes) if stop is None else min(stop, len(episodes))
+    conflicts = []
+    for k in range(start, stop):
+        j = int(episodes.existing_idx[k])
+        i = int(episodes.new_idx[k])
+        existing_route = existing_routes[j]
+        new_route = new_routes[i]
+        start_t = int(episodes.start_t[k])
+        end_t = int(episodes.end_t[k])
+        conflicts.append({
+            "existing_route_id": existing_route.get('id', f'route_{j}'),
+            "new_route_id": new_route.get('id', f'route_{i}'),
+            "existing_route_name": existing_route.get('name', f'Route {j}'),
+            "new_route_name": new_route.get('name', f'Route {i}'),
+            "start_time_step": start_t,
+            "end_time_step": end_t,
+            "duration": end_t - start_t + 1
+        })
+    return conflicts
+
+
+def iter_result_json(result: dict, episodes: ConflictEpisodes, existing_routes: List[dict],
+                     new_routes: List[dict], chunk_size: int = JSON_CHUNK_EPISODES,
+                     arrays: Dict[str, np.ndarray] = None) -> Iterator[str]:
+    """
+    流式生成检测结果 JSON
+
+    先输出 result 中的汇总字段，再分批输出 arrays 中的一维数组（如 "conflict_times"，
+    每批 JSON_CHUNK_VALUES 个值）和 "conflicts" 数组，
+    响应体大小随冲突事件数线性增长，不需要在内存中构建完整列表。
+    """
+    arrays = arrays or {}
+    header = json.dumps({k: v for k, v in result.items() if k != "conflicts" and k not in arrays},
+                        ensure_ascii=False)
+    prefix = header[:-1] + (', ' if len(header) > 2 else '')
+
+    for name, values in arrays.items():
+        yield prefix + json.dumps(name) + ': ['
+        for start in range(0, len(values), JSON_CHUNK_VALUES):
+            body = json.dumps(values[start:start + JSON_CHUNK_VALUES].tolist())[1:-1]
+            yield body if start == 0 else ", " + body
+        prefix = '], '
+    yield prefix + '"conflicts": ['
+
+    for start in range(0, len(episodes), chunk_size):
+        batch = format_episodes(episodes, existing_routes, new_routes, start, start + chunk_size)
+        body = json.dumps(batch, ensure_ascii=False)[1:-1]
+        yield body if start == 0 else ", " + body
+
+    yield "]}"
@@ -1,32 +1,26 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response, stream_with_context
 from flask_cors import CORS
 import numpy as np
 import matplotlib.pyplot as plt
 import time
-import taichi as ti
 import sys
 import logging
 import io
 import base64
 import os
-from datetime import datetime
 from typing import List, Tuple
 from typing import Tuple
 from grid_core import GridGenerator, GridCell
 import grid_encode as ge
 from grid_encode import encode_grid
+from channel_field import flatten_channels, scatter_channel_field
+from conflict_logging import setup_logging
+from conflict_results import aggregate_episodes, format_episodes, iter_result_json
+from conflict_backends import detect_triplets, resolve_backend
 
 
-# 配置日志
-logging.basicConfig(
-    level=logging.DEBUG,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler("debug.log"),
-        logging.StreamHandler(sys.stderr)
-    ]
-)
-logger = logging.getLogger(__name__)
+# 配置日志：队列异步写入，级别由 CONFLICT_LOG_LEVEL 控制（默认 INFO）
+logger = setup_logging()
 
 # 抑制matplotlib的调试日志
 logging.getLogger('matplotlib.font_manager').setLevel(logging.WARNING)
@@ -164,18 +158,6 @@ def calculate_point_grid(point: Tuple[float, float, float], level: int = 8) -> G
     
     return point_grid
 
-# 文件日志函数
-def file_debug_log(message):
-    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    with open("debug_output.txt", "a", encoding="utf-8") as f:
-        f.write(f"[{timestamp}] {message}\n")
-    # 同时尝试打印到stderr
-    try:
-        print(message, file=sys.stderr)
-        sys.stderr.flush()
-    except:
-        pass
-
 app = Flask(__name__)
 CORS(app)  # 启用CORS，允许跨域请求
 
@@ -209,91 +191,21 @@ def load_channels_from_routes(existing_routes, new_routes):
 def build_channel_field_and_mask(channels, max_time_steps=86400, num_dimensions=3):
     """构建通道字段和有效掩码"""
     num_channel = len(channels)
-    file_debug_log(f"调试: 构建通道字段，航线数量: {num_channel}")
-    
-    # 处理空航线列表的情况
-    if num_channel == 0:
-        channel_np = np.zeros((0, max_time_steps, num_dimensions), dtype=np.float32)
-        valid_mask = np.zeros((0, max_time_steps), dtype=bool)
-        return channel_np, valid_mask
-    
-    channel_np = np.zeros((num_channel, max_time_steps, num_dimensions), dtype=np.float32)
-    total_points = 0
-    valid_points = 0
-    
-    for i, channel in enumerate(channels):
-        filled_t = set()
-        points = channel.get('points', [])
-        total_points += len(points)
-        file_debug_log(f"航线 {i+1} 包含 {len(points)} 个点")
-        
-        for point in points:
-            # 检查expected_time_seconds键是否存在
-            if 'expected_time_seconds' not in point:
-                file_debug_log(f"  跳过点: 缺少 expected_time_seconds 字段")
-                continue
-            
-            try:
-                t = int(point['expected_time_seconds'])
-                if t < 0 or t >= max_time_steps:
-                    file_debug_log(f"  跳过点: 时间步 {t} 超出范围 [0, {max_time_steps})")
-                    continue
-                    
-                if t in filled_t:
-                    file_debug_log(f"  跳过点: 时间步 {t} 已存在")
-                    continue
-                    
-                coords = point['geometry']['coordinates']
-                if not isinstance(coords, (list, tuple)) or len(coords) < 3:
-                    file_debug_log(f"  跳过点: 坐标数据无效 {coords}")
-                    continue
-                    
-                channel_np[i, t, :] = coords[:3]
-                filled_t.add(t)
-                valid_points += 1
-            except (ValueError, KeyError, TypeError) as e:
-                file_debug_log(f"  跳过点: 数据转换错误 {str(e)}")
-                continue
-    
-    file_debug_log(f"调试: 总共处理了 {total_points} 个航点，有效点数: {valid_points}")
-    # 用 numpy 高效生成 valid_mask
-    valid_mask = np.any(channel_np != 0, axis=2)  # shape: (num_channel, max_time_steps)
-    file_debug_log(f"调试: 生成的字段形状: {channel_np.shape}，有效掩码形状: {valid_mask.shape}")
-    
-    # 统计有效时间步
-    valid_timesteps = np.sum(np.any(valid_mask, axis=0))
-    file_debug_log(f"调试: 有效时间步总数: {valid_timesteps}")
-    
-    return channel_np, valid_mask
 
-@ti.kernel
-def collect_conflicts_between_groups(channel_field: ti.template(), valid_mask: ti.template(),
-                                   existing_count: int, epsilon: float, 
-                                   result_triplets: ti.types.ndarray(), 
-                                   result_count: ti.types.ndarray(), 
-                                   conflict_flags: ti.types.ndarray()):
-    """检测新航线与已有航线之间的冲突"""
-    n = channel_field.shape[0]  # 总航线数
-    tmax = channel_field.shape[1]
-    epsilon_sq = epsilon * epsilon
-    
-    # 只检测新航线与已有航线之间的冲突
-    for t in range(tmax):
-        for i in range(existing_count, n):  # i: 新航线索引
-            for j in range(0, existing_count):  # j: 已有航线索引
-                if valid_mask[i, t] and valid_mask[j, t]:
-                    p1 = channel_field[i, t]
-                    p2 = channel_field[j, t]
-                    dist_sq = (p1 - p2).norm_sqr()
-                    if dist_sq < epsilon_sq:
-                        ti.atomic_max(conflict_flags[t], 1)
-                        idx = ti.atomic_add(result_count[0], 1)
-                        if idx < result_triplets.shape[0]:
-                            result_triplets[idx, 0] = t
-                            result_triplets[idx, 1] = j  # 已有航线索引
-                            result_triplets[idx, 2] = i  # 新航线索引
+    # 一次性展开为扁平数组 (route_idx, t, xyz)，再用花式索引散射
+    # 有效掩码显式记录写入位置，原点坐标 (0, 0, 0) 也视为有效
+    points = flatten_channels(channels, max_time_steps=max_time_steps)
+    channel_np, valid_mask = scatter_channel_field(points, num_channel,
+                                                   max_time_steps=max_time_steps,
+                                                   num_dimensions=num_dimensions)
+
+    logger.debug("航线数量: %d，总共 %d 个航点，有效点数: %d，跳过: %d",
+                 num_channel, points.total_points, len(points.t), points.skipped_points)
+
+    return channel_np, valid_mask
 
-def detect_conflicts(existing_routes, new_routes, epsilon=0.001, max_time_steps=20000):
+def detect_conflicts(existing_routes, new_routes, epsilon=0.001, max_time_steps=20000,
+                     include_conflicts=True, backend=None):
     """
     执行冲突检测的核心函数
     
@@ -302,9 +214,12 @@ def detect_conflicts(existing_routes, new_routes, epsilon=0.001, max_time_steps=
     - new_routes: 新航线列表
     - epsilon: 冲突距离阈值
     - max_time_steps: 最大时间步
+    - include_conflicts: 为 True 时在 "conflicts" 中返回全部冲突事件；
+      为 False 时返回 "episodes"（ConflictEpisodes），"conflict_times" 为 numpy 数组，由调用方流式输出
+    - backend: 计算后端 auto / taichi / numpy，默认读取 CONFLICT_BACKEND 环境变量
     
     返回:
-    - 包含冲突信息的字典
+    - 包含冲突信息的字典，冲突按 (航线对, 连续时间区间) 合并为事件
     """
     start_time = time.time()
     
@@ -315,13 +230,14 @@ def detect_conflicts(existing_routes, new_routes, epsilon=0.001, max_time_steps=
     
     # 检查是否有航线数据
     if not routes or existing_count == 0 or new_count == 0:
-        file_debug_log("调试: 没有航线数据或缺少一方航线，跳过冲突检测")
+        logger.info("没有航线数据或缺少一方航线，跳过冲突检测")
         return {
             "status": "success",
             "num_existing_routes": existing_count,
             "num_new_routes": new_count,
             "max_time_steps": max_time_steps,
             "conflict_count": 0,
+            "episode_count": 0,
             "conflict_time_steps": 0,
             "conflict_times": [],
             "conflicts": [],
@@ -335,17 +251,18 @@ def detect_conflicts(existing_routes, new_routes, epsilon=0.001, max_time_steps=
     channel_np, valid_mask = build_channel_field_and_mask(routes, max_time_steps=max_time_steps)
     
     num_channel, max_time_steps, num_dimensions = channel_np.shape
-    file_debug_log(f"航线总数: {num_channel}, 已有航线数: {existing_count}, 新航线数: {new_count}")
+    logger.debug("航线总数: %d, 已有航线数: %d, 新航线数: %d", num_channel, existing_count, new_count)
     
     # 检查是否有有效航线数据
     if num_channel == 0:
-        file_debug_log("调试: 没有有效航线数据，跳过冲突检测")
+        logger.info("没有有效航线数据，跳过冲突检测")
         return {
             "status": "success",
             "num_existing_routes": existing_count,
             "num_new_routes": new_count,
             "max_time_steps": max_time_steps,
             "conflict_count": 0,
+            "episode_count": 0,
             "conflict_time_steps": 0,
             "conflict_times": [],
             "conflicts": [],
@@ -356,79 +273,23 @@ def detect_conflicts(existing_routes, new_routes, epsilon=0.001, max_time_steps=
         }
     
     processing_time = time.time() - start_time
-    file_debug_log(f"数据预处理耗时: {processing_time:.3f} 秒")
-    file_debug_log(f'加载了{num_channel}条航线, shape: {channel_np.shape}')
+    logger.debug("数据预处理耗时: %.3f 秒, shape: %s", processing_time, channel_np.shape)
     
     # 统计有效数据点
     valid_points = np.sum(valid_mask)
-    file_debug_log(f'有效数据点总数: {valid_points}')
-    
-    # 初始化 Taichi
-    ti.init(arch=ti.cpu)
-    
-    # 创建 Taichi 字段
-    valid_mask_field = ti.field(dtype=ti.i8, shape=(num_channel, max_time_steps))
-    valid_mask_field.from_numpy(valid_mask.astype(np.int8))
-    
-    # 定义稀疏字段
-    channel_field = ti.Vector.field(3, dtype=ti.f32)
-    ti.root.dense(ti.i, num_channel).pointer(ti.j, max_time_steps).place(channel_field)
-    
-    # 填充稀疏字段
-    @ti.kernel
-    def fill_sparse_channel(channel_np: ti.types.ndarray()):
-        for i in range(num_channel):
-            for t in range(max_time_steps):
-                if valid_mask_field[i, t] == 1:
-                    channel_field[i, t] = ti.Vector([
-                        channel_np[i, t, 0],
-                        channel_np[i, t, 1],
-                        channel_np[i, t, 2]
-                    ])
-    
-    # 调用填充
-    fill_sparse_channel(channel_np)
+    logger.debug("有效数据点总数: %d", valid_points)
     
-    # 准备结果存储
-    conflict_flags = np.zeros(max_time_steps, dtype=np.int32)
-    max_triplets = 1000000  # 预设最大冲突对数
-    result_triplets = np.zeros((max_triplets, 3), dtype=np.int32)
-    result_count = np.zeros(1, dtype=np.int32)
-    
-    # 执行冲突检测
+    # 执行冲突检测（Taichi 或 NumPy 后端）
     start_detect = time.time()
-    file_debug_log("开始执行Taichi冲突检测...")
-    collect_conflicts_between_groups(channel_field, valid_mask_field, existing_count, epsilon, 
-                                  result_triplets, result_count, conflict_flags)
+    triplets, backend_used = detect_triplets(channel_np, valid_mask, existing_count, epsilon,
+                                             backend=backend)
     detect_time = time.time() - start_detect
-    file_debug_log(f"冲突检测耗时: {detect_time:.3f} 秒")
-    
-    # 提取结果
-    conflict_times = np.where(conflict_flags == 1)[0].tolist()
+    logger.debug("冲突检测耗时: %.3f 秒, 后端: %s", detect_time, backend_used)
     
-    # 格式化冲突对
-    conflicts = []
-    if result_count[0] > 0:
-        file_debug_log(f"检测到 {result_count[0]} 个冲突对")
-        for k in range(min(result_count[0], 10000)):  # 限制处理数量以避免性能问题
-            t, j, i = result_triplets[k]
-            
-            # 确保索引在有效范围内
-            if j < existing_count and i < num_channel:
-                # 获取航线信息
-                existing_route = existing_routes[j]
-                new_route = new_routes[i - existing_count]  # 新航线索引需要减去已有航线数量
-                
-                conflicts.append({
-                    "time_step": int(t),
-                    "existing_route_id": existing_route.get('id', f'route_{j}'),
-                    "new_route_id": new_route.get('id', f'route_{i}'),
-                    "existing_route_name": existing_route.get('name', f'Route {j}'),
-                    "new_route_name": new_route.get('name', f'Route {i}'),
-                    "debug_info": f"已有航线索引: {j}, 新航线索引: {i - existing_count}"
-                })
-    else:
-        file_debug_log("未检测到冲突")
+    # 提取结果：逐秒冲突合并为 (航线对, 时间区间) 事件
+    conflict_times = np.unique(triplets[:, 0])
+    episodes = aggregate_episodes(triplets, existing_count)
+    logger.debug("检测到 %d 个冲突对，合并为 %d 个冲突事件", len(triplets), len(episodes))
     
     # 准备返回结果
     result = {
@@ -436,31 +297,44 @@ def detect_conflicts(existing_routes, new_routes, epsilon=0.001, max_time_steps=
         "num_existing_routes": existing_count,
         "num_new_routes": new_count,
         "max_time_steps": max_time_steps,
-        "conflict_count": int(result_count[0]),
+        "backend": backend_used,
+        "conflict_count": len(triplets),
+        "episode_count": len(episodes),
         "conflict_time_steps": len(conflict_times),
-        "conflict_times": conflict_times,  # 限制返回数量，避免响应过大
-        "conflicts": conflicts,  # 限制返回数量
+        "conflict_times": conflict_times.tolist() if include_conflicts else conflict_times,
         "processing_time": processing_time,
         "detection_time": detect_time,
         "total_time": time.time() - start_time,
         "valid_points": int(valid_points),
-        "debug_message": f"检测到{result_count[0]}个新航线与已有航线之间的冲突"
+        "debug_message": f"检测到{len(triplets)}个新航线与已有航线之间的冲突，共{len(episodes)}个冲突事件"
     }
-    
-    file_debug_log(f"检测完成: {result['debug_message']}")
+    if include_conflicts:
+        result["conflicts"] = format_episodes(episodes, existing_routes, new_routes)
+    else:
+        result["episodes"] = episodes
+    
+    logger.info("检测完成", extra={"fields": {
+        "existing": existing_count,
+        "new": new_count,
+        "conflicts": result["conflict_count"],
+        "backend": backend_used,
+        "detect_s": round(detect_time, 3),
+        "total_s": round(result["total_time"], 3)
+    }})
     return result
 
 @app.route('/detect_conflicts', methods=['POST'])
 def api_detect_conflicts():
     """冲突检测API端点"""
     try:
-        file_debug_log("=== 开始处理冲突检测请求 ===")
+        logger.debug("=== 开始处理冲突检测请求 ===")
         # 获取全局航线数据
         global existing_routes, new_routes
         
         # 添加航线数据结构调试信息
-        routes = existing_routes + new_routes
-        debug_routes_structure(routes)
+        # 结构调试输出开销较大，仅在 DEBUG 级别时生成
+        if logger.isEnabledFor(logging.DEBUG):
+            debug_routes_structure(existing_routes + new_routes)
         
         # 调试信息：准备航线数量和基本信息
         debug_info = {
@@ -469,7 +343,7 @@ def api_detect_conflicts():
             "routes_summary": []
         }
         
-        file_debug_log(f"调试: 加载了 {len(existing_routes)} 条已有航线和 {len(new_routes)} 条新航线")
+        logger.debug("加载了 %d 条已有航线和 %d 条新航线", len(existing_routes), len(new_routes))
         
         # 记录已有航线信息
         for i, route in enumerate(existing_routes):
@@ -481,7 +355,8 @@ def api_detect_conflicts():
                 "point_count": len(route.get('points', []))
             }
             debug_info["routes_summary"].append(route_info)
-            file_debug_log(f"已有航线 {i}: ID={route_info['id']}, 名称={route_info['name']}, 点数={route_info['point_count']}")
+            logger.debug("已有航线 %d: ID=%s, 名称=%s, 点数=%d",
+                         i, route_info['id'], route_info['name'], route_info['point_count'])
         
         # 记录新航线信息
         for i, route in enumerate(new_routes):
@@ -493,29 +368,40 @@ def api_detect_conflicts():
                 "point_count": len(route.get('points', []))
             }
             debug_info["routes_summary"].append(route_info)
-            file_debug_log(f"新航线 {i}: ID={route_info['id']}, 名称={route_info['name']}, 点数={route_info['point_count']}")
-        
-        # 执行冲突检测
-        file_debug_log("开始执行冲突检测...")
-        # 执行冲突检测
-        result = detect_conflicts(existing_routes, new_routes, epsilon=0.001, max_time_steps=20000)
-        file_debug_log("冲突检测执行完成")
+            logger.debug("新航线 %d: ID=%s, 名称=%s, 点数=%d",
+                         i, route_info['id'], route_info['name'], route_info['point_count'])
+        
+        # 执行冲突检测（未知或不可用的后端按参数错误返回 400）
+        options = request.get_json(silent=True) or {}
+        try:
+            resolve_backend(options.get("backend"))
+        except ValueError as e:
+            return jsonify({"status": "error", "message": str(e)}), 400
+        result = detect_conflicts(existing_routes, new_routes, epsilon=0.001, max_time_steps=20000,
+                                  include_conflicts=False, backend=options.get("backend"))
         
         # 将调试信息添加到结果中
         result["debug_info"] = debug_info
         
         # 如果检测函数返回了消息，将其包含在响应中
         if "message" in result:
-            file_debug_log(f"检测结果消息: {result['message']}")
+            logger.debug("检测结果消息: %s", result['message'])
             return jsonify(result)
         
-        file_debug_log("=== 冲突检测请求处理完成 ===")
-        return jsonify(result)
+        # 冲突事件和冲突时间步分批序列化，流式返回
+        episodes = result.pop("episodes")
+        arrays = {"conflict_times": result.pop("conflict_times")}
+        logger.debug("=== 冲突检测请求处理完成 ===")
+        return Response(
+            stream_with_context(iter_result_json(result, episodes, list(existing_routes), list(new_routes),
+                                                 arrays=arrays)),
+            mimetype='application/json'
+        )
     
     except Exception as e:
         import traceback
         error_trace = traceback.format_exc()
-        file_debug_log(f"错误: {error_trace}")
+        logger.error("冲突检测失败: %s", error_trace)
         return jsonify({
             "status": "error",
             "message": str(e),
@@ -763,71 +649,73 @@ def debug_routes_structure(routes, max_routes=5, max_points=10):
     - max_routes: 最大显示航线数
     - max_points: 每条航线最大显示点数
     """
-    file_debug_log("=== 航线数据结构调试信息 ===")
-    file_debug_log(f"总航线数: {len(routes)}")
+    if not logger.isEnabledFor(logging.DEBUG):
+        return
+
+    logger.debug("=== 航线数据结构调试信息 ===")
+    logger.debug("总航线数: %d", len(routes))
     
     for i, route in enumerate(routes[:max_routes]):
-        file_debug_log(f"航线 {i+1}:")
-        file_debug_log(f"  ID: {route.get('id', 'MISSING')}")
-        file_debug_log(f"  名称: {route.get('name', 'MISSING')}")
-        file_debug_log(f"  代码: {route.get('code', 'MISSING')}")
+        logger.debug("航线 %d:", i + 1)
+        logger.debug("  ID: %s", route.get('id', 'MISSING'))
+        logger.debug("  名称: %s", route.get('name', 'MISSING'))
+        logger.debug("  代码: %s", route.get('code', 'MISSING'))
         
         # 检查航线中的所有键
-        route_keys = list(route.keys())
-        file_debug_log(f"  航线包含的键: {route_keys}")
+        logger.debug("  航线包含的键: %s", list(route.keys()))
         
         # 检查points字段
         if 'points' not in route:
-            file_debug_log(f"  *** 错误: 航线缺少 'points' 字段 ***")
+            logger.debug("  *** 错误: 航线缺少 'points' 字段 ***")
             continue
             
         points = route['points']
-        file_debug_log(f"  点数: {len(points)}")
+        logger.debug("  点数: %d", len(points))
         
         if not isinstance(points, list):
-            file_debug_log(f"  *** 错误: 'points' 不是列表，类型为 {type(points)} ***")
+            logger.debug("  *** 错误: 'points' 不是列表，类型为 %s ***", type(points))
             continue
             
         # 检查前几个点的结构
         for j, point in enumerate(points[:max_points]):
-            file_debug_log(f"    点 {j+1}:")
+            logger.debug("    点 %d:", j + 1)
             if not isinstance(point, dict):
-                file_debug_log(f"      *** 错误: 点不是字典，类型为 {type(point)} ***")
-                file_debug_log(f"      点内容: {point}")
+                logger.debug("      *** 错误: 点不是字典，类型为 %s ***", type(point))
+                logger.debug("      点内容: %s", point)
                 continue
                 
-            point_keys = list(point.keys())
-            file_debug_log(f"      点包含的键: {point_keys}")
+            logger.debug("      点包含的键: %s", list(point.keys()))
             
             # 检查关键字段
             if 'expected_time_seconds' not in point:
-                file_debug_log(f"      *** 缺少 'expected_time_seconds' 字段 ***")
+                logger.debug("      *** 缺少 'expected_time_seconds' 字段 ***")
             else:
-                file_debug_log(f"      expected_time_seconds: {point['expected_time_seconds']} (类型: {type(point['expected_time_seconds'])})")
+                value = point['expected_time_seconds']
+                logger.debug("      expected_time_seconds: %s (类型: %s)", value, type(value))
                 
             if 'geometry' not in point:
-                file_debug_log(f"      *** 缺少 'geometry' 字段 ***")
+                logger.debug("      *** 缺少 'geometry' 字段 ***")
             else:
                 geometry = point['geometry']
-                file_debug_log(f"      geometry 类型: {type(geometry)}")
+                logger.debug("      geometry 类型: %s", type(geometry))
                 if isinstance(geometry, dict) and 'coordinates' in geometry:
                     coords = geometry['coordinates']
-                    file_debug_log(f"      coordinates: {coords} (类型: {type(coords)})")
+                    logger.debug("      coordinates: %s (类型: %s)", coords, type(coords))
                 else:
-                    file_debug_log(f"      *** geometry 格式错误 ***")
+                    logger.debug("      *** geometry 格式错误 ***")
             
             # 显示点的完整内容（截断以避免过长）
             point_str = str(point)
             if len(point_str) > 200:
                 point_str = point_str[:200] + "..."
-            file_debug_log(f"      点完整内容: {point_str}")
+            logger.debug("      点完整内容: %s", point_str)
             
         if len(points) > max_points:
-            file_debug_log(f"    ... 还有 {len(points) - max_points} 个点未显示")
+            logger.debug("    ... 还有 %d 个点未显示", len(points) - max_points)
     
     if len(routes) > max_routes:
-        file_debug_log(f"... 还有 {len(routes) - max_routes} 条航线未显示")
-    file_debug_log("=== 航线数据结构调试信息结束 ===")
+        logger.debug("... 还有 %d 条航线未显示", len(routes) - max_routes)
+    logger.debug("=== 航线数据结构调试信息结束 ===")
 
 @app.route('/generate_routes_image', methods=['POST'])
 def generate_routes_image():
@@ -868,12 +756,13 @@ def generate_routes_image():
         colors = plt.cm.tab10(np.linspace(0, 1, len(routes)))
         
         # 提取冲突点信息
-        conflict_points = set()  # 存储冲突点的时间和航线信息
+        conflict_points = []  # 存储冲突事件的时间区间和航线信息
         if conflict_result.get("status") == "success":
             conflicts = conflict_result.get("conflicts", [])
             for conflict in conflicts:
-                # 记录冲突的时间步和涉及的航线
-                conflict_points.add((conflict["time_step"], conflict["existing_route_id"], conflict["new_route_id"]))
+                # 记录冲突的时间区间和涉及的航线
+                conflict_points.append((conflict["start_time_step"], conflict["end_time_step"],
+                                        conflict["existing_route_id"], conflict["new_route_id"]))
         
         # 绘制每条航线，确保整条航线使用同一种颜色
         for idx, route in enumerate(routes):
@@ -924,8 +813,8 @@ def generate_routes_image():
                 for point_idx, point in enumerate(points):
                     point_time = point.get('expected_time_seconds', -1)
                     # 检查该点的时间是否与任何冲突时间匹配
-                    for conflict_time, existing_id, new_id in conflict_points:
-                        if point_time == conflict_time and (route_id == existing_id or route_id == new_id):
+                    for start_time, end_time, existing_id, new_id in conflict_points:
+                        if start_time <= point_time <= end_time and (route_id == existing_id or route_id == new_id):
                             # 标记该点所在的网格为冲突网格
                             coords = point['geometry']['coordinates']
                             if len(coords) >= 3:
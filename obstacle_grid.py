@@ -0,0 +1,183 @@
+"""
+建筑高度障碍物体素化
+
+把建筑高度栅格（加地形）转换为指定级别网格的三维占用：
+- 平面：每个网格取其范围内全部建筑像元（按像元中心归属网格）与网格中心采样值中的最大高度，
+  像元比网格大时也不会漏掉网格
+- 高度：按 GridGenerator 的高度分层（1000 / 2^(level - 5) 米，alt_range 与 get_grids 一致），
+  障碍物顶部高于某一层底部时该层被占用
+
+同一平面网格内被占用的层总是从最低层开始连续，因此用每个平面网格的占用层数 ceiling
+（第 k 层被占用当且仅当 k < ceiling）表示整个三维占用位图，查询 O(1)；
+需要按层展开时用 layer_mask / bitset 生成布尔数组或按位打包的位图。
+"""
+import math
+
+import numpy as np
+
+import risk_assessment as ra
+from airspace_grid import grid_index as gi
+from risk_layer import DEFAULT_BBOX
+
+MAX_ELEVATION = 1000
+BUILDING_STRIP_ROWS = 512
+
+
+def alt_step_of(level):
+    """GridGenerator 在该级别的高度层厚度（米）"""
+    if level < 6:
+        raise ValueError("障碍物体素化需要网格级别不低于 6（低级别网格不分高度层）")
+    return MAX_ELEVATION / (2 ** (level - 5))
+
+
+class ObstacleGrid:
+    """某一级别、某一象限矩形范围内的障碍物占用，数组下标为 (ay - ay0, ax - ax0)"""
+
+    def __init__(self, level, quad, ax0, ay0, ceiling):
+        self.level = level
+        self.quad = quad
+        self.ax0 = ax0
+        self.ay0 = ay0
+        self.ceiling = ceiling  # 每个平面网格自底向上被占用的层数
+        self.alt_step = alt_step_of(level)
+        self.layers = int(math.ceil(MAX_ELEVATION / self.alt_step))
+
+    @property
+    def shape(self):
+        return self.ceiling.shape
+
+    def save(self, path):
+        np.savez_compressed(path, level=self.level, quad=self.quad, origin=[self.ax0, self.ay0],
+                            ceiling=self.ceiling)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            ax0, ay0 = (int(v) for v in data['origin'])
+            return cls(int(data['level']), int(data['quad']), ax0, ay0, data['ceiling'])
+
+    def _blocked(self, quad, ax, ay, layer):
+        ix, iy = np.asarray(ax) - self.ax0, np.asarray(ay) - self.ay0
+        inside = ((np.asarray(quad) == self.quad) & (iy >= 0) & (iy < self.shape[0])
+                  & (ix >= 0) & (ix < self.shape[1]))
+        ceiling = self.ceiling[np.where(inside, iy, 0), np.where(inside, ix, 0)]
+        return inside & (np.asarray(layer) < ceiling)
+
+    def is_blocked(self, lon, lat, alt):
+        """经纬度高程所在的三维网格是否被占用（超出范围视为未占用）"""
+        quad, ax, ay = gi.point_index(lon, lat, self.level)
+        return bool(self._blocked(quad, ax, ay, math.floor(alt / self.alt_step)))
+
+    def is_blocked_code(self, code):
+        """33位编码对应的三维网格是否被占用"""
+        quad, ax, ay = gi.cell_index(code, self.level)
+        return bool(self._blocked(quad, ax, ay, math.floor(gi.elevation_of(code) / self.alt_step)))
+
+    def blocked_many(self, lons, lats, alts):
+        """批量判断，返回布尔数组"""
+        lons, lats, alts = np.broadcast_arrays(np.asarray(lons, dtype=np.float64),
+                                               np.asarray(lats, dtype=np.float64),
+                                               np.asarray(alts, dtype=np.float64))
+        quad = np.where(lats >= 0, np.where(lons < 0, gi.NW, gi.NE), np.where(lons < 0, gi.SW, gi.SE))
+        ax = np.floor(np.abs(lons) / gi.LON_CELL_SIZE[self.level]).astype(np.int64)
+        ay = np.floor(np.abs(lats) / gi.LAT_CELL_SIZE[self.level]).astype(np.int64)
+        return self._blocked(quad, ax, ay, np.floor(alts / self.alt_step))
+
+    def layer_mask(self, layer0, count):
+        """第 layer0 层起 count 层的占用，布尔数组 (count, ny, nx)"""
+        layers = np.arange(layer0, layer0 + count)[:, None, None]
+        return layers < self.ceiling[None]
+
+    def bitset(self):
+        """完整的三维占用位图，按层方向打包，(ny, nx, ceil(层数 / 8)) 的 uint8 数组"""
+        return np.packbits(np.moveaxis(self.layer_mask(0, self.layers), 0, -1), axis=-1, bitorder='little')
+
+
+def _max_heights(bbox, level, quad, ax0, ay0, nx, ny):
+    """各平面网格内的最大建筑高度：像元按中心归属网格取最大值，再与网格中心采样值取最大"""
+    lon_step, lat_step = gi.LON_CELL_SIZE[level], gi.LAT_CELL_SIZE[level]
+    lon_sign = -1 if quad in (gi.NW, gi.SW) else 1
+    lat_sign = 1 if quad in (gi.NW, gi.NE) else -1
+    top = np.zeros((ny, nx), dtype=np.float64)
+
+    layer = ra.get_layer(ra.building_tif)
+    if layer.shape is None:
+        return top
+
+    def values(data):
+        data = data.astype(np.float64)
+        if layer.nodata is not None:
+            data[data == layer.nodata] = 0
+        return data
+
+    # 网格中心采样（网格小于像元时保证每个网格都有值）
+    lons = lon_sign * (np.arange(ax0, ax0 + nx) + 0.5) * lon_step
+    lats = lat_sign * (np.arange(ay0, ay0 + ny) + 0.5) * lat_step
+    np.maximum(top, values(layer.sample_many(*np.meshgrid(lons, lats))), out=top)
+
+    # 范围内的像元
+    min_lon, min_lat, max_lon, max_lat = bbox
+    cols, rows = layer.inverse * (np.array([min_lon, max_lon, min_lon, max_lon]),
+                                  np.array([min_lat, min_lat, max_lat, max_lat]))
+    col0, col1 = max(0, int(np.floor(cols.min()))), min(layer.shape[1], int(np.ceil(cols.max())))
+    row0, row1 = max(0, int(np.floor(rows.min()))), min(layer.shape[0], int(np.ceil(rows.max())))
+    if col0 >= col1 or row0 >= row1:
+        return top
+
+    # 仿射变换无旋转：列只决定经度、行只决定纬度，归属网格随列 / 行单调变化
+    pixel_lons, _ = layer.transform * (np.arange(col0, col1) + 0.5, np.full(col1 - col0, row0 + 0.5))
+    ix = np.floor(np.abs(pixel_lons) / lon_step).astype(np.int64) - ax0
+    keep_cols = np.flatnonzero((ix >= 0) & (ix < nx))
+    if len(keep_cols) == 0:
+        return top
+    col_starts = np.flatnonzero(np.diff(ix[keep_cols], prepend=-1))
+    col_cells = ix[keep_cols][col_starts]
+
+    for strip0 in range(row0, row1, BUILDING_STRIP_ROWS):
+        strip1 = min(row1, strip0 + BUILDING_STRIP_ROWS)
+        _, pixel_lats = layer.transform * (np.full(strip1 - strip0, col0 + 0.5), np.arange(strip0, strip1) + 0.5)
+        iy = np.floor(np.abs(pixel_lats) / lat_step).astype(np.int64) - ay0
+        keep_rows = np.flatnonzero((iy >= 0) & (iy < ny))
+        if len(keep_rows) == 0:
+            continue
+        data = values(layer.read_window(strip0, strip1, col0, col1))[keep_rows][:, keep_cols]
+        row_starts = np.flatnonzero(np.diff(iy[keep_rows], prepend=-1))
+        row_cells = iy[keep_rows][row_starts]
+        # 同一网格的像元在行、列方向上都是连续的，两次分段最大值即得每个网格的最大值
+        cell_max = np.maximum.reduceat(np.maximum.reduceat(data, col_starts, axis=1), row_starts, axis=0)
+        block = top[np.ix_(row_cells, col_cells)]
+        top[np.ix_(row_cells, col_cells)] = np.maximum(block, cell_max)
+    return top
+
+
+def build_obstacle_grid(bbox=DEFAULT_BBOX, level=11):
+    """
+    计算区域内每个平面网格的障碍物占用层数
+
+    参数:
+    - bbox: (min_lon, min_lat, max_lon, max_lat)，不能跨越赤道或本初子午线
+    - level: 网格级别（>= 6）
+
+    返回:
+    - ObstacleGrid
+    """
+    alt_step = alt_step_of(level)
+    min_lon, min_lat, max_lon, max_lat = bbox
+    quad, ax_a, ay_a = gi.point_index(min_lon, min_lat, level)
+    quad_b, ax_b, ay_b = gi.point_index(max_lon, max_lat, level)
+    if quad != quad_b:
+        raise ValueError("障碍物范围不能跨越赤道或本初子午线")
+    ax0, ay0 = min(ax_a, ax_b), min(ay_a, ay_b)
+    nx, ny = max(ax_a, ax_b) - ax0 + 1, max(ay_a, ay_b) - ay0 + 1
+
+    top = _max_heights(bbox, level, quad, ax0, ay0, nx, ny)
+    lon_sign = -1 if quad in (gi.NW, gi.SW) else 1
+    lat_sign = 1 if quad in (gi.NW, gi.NE) else -1
+    lons = lon_sign * (np.arange(ax0, ax0 + nx) + 0.5) * gi.LON_CELL_SIZE[level]
+    lats = lat_sign * (np.arange(ay0, ay0 + ny) + 0.5) * gi.LAT_CELL_SIZE[level]
+    top += ra.get_layer(ra.terrain_tif).sample_many(*np.meshgrid(lons, lats))
+
+    # 第 k 层 [k * 层高, (k + 1) * 层高) 被占用当且仅当 top > k * 层高
+    layers = int(math.ceil(MAX_ELEVATION / alt_step))
+    ceiling = np.clip(np.ceil(top / alt_step), 0, layers).astype(np.uint16)
+    return ObstacleGrid(level, quad, ax0, ay0, ceiling)
@@ -1,14 +1,24 @@
+import numpy as np
 from flask import Flask, request, jsonify
-from risk_assessment import risk_by_code, risk_by_coord, risk_by_polygon
+from risk_assessment import risk_by_coord, risk_by_coords, risk_by_polygon
+from risk_layer import risk_by_code, risk_by_codes
+from risk_route import DEFAULT_LEVEL, DEFAULT_SPEED, risk_by_route, route_obstacles
+from risk_pyramid import get_risk_pyramid
+from risk_zonal import warm_up_in_background, zonal_risk_by_code
 
 app = Flask(__name__)
 
+MAX_BATCH_SIZE = 100_000
+
 @app.route('/risk/by_code', methods=['GET'])
 def api_risk_by_code():
     code = request.args.get('code')
     if not code:
         return jsonify({'error': 'Missing code'}), 400
-    risk = risk_by_code(code)
+    try:
+        risk = risk_by_code(code)
+    except (ValueError, KeyError, IndexError):
+        return jsonify({'error': 'Invalid code'}), 400
     return jsonify({'code': code, 'risk': risk})
 
 @app.route('/risk/by_coord', methods=['GET'])
@@ -31,5 +41,73 @@ def api_risk_by_polygon():
     results = risk_by_polygon(polygon)
     return jsonify({'results': results})
 
+@app.route('/risk/batch', methods=['POST'])
+def api_risk_batch():
+    # {"codes": [...]} 或 {"points": [[lon, lat, alt], ...]}，结果按输入顺序以列式数组返回
+    data = request.get_json(silent=True) or {}
+    codes, points = data.get('codes'), data.get('points')
+    items = codes if codes is not None else points
+    if not isinstance(items, list) or not items:
+        return jsonify({'error': 'Missing codes or points'}), 400
+    if len(items) > MAX_BATCH_SIZE:
+        return jsonify({'error': f'Too many items (max {MAX_BATCH_SIZE})'}), 413
+    if codes is not None:
+        if not all(isinstance(code, str) for code in codes):
+            return jsonify({'error': 'Invalid codes'}), 400
+        return jsonify({'risk': risk_by_codes(codes).tolist()})
+    try:
+        coords = np.array([list(p) + [0] * (3 - len(p)) for p in points], dtype=np.float64)
+        if coords.shape != (len(points), 3):
+            raise ValueError
+    except (TypeError, ValueError):
+        return jsonify({'error': 'Invalid points'}), 400
+    codes, risks, _ = risk_by_coords(coords[:, 0], coords[:, 1], coords[:, 2])
+    return jsonify({'codes': codes, 'risk': risks.tolist()})
+
+@app.route('/risk/route', methods=['POST'])
+def api_risk_route():
+    data = request.get_json(silent=True) or {}
+    waypoints = data.get('waypoints')
+    if not isinstance(waypoints, list):
+        return jsonify({'error': 'Missing waypoints'}), 400
+    try:
+        speed = float(data.get('speed', DEFAULT_SPEED))
+        level = int(data.get('level', DEFAULT_LEVEL))
+        obstacles = route_obstacles(waypoints, level) if data.get('check_obstacles') else None
+        return jsonify(risk_by_route(waypoints, speed, level, obstacles))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'Invalid waypoints, speed or level'}), 400
+
+@app.route('/risk/zonal', methods=['GET'])
+def api_risk_zonal():
+    code = request.args.get('code')
+    if not code:
+        return jsonify({'error': 'Missing code'}), 400
+    try:
+        level = int(request.args.get('level', 6))
+        return jsonify(zonal_risk_by_code(code, level))
+    except (ValueError, KeyError, IndexError):
+        return jsonify({'error': 'Invalid code or level'}), 400
+
+@app.route('/risk/pyramid', methods=['GET'])
+def api_risk_pyramid():
+    code = request.args.get('code')
+    if not code:
+        return jsonify({'error': 'Missing code'}), 400
+    pyramid = get_risk_pyramid()
+    if pyramid is None:
+        return jsonify({'error': 'Risk table not available'}), 404
+    try:
+        level = int(request.args.get('level', 6))
+        stats = pyramid.stats_by_code(code, level)
+    except (ValueError, KeyError, IndexError):
+        return jsonify({'error': 'Invalid code or level'}), 400
+    if stats is None:
+        return jsonify({'error': 'Code outside risk table'}), 404
+    stats['code'] = code
+    return jsonify(stats)
+
 if __name__ == '__main__':
+    # 积分图在后台构建，不阻塞启动，也不在首个 /risk/zonal 请求中构建
+    warm_up_in_background()
     app.run(host='0.0.0.0', port=9010, debug=True)
@@ -1,8 +1,16 @@
 import os
+import threading
+import time
+import logging
+import weakref
+from collections import OrderedDict
 import numpy as np
 import rasterio
+from rasterio.windows import Window
 from airspace_grid import grid_decode,grid_encode
 
+logger = logging.getLogger(__name__)
+
 # 数据路径
 data_dir = os.path.join(os.path.dirname(__file__), 'data', 'all_tif_data_wgs84')
 population_tif = os.path.join(data_dir, 'population.tif')
@@ -16,26 +24,263 @@ def read_tif(tif_path):
         transform = src.transform
     return arr, transform
 
-# 计算某经纬度高程点的风险分数
-def get_risk_score(lon, lat, alt):
-    pop_arr, pop_trans = read_tif(population_tif)
-    bld_arr, bld_trans = read_tif(building_tif)
-    ter_arr, ter_trans = read_tif(terrain_tif)
-    
-    def sample(arr, trans):
-        col, row = ~trans * (lon, lat)
+# 小于该大小的栅格整体读入内存，更大的栅格按块读取
+RASTER_FULL_LOAD_BYTES = 64 * 1024 * 1024
+RASTER_BLOCK_SIZE = 512                    # 分块读取的块边长（像元）
+RASTER_CACHE_BYTES = 64 * 1024 * 1024      # 每个图层已解码块的缓存上限（LRU）
+# 设置环境变量 RISK_RASTER_MMAP_DIR 后，栅格首次加载时解压为该目录下的 .npy 文件并以内存映射方式只读打开，
+# 多个进程共享操作系统页缓存（用于 risk_server 的进程池）
+RASTER_MMAP_ENV = 'RISK_RASTER_MMAP_DIR'
+
+# 栅格图层某一版本的只读状态：元数据、逆仿射变换、像元数组或打开的数据集，以及该版本自己的块缓存
+# 创建后不再修改（块缓存除外，由自身的锁保护）；重新加载时整体替换为新对象
+class _RasterState:
+    __slots__ = ('mtime', 'shape', 'dtype', 'nodata', 'transform', 'inverse', 'arr', 'src',
+                 'blocks', 'cache_bytes', 'lock', '__weakref__')
+
+    def __init__(self, mtime=None, shape=None, dtype=None, nodata=None, transform=None,
+                 arr=None, src=None):
+        self.mtime = mtime
+        self.shape = shape
+        self.dtype = dtype
+        self.nodata = nodata
+        self.transform = transform
+        self.inverse = ~transform if transform is not None else None
+        self.arr = arr
+        self.src = src
+        self.blocks = OrderedDict()
+        self.cache_bytes = 0
+        self.lock = threading.Lock()
+        if src is not None:
+            # 被替换的旧版本在最后一个读取者释放引用后才关闭数据集
+            weakref.finalize(self, src.close)
+
+    # 读取 (块行, 块列) 对应的窗口，最近最少使用的块超出缓存上限时被淘汰
+    def block(self, block_row, block_col):
+        key = (block_row, block_col)
+        with self.lock:
+            block = self.blocks.get(key)
+            if block is not None:
+                self.blocks.move_to_end(key)
+                return block
+            row_off, col_off = block_row * RASTER_BLOCK_SIZE, block_col * RASTER_BLOCK_SIZE
+            window = Window(col_off, row_off,
+                            min(RASTER_BLOCK_SIZE, self.shape[1] - col_off),
+                            min(RASTER_BLOCK_SIZE, self.shape[0] - row_off))
+            block = self.src.read(1, window=window)
+            self.blocks[key] = block
+            self.cache_bytes += block.nbytes
+            while self.cache_bytes > RASTER_CACHE_BYTES and len(self.blocks) > 1:
+                _, evicted = self.blocks.popitem(last=False)
+                self.cache_bytes -= evicted.nbytes
+            return block
+
+    def read_window(self, row0, row1, col0, col1):
+        if self.arr is not None:
+            return self.arr[row0:row1, col0:col1]
+        with self.lock:
+            return self.src.read(1, window=Window(col0, row0, col1 - col0, row1 - row0))
+
+
+_MISSING = _RasterState()
+
+
+# 栅格图层：只读取一次元数据并缓存逆仿射变换；文件缺失时按 0 采样
+# 小栅格整体驻留内存，大栅格只读取查询点所在的窗口块，内存占用与栅格大小无关
+# 全部状态保存在一个 _RasterState 中，load() 构建新状态后一次赋值替换，读取方法每次调用只取一次引用，
+# 重新加载期间的并发读取要么看到旧版本、要么看到新版本，不会看到两者混合
+class RasterLayer:
+    def __init__(self, path):
+        self.path = path
+        self._state = _MISSING
+        self._lock = threading.Lock()
+        self.load()
+
+    # 当前版本的各项属性（多次读取时先取 state 以保证来自同一版本）
+    state = property(lambda self: self._state)
+    arr = property(lambda self: self._state.arr)
+    shape = property(lambda self: self._state.shape)
+    dtype = property(lambda self: self._state.dtype)
+    nodata = property(lambda self: self._state.nodata)
+    transform = property(lambda self: self._state.transform)
+    inverse = property(lambda self: self._state.inverse)
+    mtime = property(lambda self: self._state.mtime)
+
+    def _stat_mtime(self):
+        try:
+            return os.stat(self.path).st_mtime_ns
+        except OSError:
+            return None
+
+    def load(self):
+        with self._lock:
+            self._state = self._build_state()
+
+    def _build_state(self):
+        mtime = self._stat_mtime()
+        if mtime is None:
+            logger.warning("栅格文件不存在，按 0 处理: %s", self.path)
+            return _MISSING
+        src = rasterio.open(self.path)
+        shape = (src.height, src.width)
+        dtype = np.dtype(src.dtypes[0])
+        meta = dict(mtime=mtime, shape=shape, dtype=dtype, nodata=src.nodata, transform=src.transform)
+        mmap_dir = os.environ.get(RASTER_MMAP_ENV)
+        if mmap_dir:
+            arr = self._mmap_array(src, mmap_dir, mtime, shape, dtype)
+        elif shape[0] * shape[1] * dtype.itemsize <= RASTER_FULL_LOAD_BYTES:
+            arr = src.read(1)
+        else:
+            return _RasterState(src=src, **meta)
+        src.close()
+        return _RasterState(arr=arr, **meta)
+
+    # 解压为未压缩的 .npy（按文件名和修改时间区分版本），逐条带写入后原子替换
+    def _mmap_array(self, src, mmap_dir, mtime, shape, dtype):
+        os.makedirs(mmap_dir, exist_ok=True)
+        path = os.path.join(mmap_dir, f"{os.path.basename(self.path)}.{mtime}.npy")
+        if not os.path.exists(path):
+            tmp_path = f"{path}.{os.getpid()}.tmp.npy"
+            arr = np.lib.format.open_memmap(tmp_path, mode='w+', dtype=dtype, shape=shape)
+            for row0 in range(0, shape[0], RASTER_BLOCK_SIZE):
+                rows = min(RASTER_BLOCK_SIZE, shape[0] - row0)
+                arr[row0:row0 + rows] = src.read(1, window=Window(0, row0, shape[1], rows))
+            arr.flush()
+            del arr
+            os.replace(tmp_path, path)
+        return np.load(path, mmap_mode='r')
+
+    # 立即关闭当前版本的数据集（之后的分块读取会失败，仅在不再使用该图层时调用）
+    def close(self):
+        state = self._state
+        with state.lock:
+            if state.src is not None:
+                state.src.close()
+            state.blocks.clear()
+            state.cache_bytes = 0
+
+    # 文件修改时间变化时重新加载，返回是否重新加载
+    def refresh(self):
+        if self._stat_mtime() != self.mtime:
+            self.load()
+            return True
+        return False
+
+    # 读取像元窗口 [row0, row1) × [col0, col1)
+    def read_window(self, row0, row1, col0, col1):
+        return self._state.read_window(row0, row1, col0, col1)
+
+    def sample(self, lon, lat):
+        state = self._state
+        if state.shape is None:
+            return 0
+        col, row = state.inverse * (lon, lat)
         col, row = int(col), int(row)
-        if 0 <= row < arr.shape[0] and 0 <= col < arr.shape[1]:
-            return arr[row, col]
+        if 0 <= row < state.shape[0] and 0 <= col < state.shape[1]:
+            if state.arr is not None:
+                value = state.arr[row, col]
+            else:
+                block = state.block(row // RASTER_BLOCK_SIZE, col // RASTER_BLOCK_SIZE)
+                value = block[row % RASTER_BLOCK_SIZE, col % RASTER_BLOCK_SIZE]
+            # nodata 与栅格范围外相同，按 0 处理（与 risk_zonal 的区域统计一致）
+            return 0 if value == state.nodata else value
         return 0
-    
-    pop = sample(pop_arr, pop_trans)
-    bld = sample(bld_arr, bld_trans)
-    ter = sample(ter_arr, ter_trans)
+
+    # 批量采样：整组坐标做逆变换后花式索引，范围外和 nodata 为 0
+    def sample_many(self, lons, lats):
+        state = self._state
+        lons, lats = np.broadcast_arrays(np.asarray(lons, dtype=np.float64),
+                                         np.asarray(lats, dtype=np.float64))
+        if state.shape is None:
+            return np.zeros(lons.shape, dtype=np.int64)
+        cols, rows = state.inverse * (lons, lats)
+        # 与 int() 一致：向零截断
+        cols = np.trunc(np.nan_to_num(cols, nan=-1, posinf=-1, neginf=-1))
+        rows = np.trunc(np.nan_to_num(rows, nan=-1, posinf=-1, neginf=-1))
+        inside = (rows >= 0) & (rows < state.shape[0]) & (cols >= 0) & (cols < state.shape[1])
+        values = np.zeros(lons.shape, dtype=state.dtype)
+        rows = rows[inside].astype(np.int64)
+        cols = cols[inside].astype(np.int64)
+        if state.arr is not None:
+            values[inside] = state.arr[rows, cols]
+            return _zero_nodata(values, state.nodata)
+
+        # 按块分组，每个块只读取一次
+        block_rows, block_cols = rows // RASTER_BLOCK_SIZE, cols // RASTER_BLOCK_SIZE
+        keys = block_rows * (state.shape[1] // RASTER_BLOCK_SIZE + 1) + block_cols
+        order = np.argsort(keys, kind='stable')
+        bounds = np.flatnonzero(np.diff(keys[order])) + 1
+        sampled = np.empty(len(rows), dtype=state.dtype)
+        for group in np.split(order, bounds):
+            if len(group) == 0:
+                continue
+            block = state.block(int(block_rows[group[0]]), int(block_cols[group[0]]))
+            sampled[group] = block[rows[group] % RASTER_BLOCK_SIZE, cols[group] % RASTER_BLOCK_SIZE]
+        values[inside] = sampled
+        return _zero_nodata(values, state.nodata)
+
+
+# nodata 像元置 0（原地修改）
+def _zero_nodata(values, nodata):
+    if nodata is not None:
+        values[values == nodata] = 0
+    return values
+
+
+# 进程级栅格图层注册表
+RASTER_REFRESH_INTERVAL = 5.0  # 检查文件变化的最小间隔（秒）
+_layers = {}
+_layers_lock = threading.Lock()
+_last_refresh = 0.0
+
+def get_layer(path):
+    global _last_refresh
+    now = time.monotonic()
+    if now - _last_refresh >= RASTER_REFRESH_INTERVAL:
+        refresh_layers()
+        _last_refresh = now
+    layer = _layers.get(path)
+    if layer is None:
+        with _layers_lock:
+            layer = _layers.get(path)
+            if layer is None:
+                layer = RasterLayer(path)
+                _layers[path] = layer
+    return layer
+
+# 重新加载已修改的图层，返回重新加载的文件列表
+def refresh_layers():
+    with _layers_lock:
+        return [path for path, layer in _layers.items() if layer.refresh()]
+
+# 清空注册表（下次访问时重新读取）
+def clear_layers():
+    with _layers_lock:
+        _layers.clear()
+
+# 计算某经纬度高程点的风险分数
+def get_risk_score(lon, lat, alt):
+    pop = get_layer(population_tif).sample(lon, lat)
+    bld = get_layer(building_tif).sample(lon, lat)
+    ter = get_layer(terrain_tif).sample(lon, lat)
     # 简单加权风险分数
     score = 0.5 * pop + 0.3 * bld + 0.2 * abs(alt - ter)
     return score
 
+# 批量计算风险分数，结果与逐点调用 get_risk_score 一致
+def get_risk_scores(lons, lats, alts):
+    pop = get_layer(population_tif).sample_many(lons, lats)
+    bld = get_layer(building_tif).sample_many(lons, lats)
+    ter = get_layer(terrain_tif).sample_many(lons, lats)
+    return 0.5 * pop + 0.3 * bld + 0.2 * np.abs(np.asarray(alts, dtype=np.float64) - ter)
+
+# 风险分级阈值：分数 < 20 为 1 级，< 50 为 2 级，< 100 为 3 级，< 200 为 4 级，其余为 5 级
+RISK_LEVEL_BINS = np.array([20, 50, 100, 200])
+
+# 批量风险分级
+def risk_levels(scores):
+    return np.digitize(scores, RISK_LEVEL_BINS) + 1
+
 # 风险分级（1-5级）
 def risk_level(score):
     if score < 20:
@@ -63,23 +308,35 @@ def risk_by_coord(lon, lat, alt):
     score = get_risk_score(lon, lat, alt)
     return code, risk_level(score)
 
+# 批量版 risk_by_coord，返回 (编码列表, 风险等级数组, 风险分数数组)
+def risk_by_coords(lons, lats, alts):
+    codes = grid_encode.encode_grid_batch(lons, lats, alts, level=11)
+    scores = get_risk_scores(lons, lats, alts)
+    return codes, risk_levels(scores), scores
+
+# 按步长 step 从 start 累加到 stop（含），与逐次 += step 的浮点结果一致
+def _sample_axis(start, stop, step):
+    count = int((stop - start) / step) + 2
+    values = np.cumsum(np.concatenate([[start], np.full(count, step)]))
+    return values[values <= stop]
+
 # 给定多边形区域，返回区域内所有网格的风险等级（简化实现：采样区域内网格中心点）
 def risk_by_polygon(polygon):
     # polygon: [(lon, lat, alt), ...] 闭合
-    from shapely.geometry import Polygon, Point
+    from shapely.geometry import Polygon
+    try:
+        from shapely import contains_xy
+    except ImportError:  # shapely < 2.0
+        from shapely.vectorized import contains as contains_xy
     poly2d = Polygon([(p[0], p[1]) for p in polygon])
     min_lon, min_lat, max_lon, max_lat = poly2d.bounds
     step = 0.002  # 约等于11级网格分辨率
-    results = []
     alt = polygon[0][2] if len(polygon[0]) > 2 else 0
-    lon = min_lon
-    while lon <= max_lon:
-        lat = min_lat
-        while lat <= max_lat:
-            if poly2d.contains(Point(lon, lat)):
-                code = grid_encode.encode_grid(lon, lat, alt, level=11)
-                score = get_risk_score(lon, lat, alt)
-                results.append({'code': code, 'risk': risk_level(score)})
-            lat += step
-        lon += step
-    return results
+    # 经度为外层、纬度为内层，与逐点扫描顺序相同
+    lon_grid, lat_grid = np.meshgrid(_sample_axis(min_lon, max_lon, step),
+                                     _sample_axis(min_lat, max_lat, step), indexing='ij')
+    inside = contains_xy(poly2d, lon_grid, lat_grid)
+    lons, lats = lon_grid[inside], lat_grid[inside]
+    codes = grid_encode.encode_grid_batch(lons, lats, alt, level=11)
+    levels = risk_levels(get_risk_scores(lons, lats, alt))
+    return [{'code': code, 'risk': int(level)} for code, level in zip(codes, levels)]
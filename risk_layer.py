@@ -0,0 +1,261 @@
+"""
+预计算网格风险表
+
+离线任务按指定级别遍历区域内的每个网格，在网格中心对各栅格图层采样一次，
+结果按网格索引 (ay, ax) 存成紧凑的二维数组（.npz）。在线查询时，网格编码先解析为
+整数索引再直接取数组元素，O(1) 得到风险等级；超出覆盖范围时回退到实时采样。
+
+风险分数与高度有关（0.2 * |alt - 地形|），因此表中保存各图层的原始采样值
+（保持栅格原始数据类型），查询时按编码中的高程计算分数，结果与在网格中心实时采样一致。
+
+生成风险表:
+    python risk_layer.py --level 10 --output data/risk_table.npz
+"""
+import argparse
+import os
+import threading
+import time
+
+import numpy as np
+
+import risk_assessment as ra
+from airspace_grid import grid_hierarchy as gh
+from airspace_grid import grid_index as gi
+
+DEFAULT_LEVEL = 10
+# 惠州空域边界 (min_lon, min_lat, max_lon, max_lat)
+DEFAULT_BBOX = (113.7550, 22.4480, 114.6380, 22.8340)
+DEFAULT_TABLE_PATH = os.path.join(os.path.dirname(__file__), 'data', 'risk_table.npz')
+
+# 图层名称与栅格文件
+LAYER_PATHS = {
+    'population': ra.population_tif,
+    'building': ra.building_tif,
+    'terrain': ra.terrain_tif,
+}
+
+
+def _codes_index(codes, level):
+    """
+    编码列表按 grid_hierarchy 批量解析为 level 级网格索引
+
+    返回:
+    - (象限, ax, ay, 高程, 有效标记) 数组；22位编码高程为 0，长度或码元无效的编码有效标记为 False
+    """
+    n = len(codes)
+    quad = np.zeros(n, dtype=np.int64)
+    ax = np.zeros(n, dtype=np.int64)
+    ay = np.zeros(n, dtype=np.int64)
+    alts = np.zeros(n, dtype=np.float64)
+    valid = np.zeros(n, dtype=bool)
+    lengths = np.array([len(c) if isinstance(c, str) and c.isascii() else 0 for c in codes],
+                       dtype=np.int64)
+    for length in (gi.PLANE_CODE_LENGTH, gi.FULL_CODE_LENGTH):
+        idx = np.flatnonzero(lengths == length)
+        if not len(idx):
+            continue
+        group = [codes[k] for k in idx]
+        quad[idx], ax[idx], ay[idx], ok = gh.codes_to_index(group, level, return_valid=True)
+        if length == gi.FULL_CODE_LENGTH:
+            elev = gh.elevation_batch(group)
+            ok &= ~np.isnan(elev)
+            alts[idx] = np.where(ok, elev, 0)
+        valid[idx] = ok
+    return quad, ax, ay, alts, valid
+
+
+class RiskTable:
+    """某一级别、某一象限矩形范围内的网格风险表"""
+
+    def __init__(self, level, quad, ax0, ay0, layers):
+        self.level = level
+        self.quad = quad
+        self.ax0 = ax0
+        self.ay0 = ay0
+        self.layers = layers  # 图层名 -> (ny, nx) 数组；缺失的图层不保存，按 0 处理
+        self.shape = next(iter(layers.values())).shape if layers else (0, 0)
+
+    def save(self, path):
+        np.savez_compressed(path, level=self.level, quad=self.quad, origin=[self.ax0, self.ay0],
+                            shape=list(self.shape),
+                            **{f'layer_{name}': arr for name, arr in self.layers.items()})
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            layers = {key[len('layer_'):]: data[key] for key in data.files if key.startswith('layer_')}
+            ax0, ay0 = (int(v) for v in data['origin'])
+            table = cls(int(data['level']), int(data['quad']), ax0, ay0, layers)
+            table.shape = tuple(int(v) for v in data['shape'])
+        return table
+
+    def _offset(self, quad, ax, ay):
+        ix, iy = ax - self.ax0, ay - self.ay0
+        if quad != self.quad or not (0 <= iy < self.shape[0] and 0 <= ix < self.shape[1]):
+            return None
+        return iy, ix
+
+    def _sample(self, name, iy, ix):
+        arr = self.layers.get(name)
+        return arr[iy, ix] if arr is not None else 0
+
+    def score_index(self, quad, ax, ay, alt):
+        """网格索引对应的风险分数，超出覆盖范围返回 None"""
+        offset = self._offset(quad, ax, ay)
+        if offset is None:
+            return None
+        pop = self._sample('population', *offset)
+        bld = self._sample('building', *offset)
+        ter = self._sample('terrain', *offset)
+        # 与 risk_assessment.get_risk_score 的计算方式一致
+        return 0.5 * pop + 0.3 * bld + 0.2 * abs(alt - ter)
+
+    def lookup_code(self, code):
+        """网格编码的风险等级，超出覆盖范围返回 None"""
+        quad, ax, ay = gi.cell_index(code, self.level)
+        alt = gi.elevation_of(code) if len(code) == gi.FULL_CODE_LENGTH else 0
+        score = self.score_index(quad, ax, ay, alt)
+        return None if score is None else ra.risk_level(score)
+
+    def lookup_codes(self, codes):
+        """批量查表，返回风险等级数组，超出覆盖范围（或编码无效）的位置为 0"""
+        quad, ax, ay, alts, valid = _codes_index(codes, self.level)
+        iy, ix = ay - self.ay0, ax - self.ax0
+        found = valid & (quad == self.quad) & (iy >= 0) & (iy < self.shape[0]) \
+            & (ix >= 0) & (ix < self.shape[1])
+
+        iy, ix, alts = iy[found], ix[found], alts[found]
+        pop = self._sample('population', iy, ix)
+        bld = self._sample('building', iy, ix)
+        ter = self._sample('terrain', iy, ix)
+        levels = np.zeros(len(codes), dtype=np.int64)
+        levels[found] = ra.risk_levels(0.5 * pop + 0.3 * bld + 0.2 * np.abs(alts - ter))
+        return levels
+
+    def lookup_point(self, lon, lat, alt):
+        """经纬度高程所在网格的风险等级，超出覆盖范围返回 None"""
+        score = self.score_index(*gi.point_index(lon, lat, self.level), alt)
+        return None if score is None else ra.risk_level(score)
+
+
+def build_risk_table(bbox=DEFAULT_BBOX, level=DEFAULT_LEVEL, rows_per_chunk=256):
+    """
+    计算区域内每个网格中心的栅格采样值
+
+    参数:
+    - bbox: (min_lon, min_lat, max_lon, max_lat)，不能跨越赤道或本初子午线
+    - level: 网格级别
+    - rows_per_chunk: 每次批量采样的网格行数
+
+    返回:
+    - RiskTable
+    """
+    min_lon, min_lat, max_lon, max_lat = bbox
+    quad, ax_a, ay_a = gi.point_index(min_lon, min_lat, level)
+    quad_b, ax_b, ay_b = gi.point_index(max_lon, max_lat, level)
+    if quad != quad_b:
+        raise ValueError("风险表范围不能跨越赤道或本初子午线")
+    ax0, ax1 = min(ax_a, ax_b), max(ax_a, ax_b)
+    ay0, ay1 = min(ay_a, ay_b), max(ay_a, ay_b)
+    nx, ny = ax1 - ax0 + 1, ay1 - ay0 + 1
+
+    lon_sign = -1 if quad in (gi.NW, gi.SW) else 1
+    lat_sign = 1 if quad in (gi.NW, gi.NE) else -1
+    lons = lon_sign * (np.arange(ax0, ax1 + 1) + 0.5) * gi.LON_CELL_SIZE[level]
+
+    layers = {}
+    for name, path in LAYER_PATHS.items():
+        layer = ra.get_layer(path)
+        if layer.shape is None:
+            continue  # 缺失的图层查询时按 0 处理
+        arr = np.zeros((ny, nx), dtype=layer.dtype)
+        for start in range(0, ny, rows_per_chunk):
+            stop = min(ny, start + rows_per_chunk)
+            lats = lat_sign * (np.arange(ay0 + start, ay0 + stop) + 0.5) * gi.LAT_CELL_SIZE[level]
+            lon_grid, lat_grid = np.meshgrid(lons, lats)
+            arr[start:stop] = layer.sample_many(lon_grid, lat_grid)
+        layers[name] = arr
+
+    table = RiskTable(level, quad, ax0, ay0, layers)
+    table.shape = (ny, nx)
+    return table
+
+
+_table = None
+_table_mtime = None
+_table_lock = threading.Lock()
+
+
+def get_risk_table(path=None):
+    """加载风险表（文件变化时重新加载），文件不存在时返回 None"""
+    global _table, _table_mtime
+    path = path or os.environ.get('RISK_TABLE_PATH', DEFAULT_TABLE_PATH)
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+    if _table is None or _table_mtime != (path, mtime):
+        with _table_lock:
+            if _table is None or _table_mtime != (path, mtime):
+                _table = RiskTable.load(path)
+                _table_mtime = (path, mtime)
+    return _table
+
+
+def risk_by_code(grid_code):
+    """
+    给定网格编码返回风险等级（risk_by_codes 的单个编码版本，两者的编码 -> 位置换算相同）
+
+    编码无效（不是 22 / 33 位的规范编码）时抛出 ValueError
+    """
+    risk = int(risk_by_codes([grid_code])[0])
+    if risk == 0:
+        raise ValueError(f"无效的网格编码: {grid_code}")
+    return risk
+
+
+def _sample_codes(codes):
+    """
+    在编码所在最细级网格的中心（grid_index.cell_index）批量实时采样，高程取编码中的高程，与查表一致；
+    返回风险等级数组，无效编码为 0
+    """
+    quad, ax, ay, alts, valid = _codes_index(codes, gi.MAX_LEVEL)
+    lons, lats = gh.cell_center_batch(quad[valid], ax[valid], ay[valid], gi.MAX_LEVEL)
+    levels = np.zeros(len(codes), dtype=np.int64)
+    levels[valid] = ra.risk_levels(ra.get_risk_scores(lons, lats, alts[valid]))
+    return levels
+
+
+def risk_by_codes(codes):
+    """
+    批量版 risk_by_code，返回风险等级数组，无效编码为 0
+
+    表内编码向量化查表；其余编码解析为最细级网格索引，在网格中心一次性批量实时采样
+    """
+    table = get_risk_table()
+    if table is None:
+        return _sample_codes(codes)
+    levels = table.lookup_codes(codes)
+    miss = np.flatnonzero(levels == 0)
+    if len(miss):
+        levels[miss] = _sample_codes([codes[k] for k in miss])
+    return levels
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="生成预计算网格风险表")
+    parser.add_argument('--bbox', type=float, nargs=4, default=DEFAULT_BBOX,
+                        metavar=('MIN_LON', 'MIN_LAT', 'MAX_LON', 'MAX_LAT'), help="区域范围")
+    parser.add_argument('--level', type=int, default=DEFAULT_LEVEL, help="网格级别")
+    parser.add_argument('--output', default=DEFAULT_TABLE_PATH, help="输出文件 (.npz)")
+    args = parser.parse_args(argv)
+
+    start = time.time()
+    table = build_risk_table(tuple(args.bbox), args.level)
+    table.save(args.output)
+    print(f"风险表已生成: {args.output}，级别 {table.level}，{table.shape[0]}×{table.shape[1]} 个网格，"
+          f"图层 {', '.join(table.layers)}，耗时 {time.time() - start:.2f} 秒")
+
+
+if __name__ == '__main__':
+    main()
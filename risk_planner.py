@@ -0,0 +1,224 @@
+"""
+基于风险代价场的航线规划
+
+把风险栅格转换为指定级别的三维代价网格，网格几何与 GridGenerator 一致：
+- 平面按该级经纬度边长对齐（起点为 floor(lon / 边长) * 边长）
+- 高度按 1000 / 2^(level - 5) 米分层（与 GridGenerator.get_grids 相同，因此级别需不低于 6）
+
+每个网格的风险分数按网格中心采样计算（与 get_risk_score 相同）；障碍物取自
+obstacle_grid 的建筑高度体素化结果，被占用的三维网格不可通行。
+
+代价网格的数组下标按 floor(经纬度 / 边长) 计算，只对东北象限（经纬度均非负）成立，
+其他象限的范围直接报错。
+
+在代价网格上用 A* 搜索（堆优先队列，水平 8 邻域 + 垂直上下；距离、父节点等状态为 numpy 数组，
+每次扩展对全部邻居整体松弛）：进入一个网格的代价为
+移动距离（米）× (distance_weight + 风险分数)，启发函数为到终点的直线距离 ×
+(distance_weight + 最小风险分数)，不会高估剩余代价，得到的是代价最小的路径。
+返回的网格编码按网格中心编码（与 calculate_route_grids 相同），按 grid_index.cell_index
+解析得到的是同一级别网格；calculate_route_grids 的起点经逐次舍入累加，编码中低于该级别的码元可能略有不同。
+"""
+import heapq
+import math
+
+import numpy as np
+
+import risk_assessment as ra
+from obstacle_grid import alt_step_of, build_obstacle_grid
+from airspace_grid import grid_encode
+from airspace_grid import grid_index as gi
+
+METERS_PER_DEGREE = 111320.0
+DEFAULT_LEVEL = 11
+DEFAULT_DISTANCE_WEIGHT = 1.0
+MAX_COST_GRID_CELLS = 8_000_000
+
+
+class CostGrid:
+    """三维代价网格，数组下标为 (层, 纬度行, 经度列)，四周各留一圈障碍物作为边界"""
+
+    def __init__(self, level, ax0, ay0, layer0, score, blocked):
+        self.level = level
+        self.ax0 = ax0          # 第 1 列对应的经度索引 floor(lon / 边长)
+        self.ay0 = ay0          # 第 1 行对应的纬度索引 floor(lat / 边长)
+        self.layer0 = layer0    # 第 1 层对应的高度层号 floor(alt / 层高)
+        self.score = score
+        self.blocked = blocked
+        self.lon_step = gi.LON_CELL_SIZE[level]
+        self.lat_step = gi.LAT_CELL_SIZE[level]
+        self.alt_step = alt_step_of(level)
+
+    @property
+    def shape(self):
+        return self.score.shape
+
+    def cell_of(self, lon, lat, alt):
+        """经纬度高程所在网格的数组下标（含边界偏移）"""
+        return (math.floor(alt / self.alt_step) - self.layer0 + 1,
+                math.floor(lat / self.lat_step) - self.ay0 + 1,
+                math.floor(lon / self.lon_step) - self.ax0 + 1)
+
+    def cell_geometry(self, z, y, x):
+        """数组下标 -> (中心经度, 中心纬度, 中心高度)，舍入方式与 GridGenerator 相同"""
+        lon = round((self.ax0 + x - 1) * self.lon_step, 9)
+        lat = round((self.ay0 + y - 1) * self.lat_step, 9)
+        alt = (self.layer0 + z - 1) * self.alt_step
+        return (round(lon + self.lon_step / 2, 9), round(lat + self.lat_step / 2, 9),
+                round(alt + self.alt_step / 2, 2))
+
+    def cell_code(self, z, y, x):
+        lon, lat, alt = self.cell_geometry(z, y, x)
+        return grid_encode.encode_grid(lon, lat, alt, self.level)
+
+
+def build_cost_grid(bbox, level=DEFAULT_LEVEL, alt_min=0.0, alt_max=300.0, obstacles=None):
+    """
+    生成区域内的三维代价网格
+
+    参数:
+    - bbox: (min_lon, min_lat, max_lon, max_lat)，须位于东北象限（经纬度均非负）
+    - level: 网格级别（>= 6）
+    - alt_min, alt_max: 高度范围（米）
+    - obstacles: 覆盖该范围的 ObstacleGrid，默认按范围现场体素化
+
+    返回:
+    - CostGrid
+    """
+    min_lon, min_lat, max_lon, max_lat = bbox
+    if min_lon < 0 or min_lat < 0:
+        raise ValueError("代价网格仅支持东北象限（经纬度均非负）")
+    lon_step, lat_step, alt_step = gi.LON_CELL_SIZE[level], gi.LAT_CELL_SIZE[level], alt_step_of(level)
+    ax0, ax1 = math.floor(min_lon / lon_step), math.ceil(max_lon / lon_step)
+    ay0, ay1 = math.floor(min_lat / lat_step), math.ceil(max_lat / lat_step)
+    layer0, layer1 = math.floor(alt_min / alt_step), math.ceil(alt_max / alt_step)
+    nx, ny, nz = ax1 - ax0, ay1 - ay0, layer1 - layer0
+    if nx * ny * nz > MAX_COST_GRID_CELLS:
+        raise ValueError(f"代价网格过大: {nx}×{ny}×{nz}")
+
+    # 平面网格中心采样
+    lons = (np.arange(ax0, ax1) + 0.5) * lon_step
+    lats = (np.arange(ay0, ay1) + 0.5) * lat_step
+    lon_grid, lat_grid = np.meshgrid(lons, lats)
+    pop = ra.get_layer(ra.population_tif).sample_many(lon_grid, lat_grid)
+    bld = ra.get_layer(ra.building_tif).sample_many(lon_grid, lat_grid)
+    ter = ra.get_layer(ra.terrain_tif).sample_many(lon_grid, lat_grid).astype(np.float64)
+    base = 0.5 * pop + 0.3 * bld
+
+    if obstacles is None:
+        obstacles = build_obstacle_grid(bbox, level)
+    ox, oy = ax0 - obstacles.ax0, ay0 - obstacles.ay0
+    if obstacles.level != level or ox < 0 or oy < 0 or \
+            ox + nx > obstacles.shape[1] or oy + ny > obstacles.shape[0]:
+        raise ValueError("障碍物网格与代价网格的级别或范围不一致")
+    ceiling = obstacles.ceiling[oy:oy + ny, ox:ox + nx]
+
+    # 逐层计算分数与障碍物，外围留一圈障碍物
+    score = np.zeros((nz + 2, ny + 2, nx + 2), dtype=np.float64)
+    blocked = np.ones((nz + 2, ny + 2, nx + 2), dtype=bool)
+    for k in range(nz):
+        floor_alt = (layer0 + k) * alt_step
+        score[k + 1, 1:-1, 1:-1] = base + 0.2 * np.abs(floor_alt + alt_step / 2 - ter)
+        blocked[k + 1, 1:-1, 1:-1] = layer0 + k < ceiling
+    return CostGrid(level, ax0, ay0, layer0, score, blocked)
+
+
+def plan_route(grid, start, goal, distance_weight=DEFAULT_DISTANCE_WEIGHT):
+    """
+    在代价网格上搜索风险代价最小的路径
+
+    参数:
+    - grid: CostGrid
+    - start, goal: (lon, lat, alt)
+    - distance_weight: 单位距离的基础代价，越大路径越短、越小越偏向低风险
+
+    返回:
+    - dict: codes（依次经过的网格编码）、cells（[lon, lat, alt] 网格中心）、
+      length（米）、cost、risk_integral（风险分数对距离的积分）、max_risk、expanded（扩展的网格数）
+    """
+    nz, ny, nx = grid.shape
+    src, dst = grid.cell_of(*start), grid.cell_of(*goal)
+    for name, (z, y, x) in (('起点', src), ('终点', dst)):
+        if not (0 < z < nz - 1 and 0 < y < ny - 1 and 0 < x < nx - 1):
+            raise ValueError(f"{name}不在代价网格范围内")
+        if grid.blocked[z, y, x]:
+            raise ValueError(f"{name}位于障碍物内")
+
+    mid_lat = math.radians((grid.ay0 + ny / 2) * grid.lat_step)
+    dx = grid.lon_step * METERS_PER_DEGREE * math.cos(mid_lat)
+    dy = grid.lat_step * METERS_PER_DEGREE
+    dz = grid.alt_step
+
+    # 邻域：水平 8 方向 + 上下，扁平偏移与移动距离
+    moves = [(oy * nx + ox, math.hypot(ox * dx, oy * dy))
+             for oy in (-1, 0, 1) for ox in (-1, 0, 1) if ox or oy]
+    moves += [(nx * ny, dz), (-nx * ny, dz)]
+    offsets = np.array([m[0] for m in moves], dtype=np.int64)
+    lengths = np.array([m[1] for m in moves], dtype=np.float64)
+
+    open_cells = ~grid.blocked
+    min_score = float(grid.score[open_cells].min())
+    # 启发函数：直线距离 × 单位距离最小代价
+    zz, yy, xx = np.indices(grid.shape, sparse=True)
+    heuristic = (np.sqrt(((xx - dst[2]) * dx) ** 2 + ((yy - dst[1]) * dy) ** 2 + ((zz - dst[0]) * dz) ** 2)
+                 * (distance_weight + min_score)).ravel()
+    step_cost = (grid.score + distance_weight).ravel()
+    blocked = grid.blocked.ravel()
+
+    source = (src[0] * ny + src[1]) * nx + src[2]
+    target = (dst[0] * ny + dst[1]) * nx + dst[2]
+    dist = np.full(blocked.size, np.inf)
+    parent = np.full(blocked.size, -1, dtype=np.int64)
+    closed = np.zeros(blocked.size, dtype=bool)
+    dist[source] = 0.0
+    # 堆中只保存 (估计总代价, 扁平下标)，过期的条目弹出时按 closed 跳过
+    frontier = [(float(heuristic[source]), source)]
+    expanded = 0
+    while frontier:
+        _, node = heapq.heappop(frontier)
+        if closed[node]:
+            continue
+        if node == target:
+            break
+        closed[node] = True
+        expanded += 1
+        # 对全部邻居整体松弛（边界一圈为障碍物，偏移不会越界）
+        nb = node + offsets
+        nd = dist[node] + lengths * step_cost[nb]
+        better = ~(blocked[nb] | closed[nb]) & (nd < dist[nb])
+        nb, nd = nb[better], nd[better]
+        dist[nb] = nd
+        parent[nb] = node
+        for f, n in zip((nd + heuristic[nb]).tolist(), nb.tolist()):
+            heapq.heappush(frontier, (f, n))
+    else:
+        raise ValueError("起点与终点之间没有可通行的路径")
+
+    path = []
+    node = target
+    while node != -1:
+        path.append(tuple(int(v) for v in np.unravel_index(node, grid.shape)))
+        node = parent[node]
+    path.reverse()
+
+    cells = np.array(path)
+    scores = grid.score[cells[:, 0], cells[:, 1], cells[:, 2]]
+    steps = np.abs(np.diff(cells, axis=0)) * [dz, dy, dx]
+    lengths = np.sqrt((steps ** 2).sum(axis=1))
+    return {
+        'codes': [grid.cell_code(*c) for c in path],
+        'cells': [list(grid.cell_geometry(*c)) for c in path],
+        'length': float(lengths.sum()),
+        'cost': float(dist[target]),
+        'risk_integral': float(np.dot(lengths, scores[1:])),
+        'max_risk': int(ra.risk_levels(scores).max()),
+        'expanded': expanded,
+    }
+
+
+def plan_least_risk_route(start, goal, level=DEFAULT_LEVEL, alt_min=0.0, alt_max=300.0,
+                          margin=0.01, distance_weight=DEFAULT_DISTANCE_WEIGHT):
+    """在起终点外扩 margin 度的范围内生成代价网格并规划航线"""
+    bbox = (min(start[0], goal[0]) - margin, min(start[1], goal[1]) - margin,
+            max(start[0], goal[0]) + margin, max(start[1], goal[1]) + margin)
+    grid = build_cost_grid(bbox, level, alt_min, alt_max)
+    return plan_route(grid, start, goal, distance_weight)
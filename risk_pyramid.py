@@ -0,0 +1,207 @@
+"""
+多级风险金字塔
+
+以预计算风险表（risk_layer.RiskTable）的网格为底层，按 grid_encode 的逐级细分
+（6°×4°，2×2，6×4，2×3，3×2，5×5，5×5，3×3，之后 2×2）自下而上聚合到第 1 级。
+每个网格保存：
+- base_max / base_sum：与高度无关部分 0.5 * 人口 + 0.3 * 建筑 的最大值与和
+- ter_min / ter_max / ter_sum：地形高程的范围与和
+- count：覆盖的底层网格数
+
+风险分数 = base + 0.2 * |alt - 地形|，因此任意高度下子树的风险上界为
+base_max + 0.2 * max(|alt - ter_min|, |alt - ter_max|)，在底层网格上即为精确值。
+粗级别查询和航线预筛选可据此整棵剪掉低风险子树，只在可能超过阈值的分支上细化。
+"""
+import threading
+
+import numpy as np
+
+import risk_assessment as ra
+import risk_layer
+from airspace_grid import grid_index as gi
+
+
+class PyramidLevel:
+    """某一级别的聚合数组，数组下标为 (ay - ay0, ax - ax0)"""
+
+    def __init__(self, level, ax0, ay0, count, base_sum, base_max, ter_sum, ter_min, ter_max):
+        self.level = level
+        self.ax0 = ax0
+        self.ay0 = ay0
+        self.count = count
+        self.base_sum = base_sum
+        self.base_max = base_max
+        self.ter_sum = ter_sum
+        self.ter_min = ter_min
+        self.ter_max = ter_max
+
+    @property
+    def shape(self):
+        return self.count.shape
+
+    def offsets(self, ax, ay):
+        """索引数组 -> (行, 列, 是否在覆盖范围内且有数据)"""
+        ix = np.asarray(ax) - self.ax0
+        iy = np.asarray(ay) - self.ay0
+        inside = (iy >= 0) & (iy < self.shape[0]) & (ix >= 0) & (ix < self.shape[1])
+        iy, ix = np.where(inside, iy, 0), np.where(inside, ix, 0)
+        inside &= self.count[iy, ix] > 0
+        return iy, ix, inside
+
+    def upper_bound(self, iy, ix, alt):
+        """子树内风险分数的上界"""
+        spread = np.maximum(np.abs(alt - self.ter_min[iy, ix]), np.abs(alt - self.ter_max[iy, ix]))
+        return self.base_max[iy, ix] + 0.2 * spread
+
+    def mean_score(self, iy, ix, alt):
+        """子树平均风险分数（地形差取平均地形，alt 不低于地形时为精确值）"""
+        count = self.count[iy, ix]
+        return self.base_sum[iy, ix] / count + 0.2 * np.abs(alt - self.ter_sum[iy, ix] / count)
+
+    def coarsen(self):
+        """聚合为上一级"""
+        rx, ry = gi.LON_RADIX[self.level], gi.LAT_RADIX[self.level]
+        pax0, pay0 = self.ax0 // rx, self.ay0 // ry
+        ox, oy = self.ax0 - pax0 * rx, self.ay0 - pay0 * ry
+        ny, nx = self.shape
+        pnx, pny = -(-(ox + nx) // rx), -(-(oy + ny) // ry)
+
+        def aggregate(arr, fill, func):
+            padded = np.full((pny * ry, pnx * rx), fill, dtype=np.float64)
+            padded[oy:oy + ny, ox:ox + nx] = arr
+            return func(padded.reshape(pny, ry, pnx, rx), axis=(1, 3))
+
+        return PyramidLevel(
+            self.level - 1, pax0, pay0,
+            count=aggregate(self.count, 0, np.sum),
+            base_sum=aggregate(self.base_sum, 0, np.sum),
+            base_max=aggregate(self.base_max, -np.inf, np.max),
+            ter_sum=aggregate(self.ter_sum, 0, np.sum),
+            ter_min=aggregate(self.ter_min, np.inf, np.min),
+            ter_max=aggregate(self.ter_max, -np.inf, np.max),
+        )
+
+
+class RiskPyramid:
+    """第 1 级到底层级别的风险金字塔"""
+
+    def __init__(self, table):
+        self.quad = table.quad
+        self.base_level = table.level
+        shape = table.shape
+        zeros = np.zeros(shape, dtype=np.float64)
+        pop = table.layers.get('population', 0)
+        bld = table.layers.get('building', 0)
+        ter = table.layers.get('terrain', zeros).astype(np.float64)
+        # 与 get_risk_score 相同的加权方式
+        base = (0.5 * pop + 0.3 * bld) + zeros
+
+        level = PyramidLevel(table.level, table.ax0, table.ay0, count=np.ones(shape),
+                             base_sum=base, base_max=base, ter_sum=ter, ter_min=ter, ter_max=ter)
+        self.levels = {level.level: level}
+        while level.level > 1:
+            level = level.coarsen()
+            self.levels[level.level] = level
+
+    def check_level(self, level):
+        """查询级别须在 1 ~ 底层级别之间，更细的级别没有数据，抛出 ValueError 而不是截断到底层级别"""
+        if not 1 <= level <= self.base_level:
+            raise ValueError(f"无效的金字塔级别: {level}（应为 1~{self.base_level}）")
+
+    def cell_stats(self, quad, ax, ay, level, alt):
+        """某一网格子树的风险统计，超出覆盖范围返回 None"""
+        if quad != self.quad or level not in self.levels:
+            return None
+        pl = self.levels[level]
+        iy, ix, inside = pl.offsets(ax, ay)
+        if not inside:
+            return None
+        score_max = float(pl.upper_bound(iy, ix, alt))
+        score_mean = float(pl.mean_score(iy, ix, alt))
+        return {
+            'level': level,
+            'cells': int(pl.count[iy, ix]),
+            'score_max': score_max,
+            'score_mean': score_mean,
+            'risk_max': ra.risk_level(score_max),
+            'risk_mean': ra.risk_level(score_mean),
+        }
+
+    def stats_by_code(self, grid_code, level):
+        """给定编码在指定级别的风险统计，level 超出 1 ~ 底层级别时抛出 ValueError"""
+        self.check_level(level)
+        alt = gi.elevation_of(grid_code) if len(grid_code) == gi.FULL_CODE_LENGTH else 0
+        return self.cell_stats(*gi.cell_index(grid_code, level), level, alt)
+
+    def find_risky_cells(self, min_risk, alt, level=None, start_level=1):
+        """
+        自上而下查找风险等级不低于 min_risk 的网格，上界低于阈值的子树整体剪枝
+
+        参数:
+        - min_risk: 风险等级阈值（1-5）
+        - alt: 高度（米）
+        - level: 目标级别，默认底层级别（不能超过底层级别）
+        - start_level: 起始级别
+
+        返回:
+        - (ax, ay, 访问的网格数)，ax / ay 为目标级别的网格索引数组
+        """
+        level = self.base_level if level is None else level
+        self.check_level(level)
+        self.check_level(start_level)
+        threshold = -np.inf if min_risk <= 1 else float(ra.RISK_LEVEL_BINS[min_risk - 2])
+
+        pl = self.levels[start_level]
+        ay, ax = np.indices(pl.shape)
+        ax, ay = ax.ravel() + pl.ax0, ay.ravel() + pl.ay0
+        visited = 0
+        for lv in range(start_level, level + 1):
+            if lv > start_level:
+                # 展开为下一级的全部子网格
+                rx, ry = gi.LON_RADIX[lv], gi.LAT_RADIX[lv]
+                cx = (ax[:, None, None] * rx + np.arange(rx)[None, None, :])
+                cy = (ay[:, None, None] * ry + np.arange(ry)[None, :, None])
+                ax, ay = np.broadcast_arrays(cx, cy)
+                ax, ay = ax.ravel(), ay.ravel()
+            pl = self.levels[lv]
+            iy, ix, inside = pl.offsets(ax, ay)
+            visited += int(inside.sum())
+            keep = inside & (pl.upper_bound(iy, ix, alt) >= threshold)
+            ax, ay = ax[keep], ay[keep]
+        return ax, ay, visited
+
+    def prescreen_codes(self, codes, min_risk, alt=None, level=6):
+        """
+        航线预筛选：在较粗级别上判断哪些编码的子树可能达到 min_risk
+
+        返回:
+        - 布尔数组，False 表示该编码所在的 level 级网格整体低于阈值，可跳过精细计算；
+          超出金字塔范围或无效的编码返回 True（需要实时计算）
+        """
+        self.check_level(level)
+        threshold = -np.inf if min_risk <= 1 else float(ra.RISK_LEVEL_BINS[min_risk - 2])
+        pl = self.levels[level]
+        quad, ax, ay, alts, valid = risk_layer._codes_index(list(codes), level)
+        iy, ix, inside = pl.offsets(ax, ay)
+        inside &= valid & (quad == self.quad)
+        h = alts if alt is None else alt
+        return ~inside | (pl.upper_bound(iy, ix, h) >= threshold)
+
+
+_pyramid = None
+_pyramid_table = None
+_pyramid_lock = threading.Lock()
+
+
+def get_risk_pyramid():
+    """基于当前预计算风险表的金字塔（风险表更新后重建），没有风险表时返回 None"""
+    global _pyramid, _pyramid_table
+    table = risk_layer.get_risk_table()
+    if table is None:
+        return None
+    if _pyramid_table is not table:
+        with _pyramid_lock:
+            if _pyramid_table is not table:
+                _pyramid = RiskPyramid(table)
+                _pyramid_table = table
+    return _pyramid
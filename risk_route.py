@@ -0,0 +1,121 @@
+"""
+航线风险剖面
+
+沿航路点依次连接的各航段按不超过半个网格的间隔加密采样，每个采样点代表航段上
+等长的一小段；一次性批量计算全部采样点的风险分数，再把连续落在同一平面网格内的
+采样点合并为一个网格，得到航线依次经过的网格及其风险、飞行距离和暴露时间。
+
+汇总指标：
+- max_risk / max_score：航线经过的最高风险等级与分数
+- integral：风险分数对飞行时间的积分（分数·秒）
+- exposure：各风险等级下的暴露时间（秒）
+- blocked_cells：给定障碍物占用（obstacle_grid.ObstacleGrid）时，经过被占用网格的数量
+"""
+import numpy as np
+
+import risk_assessment as ra
+from airspace_grid import grid_encode
+from airspace_grid import grid_index as gi
+from obstacle_grid import build_obstacle_grid
+
+DEFAULT_LEVEL = 11
+DEFAULT_SPEED = 10.0        # 默认飞行速度（米/秒）
+METERS_PER_DEGREE = 111320.0
+MAX_ROUTE_SAMPLES = 2_000_000
+
+
+def _densify(waypoints, level):
+    """航段加密：返回采样点经纬高数组和每个采样点代表的航段长度（米）"""
+    start, end = waypoints[:-1], waypoints[1:]
+    delta = end - start
+    # 每个网格至少采样两次
+    cells = np.maximum(np.abs(delta[:, 0]) / gi.LON_CELL_SIZE[level],
+                       np.abs(delta[:, 1]) / gi.LAT_CELL_SIZE[level])
+    counts = np.maximum(1, np.ceil(cells * 2).astype(np.int64))
+    if counts.sum() > MAX_ROUTE_SAMPLES:
+        raise ValueError(f"航线过长，采样点超过 {MAX_ROUTE_SAMPLES}")
+
+    mid_lat = np.radians((start[:, 1] + end[:, 1]) / 2)
+    dx = delta[:, 0] * METERS_PER_DEGREE * np.cos(mid_lat)
+    dy = delta[:, 1] * METERS_PER_DEGREE
+    lengths = np.sqrt(dx * dx + dy * dy + delta[:, 2] * delta[:, 2])
+
+    seg = np.repeat(np.arange(len(counts)), counts)
+    offsets = np.cumsum(counts) - counts
+    step = np.arange(counts.sum()) - offsets[seg]
+    t = (step + 0.5) / counts[seg]  # 采样点位于各小段中点
+    points = start[seg] + t[:, None] * delta[seg]
+    return points, (lengths / counts)[seg]
+
+
+def risk_by_route(waypoints, speed=DEFAULT_SPEED, level=DEFAULT_LEVEL, obstacles=None):
+    """
+    计算航线的逐网格风险剖面
+
+    参数:
+    - waypoints: [[lon, lat, alt], ...]，至少两个航路点，高度缺省为 0
+    - speed: 飞行速度（米/秒）
+    - level: 网格级别
+    - obstacles: 可选的 ObstacleGrid，给出时检查航线是否穿过障碍物
+
+    返回:
+    - cells: 依次经过的网格，列式数组 {code, risk, score, length, time}，
+      score 为网格内采样点的最大分数，length / time 为网格内飞行距离（米）和时间（秒）
+    - 汇总指标 length, duration, max_risk, max_score, integral, exposure
+    - 给出 obstacles 时，cells 中增加 blocked（网格内是否有采样点被占用），并汇总 blocked_cells
+    """
+    if speed <= 0:
+        raise ValueError("速度必须大于 0")
+    if not 1 <= level <= gi.MAX_LEVEL:
+        raise ValueError(f"无效的网格级别: {level}")
+    waypoints = np.array([list(p) + [0] * (3 - len(p)) for p in waypoints], dtype=np.float64)
+    if waypoints.ndim != 2 or waypoints.shape != (len(waypoints), 3) or len(waypoints) < 2:
+        raise ValueError("至少需要两个航路点 [lon, lat, alt]")
+
+    points, seg_length = _densify(waypoints, level)
+    lons, lats, alts = points[:, 0], points[:, 1], points[:, 2]
+    scores = ra.get_risk_scores(lons, lats, alts)
+    times = seg_length / speed
+
+    # 连续落在同一平面网格内的采样点合并为一个网格
+    ax = np.floor(np.abs(lons) / gi.LON_CELL_SIZE[level])
+    ay = np.floor(np.abs(lats) / gi.LAT_CELL_SIZE[level])
+    quad = (lons < 0).astype(np.int8) + 2 * (lats < 0)
+    changed = (np.diff(ax) != 0) | (np.diff(ay) != 0) | (np.diff(quad) != 0)
+    first = np.concatenate([[0], np.flatnonzero(changed) + 1])
+
+    cell_scores = np.maximum.reduceat(scores, first)
+    cell_length = np.add.reduceat(seg_length, first)
+    cell_time = np.add.reduceat(times, first)
+    cell_risk = ra.risk_levels(cell_scores)
+    codes = grid_encode.encode_grid_batch(lons[first], lats[first], alts[first], level=level)
+
+    levels = ra.risk_levels(scores)
+    exposure = np.bincount(levels, weights=times, minlength=6)[1:]
+    result = {
+        'cells': {
+            'code': codes,
+            'risk': cell_risk.tolist(),
+            'score': cell_scores.tolist(),
+            'length': cell_length.tolist(),
+            'time': cell_time.tolist(),
+        },
+        'length': float(seg_length.sum()),
+        'duration': float(times.sum()),
+        'max_risk': int(cell_risk.max()),
+        'max_score': float(cell_scores.max()),
+        'integral': float(np.dot(scores, times)),
+        'exposure': {str(lv): float(t) for lv, t in enumerate(exposure, start=1)},
+    }
+    if obstacles is not None:
+        blocked = np.logical_or.reduceat(obstacles.blocked_many(lons, lats, alts), first)
+        result['cells']['blocked'] = blocked.tolist()
+        result['blocked_cells'] = int(blocked.sum())
+    return result
+
+
+def route_obstacles(waypoints, level=DEFAULT_LEVEL):
+    """航线范围内的障碍物占用（级别低于 6 时按第 6 级体素化）"""
+    lons = [float(p[0]) for p in waypoints]
+    lats = [float(p[1]) for p in waypoints]
+    return build_obstacle_grid((min(lons), min(lats), max(lons), max(lats)), max(level, 6))
@@ -0,0 +1,359 @@
+"""
+风险评估 API 的生产部署模式（ASGI）
+
+与 risk_api.py 提供相同的接口，区别在于：
+- 前端为异步 ASGI 应用，不依赖 Web 框架，可由 uvicorn / hypercorn 等任意 ASGI 服务器运行
+- 栅格采样等 CPU 密集的计算提交到进程池执行，不阻塞事件循环
+- 栅格在启动时解压为 .npy 并以内存映射方式只读打开（见 risk_assessment.RASTER_MMAP_ENV），
+  各工作进程共享同一份页缓存，不各自复制栅格数据
+- 并发的单点查询（/risk/by_coord）在 COALESCE_WINDOW 时间窗内合并为一次向量化计算
+
+启动:
+    python risk_server.py --port 9010 --pool-size 4
+或:
+    RISK_SERVER_WORKERS=4 uvicorn risk_server:app --port 9010
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import parse_qs
+
+import numpy as np
+
+try:
+    import uvicorn
+except ImportError:  # uvicorn 为可选依赖
+    uvicorn = None
+
+import risk_assessment as ra
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MMAP_DIR = os.path.join(os.path.dirname(__file__), 'data', 'cache', 'rasters')
+COALESCE_WINDOW = 0.002     # 单点查询合并等待时间（秒）
+COALESCE_MAX_POINTS = 4096  # 达到该数量立即提交
+MAX_BODY_BYTES = 32 * 1024 * 1024
+MAX_BATCH_SIZE = 100_000
+
+
+class RequestError(Exception):
+    """请求参数错误，返回对应的 HTTP 状态码"""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+# ---------------------------------------------------------------------------
+# 工作进程中执行的计算，返回可 JSON 序列化的结果
+# ---------------------------------------------------------------------------
+
+def _init_worker():
+    # 预先打开各图层（内存映射）和区域统计的积分图，避免首个请求承担加载 / 构建开销
+    import risk_zonal
+    for path in (ra.population_tif, ra.building_tif, ra.terrain_tif):
+        ra.get_layer(path)
+    risk_zonal.warm_up()
+
+
+def _score_points(lons, lats, alts):
+    codes, levels, _ = ra.risk_by_coords(lons, lats, alts)
+    return codes, levels.tolist()
+
+
+def _parse_points(points):
+    try:
+        coords = np.array([list(p) + [0] * (3 - len(p)) for p in points], dtype=np.float64)
+    except (TypeError, ValueError):
+        raise RequestError('Invalid points')
+    if coords.shape != (len(points), 3):
+        raise RequestError('Invalid points')
+    return coords
+
+
+def _by_code(params):
+    from risk_layer import risk_by_code
+    code = params.get('code')
+    if not code:
+        raise RequestError('Missing code')
+    try:
+        return {'code': code, 'risk': risk_by_code(code)}
+    except (ValueError, KeyError, IndexError):
+        raise RequestError('Invalid code')
+
+
+def _by_polygon(body):
+    polygon = body.get('polygon')
+    if not polygon or not isinstance(polygon, list):
+        raise RequestError('Missing or invalid polygon')
+    return {'results': ra.risk_by_polygon(polygon)}
+
+
+def _batch(body):
+    from risk_layer import risk_by_codes
+    codes, points = body.get('codes'), body.get('points')
+    items = codes if codes is not None else points
+    if not isinstance(items, list) or not items:
+        raise RequestError('Missing codes or points')
+    if len(items) > MAX_BATCH_SIZE:
+        raise RequestError(f'Too many items (max {MAX_BATCH_SIZE})', 413)
+    if codes is not None:
+        if not all(isinstance(code, str) for code in codes):
+            raise RequestError('Invalid codes')
+        return {'risk': risk_by_codes(codes).tolist()}
+    coords = _parse_points(points)
+    codes, levels = _score_points(coords[:, 0], coords[:, 1], coords[:, 2])
+    return {'codes': codes, 'risk': levels}
+
+
+def _route(body):
+    from risk_route import DEFAULT_LEVEL, DEFAULT_SPEED, risk_by_route, route_obstacles
+    waypoints = body.get('waypoints')
+    if not isinstance(waypoints, list):
+        raise RequestError('Missing waypoints')
+    try:
+        speed = float(body.get('speed', DEFAULT_SPEED))
+        level = int(body.get('level', DEFAULT_LEVEL))
+        obstacles = route_obstacles(waypoints, level) if body.get('check_obstacles') else None
+        return risk_by_route(waypoints, speed, level, obstacles)
+    except (TypeError, ValueError):
+        raise RequestError('Invalid waypoints, speed or level')
+
+
+def _zonal(params):
+    from risk_zonal import zonal_risk_by_code
+    code = params.get('code')
+    if not code:
+        raise RequestError('Missing code')
+    try:
+        return zonal_risk_by_code(code, int(params.get('level', 6)))
+    except (ValueError, KeyError, IndexError):
+        raise RequestError('Invalid code or level')
+
+
+def _pyramid(params):
+    from risk_pyramid import get_risk_pyramid
+    code = params.get('code')
+    if not code:
+        raise RequestError('Missing code')
+    pyramid = get_risk_pyramid()
+    if pyramid is None:
+        raise RequestError('Risk table not available', 404)
+    try:
+        stats = pyramid.stats_by_code(code, int(params.get('level', 6)))
+    except (ValueError, KeyError, IndexError):
+        raise RequestError('Invalid code or level')
+    if stats is None:
+        raise RequestError('Code outside risk table', 404)
+    stats['code'] = code
+    return stats
+
+
+# 路径 -> (方法, 处理函数, 参数来源)
+ROUTES = {
+    '/risk/by_code': ('GET', _by_code, 'query'),
+    '/risk/by_polygon': ('POST', _by_polygon, 'body'),
+    '/risk/batch': ('POST', _batch, 'body'),
+    '/risk/route': ('POST', _route, 'body'),
+    '/risk/zonal': ('GET', _zonal, 'query'),
+    '/risk/pyramid': ('GET', _pyramid, 'query'),
+}
+
+
+def _call(handler, arg):
+    """在工作进程中执行处理函数，参数错误转换为 (状态码, 结果)"""
+    try:
+        return 200, handler(arg)
+    except RequestError as e:
+        return e.status, {'error': str(e)}
+
+
+# ---------------------------------------------------------------------------
+# 事件循环侧：单点查询合并与 ASGI 应用
+# ---------------------------------------------------------------------------
+
+class PointBatcher:
+    """把时间窗内并发到达的单点查询合并为一次批量计算"""
+
+    def __init__(self, submit, window=COALESCE_WINDOW, max_points=COALESCE_MAX_POINTS):
+        self.submit = submit  # (func, *args) -> awaitable
+        self.window = window
+        self.max_points = max_points
+        self.pending = []
+        self.timer = None
+        self.batches = 0
+        self.points = 0
+
+    async def score(self, lon, lat, alt):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self.pending.append((lon, lat, alt, future))
+        if len(self.pending) >= self.max_points:
+            self._flush()
+        elif self.timer is None:
+            self.timer = loop.call_later(self.window, self._flush)
+        return await future
+
+    def _flush(self):
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        pending, self.pending = self.pending, []
+        if pending:
+            asyncio.ensure_future(self._run(pending))
+
+    async def _run(self, pending):
+        coords = np.array([p[:3] for p in pending], dtype=np.float64)
+        self.batches += 1
+        self.points += len(pending)
+        try:
+            codes, levels = await self.submit(_score_points, coords[:, 0], coords[:, 1], coords[:, 2])
+        except Exception as e:
+            for *_, future in pending:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (*_, future), code, level in zip(pending, codes, levels):
+            if not future.done():
+                future.set_result((code, level))
+
+
+class RiskServer:
+    """ASGI 应用：请求解析在事件循环中完成，计算提交到进程池"""
+
+    def __init__(self, pool_size=None, mmap_dir=None):
+        if pool_size is None:
+            pool_size = int(os.environ.get('RISK_SERVER_WORKERS', os.cpu_count() or 1))
+        self.pool_size = pool_size
+        self.mmap_dir = mmap_dir or os.environ.get(ra.RASTER_MMAP_ENV, DEFAULT_MMAP_DIR)
+        self.pool = None
+        self.started = False
+        self.batcher = PointBatcher(self.submit)
+
+    def start(self):
+        """服务开始接受请求前调用：生成栅格映射文件并启动全部工作进程"""
+        if self.started:
+            return
+        # 在主进程中先生成栅格 .npy 和积分图缓存，工作进程只做只读映射
+        os.environ[ra.RASTER_MMAP_ENV] = self.mmap_dir
+        ra.clear_layers()
+        _init_worker()
+        if self.pool_size > 0:
+            self.pool = ProcessPoolExecutor(self.pool_size, initializer=_init_worker)
+            # 工作进程按需创建，这里提交与进程数相同的空任务使其在开始服务前全部就绪
+            for future in [self.pool.submit(os.getpid) for _ in range(self.pool_size)]:
+                future.result()
+        self.started = True
+        logger.info("风险服务已启动，进程池大小 %d，栅格映射目录 %s", self.pool_size, self.mmap_dir)
+
+    def stop(self):
+        if self.pool is not None:
+            self.pool.shutdown(wait=False, cancel_futures=True)
+            self.pool = None
+        self.started = False
+
+    async def submit(self, func, *args):
+        # pool_size 为 0 时在线程中执行（调试用）
+        return await asyncio.get_running_loop().run_in_executor(self.pool, func, *args)
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+        elif scope['type'] == 'http':
+            try:
+                if not self.started:
+                    raise RequestError('Service not started', 503)
+                status, payload = await self._dispatch(scope, receive)
+            except RequestError as e:
+                status, payload = e.status, {'error': str(e)}
+            except Exception:
+                logger.exception("请求处理失败: %s", scope.get('path'))
+                status, payload = 500, {'error': 'Internal server error'}
+            await self._respond(send, status, payload)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                self.start()
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                self.stop()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def _dispatch(self, scope, receive):
+        path, method = scope['path'], scope['method']
+        params = {k: v[0] for k, v in parse_qs(scope.get('query_string', b'').decode()).items()}
+        if path == '/risk/by_coord':
+            if method != 'GET':
+                raise RequestError('Method not allowed', 405)
+            try:
+                lon, lat = float(params['lon']), float(params['lat'])
+                alt = float(params.get('alt', 0))
+            except (KeyError, ValueError):
+                raise RequestError('Invalid or missing lon/lat/alt')
+            code, risk = await self.batcher.score(lon, lat, alt)
+            return 200, {'code': code, 'risk': risk}
+
+        route = ROUTES.get(path)
+        if route is None:
+            raise RequestError('Not found', 404)
+        expected, handler, source = route
+        if method != expected:
+            raise RequestError('Method not allowed', 405)
+        if source == 'query':
+            arg = params
+        else:
+            arg = await self._read_json(receive)
+        return await self.submit(_call, handler, arg)
+
+    async def _read_json(self, receive):
+        chunks, size = [], 0
+        while True:
+            message = await receive()
+            chunk = message.get('body', b'')
+            size += len(chunk)
+            if size > MAX_BODY_BYTES:
+                raise RequestError('Request body too large', 413)
+            chunks.append(chunk)
+            if not message.get('more_body'):
+                break
+        try:
+            body = json.loads(b''.join(chunks) or b'{}')
+        except ValueError:
+            raise RequestError('Invalid JSON')
+        return body if isinstance(body, dict) else {}
+
+    async def _respond(self, send, status, payload):
+        body = json.dumps(payload).encode()
+        await send({'type': 'http.response.start', 'status': status,
+                    'headers': [(b'content-type', b'application/json'),
+                                (b'content-length', str(len(body)).encode())]})
+        await send({'type': 'http.response.body', 'body': body})
+
+
+app = RiskServer()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="风险评估 API（ASGI + 进程池）")
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=9010)
+    parser.add_argument('--pool-size', type=int, default=None, help="计算进程数，默认 CPU 核数")
+    parser.add_argument('--mmap-dir', default=None, help="栅格内存映射文件目录")
+    args = parser.parse_args(argv)
+    if uvicorn is None:
+        raise SystemExit("需要安装 uvicorn: pip install uvicorn")
+
+    logging.basicConfig(level=logging.INFO)
+    server = RiskServer(args.pool_size, args.mmap_dir)
+    server.start()
+    uvicorn.run(server, host=args.host, port=args.port)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,230 @@
+"""
+网格区域（zonal）风险统计
+
+按网格覆盖的全部栅格像元统计风险，而不是只取网格中心的一个像元：
+- 和 / 均值：对每个栅格建立积分图（summed-area table），任意矩形像元范围的和为
+  S[r1, c1] - S[r0, c1] - S[r1, c0] + S[r0, c0]，与网格大小无关，O(1)
+- 最大值：积分图无法求最大值，改用 ZONAL_BLOCK_SIZE 分块的块最大值表，
+  内部整块查表，只读取边缘不足一块的像元
+
+无数据（nodata）像元按 0 处理（无人口 / 无建筑），与栅格范围外相同；单点采样
+（RasterLayer.sample / sample_many）使用同一约定，区域统计与网格中心采样的结果可以直接比较。
+积分图逐条带构建并以 .npy 形式缓存在 RISK_CACHE_DIR 目录下，按内存映射方式加载，
+内存占用不随栅格大小增长。大栅格首次构建需要数秒到数十秒，服务启动时调用 warm_up()
+（或 warm_up_in_background()）预先构建，不在首个 /risk/zonal 请求中构建。
+缓存文件名由栅格文件名、绝对路径的哈希和修改时间组成；栅格文件修改后按新的修改时间重新构建，
+并删除同一栅格的旧版本缓存。多个进程同时构建时各自写入带进程号的临时文件，再原子替换。
+"""
+import glob
+import hashlib
+import os
+import threading
+
+import numpy as np
+
+import risk_assessment as ra
+from airspace_grid import grid_index as gi
+
+ZONAL_BLOCK_SIZE = 32
+ZONAL_STRIP_ROWS = ZONAL_BLOCK_SIZE * 16
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(__file__), 'data', 'cache')
+
+# 参与风险计算的图层
+LAYER_PATHS = {
+    'population': ra.population_tif,
+    'building': ra.building_tif,
+    'terrain': ra.terrain_tif,
+}
+
+
+class ZonalLayer:
+    """单个栅格图层的积分图与块最大值表"""
+
+    def __init__(self, layer, cache_dir=None):
+        self.layer = layer
+        self.mtime = layer.mtime
+        self.sat = None
+        self.block_max = None
+        if layer.shape is not None:
+            self._load_or_build(cache_dir or os.environ.get('RISK_CACHE_DIR', DEFAULT_CACHE_DIR))
+
+    def _load_or_build(self, cache_dir):
+        os.makedirs(cache_dir, exist_ok=True)
+        path = os.path.abspath(self.layer.path)
+        digest = hashlib.sha1(path.encode('utf-8')).hexdigest()[:16]
+        prefix = os.path.join(cache_dir, f"{os.path.basename(path)}.{digest}.")
+        stem = f"{prefix}{self.mtime}"
+        sat_path, max_path = stem + '.sat.npy', stem + '.bmax.npy'
+        if not (os.path.exists(sat_path) and os.path.exists(max_path)):
+            self._build(sat_path, max_path)
+            self._remove_stale(prefix, (sat_path, max_path))
+        self.sat = np.load(sat_path, mmap_mode='r')
+        self.block_max = np.load(max_path)
+
+    def _values(self, row0, row1, col0, col1):
+        data = self.layer.read_window(row0, row1, col0, col1)
+        values = data.astype(np.float64)
+        if self.layer.nodata is not None:
+            values[data == self.layer.nodata] = 0
+        return values
+
+    def _build(self, sat_path, max_path):
+        height, width = self.layer.shape
+        block = ZONAL_BLOCK_SIZE
+        tmp_path = f"{sat_path}.{os.getpid()}.tmp.npy"
+        sat = np.lib.format.open_memmap(tmp_path, mode='w+', dtype=np.float64, shape=(height + 1, width + 1))
+        sat[0] = 0
+        sat[:, 0] = 0
+        block_max = np.zeros((-(-height // block), -(-width // block)), dtype=np.float64)
+        previous = np.zeros(width, dtype=np.float64)
+
+        # 逐条带累加，条带高度为块大小的整数倍
+        for row0 in range(0, height, ZONAL_STRIP_ROWS):
+            row1 = min(height, row0 + ZONAL_STRIP_ROWS)
+            values = self._values(row0, row1, 0, width)
+            strip = np.cumsum(np.cumsum(values, axis=1), axis=0) + previous
+            sat[row0 + 1:row1 + 1, 1:] = strip
+            previous = strip[-1]
+
+            pad_rows = -(row1 - row0) % block
+            pad_cols = -width % block
+            padded = np.pad(values, ((0, pad_rows), (0, pad_cols)))
+            blocks = padded.reshape(padded.shape[0] // block, block, padded.shape[1] // block, block)
+            block_max[row0 // block:row0 // block + blocks.shape[0]] = blocks.max(axis=(1, 3))
+
+        sat.flush()
+        del sat
+        os.replace(tmp_path, sat_path)
+        tmp_path = f"{max_path}.{os.getpid()}.tmp.npy"
+        np.save(tmp_path, block_max)
+        os.replace(tmp_path, max_path)
+
+    @staticmethod
+    def _remove_stale(prefix, keep):
+        """删除同一栅格其他修改时间的缓存（其他进程已映射的文件在 POSIX 上仍可继续读取）"""
+        for path in glob.glob(glob.escape(prefix) + '*.npy'):
+            if path in keep or '.tmp.npy' in path:
+                continue
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def pixel_window(self, bbox):
+        """经纬度范围 [min_lon, min_lat, max_lon, max_lat] 覆盖的像元范围，无交集时返回 None"""
+        if self.sat is None:
+            return None
+        min_lon, min_lat, max_lon, max_lat = bbox
+        xs, ys = self.layer.inverse * (np.array([min_lon, max_lon, min_lon, max_lon]),
+                                       np.array([min_lat, min_lat, max_lat, max_lat]))
+        height, width = self.layer.shape
+        col0 = max(0, int(np.floor(xs.min())))
+        col1 = min(width, int(np.ceil(xs.max())))
+        row0 = max(0, int(np.floor(ys.min())))
+        row1 = min(height, int(np.ceil(ys.max())))
+        if row0 >= row1 or col0 >= col1:
+            return None
+        return row0, row1, col0, col1
+
+    def window_sum(self, row0, row1, col0, col1):
+        s = self.sat
+        return float(s[row1, col1] - s[row0, col1] - s[row1, col0] + s[row0, col0])
+
+    def window_max(self, row0, row1, col0, col1):
+        block = ZONAL_BLOCK_SIZE
+        br0, br1 = -(-row0 // block), row1 // block
+        bc0, bc1 = -(-col0 // block), col1 // block
+        if br0 >= br1 or bc0 >= bc1:
+            return float(self._values(row0, row1, col0, col1).max())
+
+        result = float(self.block_max[br0:br1, bc0:bc1].max())
+        # 整块以外的边缘条带直接读取像元
+        edges = [
+            (row0, br0 * block, col0, col1),
+            (br1 * block, row1, col0, col1),
+            (br0 * block, br1 * block, col0, bc0 * block),
+            (br0 * block, br1 * block, bc1 * block, col1),
+        ]
+        for r0, r1, c0, c1 in edges:
+            if r0 < r1 and c0 < c1:
+                result = max(result, float(self._values(r0, r1, c0, c1).max()))
+        return result
+
+    def stats(self, bbox):
+        """经纬度范围内的像元统计 {sum, mean, max, pixels}"""
+        window = self.pixel_window(bbox)
+        if window is None:
+            return {'sum': 0.0, 'mean': 0.0, 'max': 0.0, 'pixels': 0}
+        row0, row1, col0, col1 = window
+        pixels = (row1 - row0) * (col1 - col0)
+        total = self.window_sum(*window)
+        return {'sum': total, 'mean': total / pixels, 'max': self.window_max(*window), 'pixels': pixels}
+
+
+_zonal_layers = {}
+_zonal_lock = threading.Lock()
+
+
+def get_zonal_layer(path):
+    """获取图层的积分图（栅格文件变化后重新构建）"""
+    layer = ra.get_layer(path)
+    zonal = _zonal_layers.get(path)
+    if zonal is None or zonal.layer is not layer or zonal.mtime != layer.mtime:
+        with _zonal_lock:
+            zonal = _zonal_layers.get(path)
+            if zonal is None or zonal.layer is not layer or zonal.mtime != layer.mtime:
+                zonal = ZonalLayer(layer)
+                _zonal_layers[path] = zonal
+    return zonal
+
+
+def warm_up():
+    """构建（或从缓存加载）全部图层的积分图"""
+    for path in LAYER_PATHS.values():
+        get_zonal_layer(path)
+
+
+def warm_up_in_background():
+    """在后台线程中执行 warm_up，构建期间到达的请求在 get_zonal_layer 的锁上等待同一次构建"""
+    thread = threading.Thread(target=warm_up, name='zonal-warm-up', daemon=True)
+    thread.start()
+    return thread
+
+
+def zonal_stats(bbox):
+    """经纬度范围内各图层的像元统计"""
+    return {name: get_zonal_layer(path).stats(bbox) for name, path in LAYER_PATHS.items()}
+
+
+def zonal_risk(bbox, alt):
+    """
+    按区域统计计算风险
+
+    参数:
+    - bbox: [min_lon, min_lat, max_lon, max_lat]
+    - alt: 高度（米）
+
+    返回:
+    - 各图层统计，以及按均值 / 最大值计算的风险分数和等级
+    """
+    layers = zonal_stats(bbox)
+    pop, bld, ter = layers['population'], layers['building'], layers['terrain']
+    score_mean = 0.5 * pop['mean'] + 0.3 * bld['mean'] + 0.2 * abs(alt - ter['mean'])
+    score_max = 0.5 * pop['max'] + 0.3 * bld['max'] + 0.2 * abs(alt - ter['mean'])
+    return {
+        'layers': layers,
+        'score_mean': score_mean,
+        'score_max': score_max,
+        'risk_mean': ra.risk_level(score_mean),
+        'risk_max': ra.risk_level(score_max),
+    }
+
+
+def zonal_risk_by_code(grid_code, level):
+    """给定网格编码和统计级别，返回该级网格范围内的区域风险"""
+    quad, ax, ay = gi.cell_index(grid_code, level)
+    bbox = gi.cell_bbox(quad, ax, ay, level)
+    alt = gi.elevation_of(grid_code) if len(grid_code) == gi.FULL_CODE_LENGTH else 0
+    result = zonal_risk(bbox, alt)
+    result.update({'code': grid_code, 'level': level, 'bbox': bbox})
+    return result
@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试多航线冲突检测的数据加载
+"""
+
+import json
+import logging
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'multi_plan_conflict_check'))
+
+from channel_field import flatten_channels, scatter_channel_field
+import conflict_logging
+from conflict_results import collect_triplets, aggregate_episodes, iter_result_json
+import conflict_backends
+from conflict_benchmark import generate_fleet, run_case
+
+
+def make_point(t, coords):
+    return {"geometry": {"coordinates": coords}, "expected_time_seconds": t}
+
+
+def test_channel_field_ingestion():
+    """测试航点展开、去重和有效掩码"""
+    channels = [
+        {"points": [
+            make_point(0, [0.0, 0.0, 0.0]),          # 原点也是有效航点
+            make_point(1, [114.0, 22.5, 100.0]),
+            make_point(1, [115.0, 23.0, 200.0]),     # 重复时间步，保留第一个
+            make_point(5, [114.1, 22.6]),            # 坐标无效
+            make_point(99, [114.2, 22.7, 120.0]),    # 超出时间范围
+            {"geometry": {"coordinates": [1, 2, 3]}},  # 缺少时间
+        ]},
+        {"points": [
+            make_point(3, [114.3, 22.8, 50.0]),
+            make_point("x", [114.3, 22.8, 50.0]),    # 时间无法转换
+        ]},
+    ]
+
+    points = flatten_channels(channels, max_time_steps=10)
+    print(f"有效点数: {len(points.t)}, 跳过: {points.skipped_points}")
+    assert points.total_points == 8
+    assert len(points.t) == 3
+    assert points.skipped_points == 5
+
+    channel_np, valid_mask = scatter_channel_field(points, len(channels), max_time_steps=10)
+    assert channel_np.shape == (2, 10, 3)
+    assert valid_mask[0, 0], "原点航点不应被丢弃"
+    assert valid_mask[0, 1] and valid_mask[1, 3]
+    assert valid_mask.sum() == 3
+    np.testing.assert_allclose(channel_np[0, 1], [114.0, 22.5, 100.0])
+
+
+def test_channel_field_empty():
+    """测试空航线列表"""
+    points = flatten_channels([], max_time_steps=10)
+    channel_np, valid_mask = scatter_channel_field(points, 0, max_time_steps=10)
+    assert channel_np.shape == (0, 10, 3)
+    assert valid_mask.shape == (0, 10)
+
+
+def test_conflict_logging_level_gate(tmp_path):
+    """测试日志级别过滤和异步写入"""
+    log_file = tmp_path / "conflict.log"
+    logger = conflict_logging.setup_logging(level="INFO", log_file=str(log_file))
+    try:
+        assert not logger.isEnabledFor(logging.DEBUG)
+
+        class Expensive:
+            formatted = False
+
+            def __str__(self):
+                Expensive.formatted = True
+                return "expensive"
+
+        logger.debug("不应被格式化: %s", Expensive())
+        logger.info("检测完成", extra={"fields": {"conflicts": 3}})
+    finally:
+        conflict_logging.shutdown_logging()
+
+    assert not Expensive.formatted, "DEBUG 关闭时不应格式化调试信息"
+    content = log_file.read_text(encoding="utf-8")
+    assert "检测完成 | conflicts=3" in content
+    assert "expensive" not in content
+
+
+def test_conflict_result_pipeline():
+    """测试结果缓冲区扩容、事件合并与流式 JSON"""
+    # 已有航线 0,1；新航线全局索引 2,3
+    all_triplets = np.array([
+        [5, 0, 2], [3, 0, 2], [4, 0, 2],   # 航线对 (0,2) 连续 3..5
+        [9, 0, 2],                          # 航线对 (0,2) 另一事件
+        [4, 1, 3], [5, 1, 3],
+    ], dtype=np.int32)
+    calls = []
+
+    def run_detection(buffer):
+        calls.append(buffer.shape[0])
+        n = min(len(all_triplets), buffer.shape[0])
+        buffer[:n] = all_triplets[:n]
+        return len(all_triplets)
+
+    triplets = collect_triplets(run_detection, initial_capacity=2)
+    assert calls == [2, 6], "容量不足时应按精确计数重跑一次"
+    assert len(triplets) == 6
+
+    episodes = aggregate_episodes(triplets, existing_count=2)
+    assert len(episodes) == 3
+    assert episodes.existing_idx.tolist() == [0, 0, 1]
+    assert episodes.new_idx.tolist() == [0, 0, 1]
+    assert episodes.start_t.tolist() == [3, 9, 4]
+    assert episodes.end_t.tolist() == [5, 9, 5]
+
+    existing = [{"id": "e0", "name": "E0"}, {"id": "e1", "name": "E1"}]
+    new = [{"id": "n0", "name": "N0"}, {"id": "n1", "name": "N1"}]
+    body = "".join(iter_result_json({"status": "success", "conflict_count": 6},
+                                    episodes, existing, new, chunk_size=2))
+    data = json.loads(body)
+    assert data["conflict_count"] == 6
+    assert [c["duration"] for c in data["conflicts"]] == [3, 1, 2]
+    assert data["conflicts"][2]["new_route_id"] == "n1"
+
+    empty = aggregate_episodes(np.zeros((0, 3), dtype=np.int32), existing_count=2)
+    assert json.loads("".join(iter_result_json({}, empty, existing, new))) == {"conflicts": []}
+
+    # 冲突时间步数组同样分批输出，不在汇总字段里整体序列化
+    import conflict_results
+    saved = conflict_results.JSON_CHUNK_VALUES
+    conflict_results.JSON_CHUNK_VALUES = 4
+    try:
+        times = np.unique(triplets[:, 0])
+        chunks = list(iter_result_json({"status": "success"}, episodes, existing, new,
+                                       arrays={"conflict_times": np.arange(10), "empty": times[:0]}))
+        data = json.loads("".join(chunks))
+        assert data["conflict_times"] == list(range(10)) and data["empty"] == []
+        assert len(data["conflicts"]) == 3
+        # 汇总字段 + 3 批时间步 + 空数组 + "conflicts" 开头 + 1 批事件 + 结尾
+        assert len(chunks) == 8
+        assert json.loads("".join(iter_result_json({}, empty, existing, new, arrays={"t": times}))) == \
+            {"t": times.tolist(), "conflicts": []}
+    finally:
+        conflict_results.JSON_CHUNK_VALUES = saved
+
+
+def test_conflict_backends_match():
+    """测试 NumPy 后端（单进程与进程池）与 Taichi 内核结果一致"""
+    rng = np.random.default_rng(0)
+    channel_np = (rng.random((12, 400, 3)) * 0.02).astype(np.float32)
+    valid_mask = rng.random((12, 400)) < 0.7
+    existing_count = 5
+
+    serial, backend = conflict_backends.detect_triplets(channel_np, valid_mask, existing_count, 0.004,
+                                                        backend="numpy", workers=1)
+    assert backend == "numpy" and len(serial) > 0
+    assert np.all(serial[:, 1] < existing_count) and np.all(serial[:, 2] >= existing_count)
+
+    threshold = conflict_backends.MIN_PARALLEL_ELEMENTS
+    conflict_backends.MIN_PARALLEL_ELEMENTS = 0
+    try:
+        parallel, _ = conflict_backends.detect_triplets(channel_np, valid_mask, existing_count, 0.004,
+                                                        backend="numpy", workers=2)
+        # 并发请求使用不同的并行度时共用同一个进程池，不会互相关闭
+        executor = conflict_backends._get_executor()
+        with ThreadPoolExecutor(4) as pool:
+            results = list(pool.map(
+                lambda w: conflict_backends.detect_triplets(channel_np, valid_mask, existing_count, 0.004,
+                                                            backend="numpy", workers=w)[0], (2, 3, 2, 3)))
+        assert conflict_backends._get_executor() is executor
+    finally:
+        conflict_backends.MIN_PARALLEL_ELEMENTS = threshold
+    assert np.array_equal(serial, parallel)
+    assert all(np.array_equal(serial, r) for r in results)
+
+    if "taichi" in conflict_backends.available_backends():
+        reference, _ = conflict_backends.detect_triplets(channel_np, valid_mask, existing_count, 0.004,
+                                                         backend="taichi")
+        assert np.array_equal(serial, reference)
+
+
+def test_conflict_benchmark_case():
+    """测试合成航线生成与基准测试记录"""
+    existing, new = generate_fleet(4, 6, duration=60, conflict_rate=1.0, max_time_steps=200, seed=1)
+    assert len(existing["channels"]) == 4 and len(new["channels"]) == 6
+    assert len(new["channels"][0]["points"]) == 60
+
+    record = run_case(existing, new, backend="numpy", max_time_steps=200)
+    print(json.dumps(record, ensure_ascii=False))
+    assert record["conflict_count"] >= 6 * 60, "跟随航线每个时间步都应冲突"
+    assert set(record["timings"]) == {"ingest", "jit", "kernel", "extraction"}
+    assert record["pair_time_steps"] > 0 and record["peak_traced_bytes"] > 0
+
+
+if __name__ == "__main__":
+    import pathlib
+    import tempfile
+    test_channel_field_ingestion()
+    test_channel_field_empty()
+    test_conflict_logging_level_gate(pathlib.Path(tempfile.mkdtemp()))
+    test_conflict_result_pipeline()
+    test_conflict_backends_match()
+    test_conflict_benchmark_case()
+    print("测试完成！")
@@ -0,0 +1,532 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试基于编码运算的网格层级操作
+"""
+
+from datetime import datetime
+
+import numpy as np
+import shapely
+from shapely.geometry import Polygon
+
+from airspace_grid import grid_hierarchy as gh
+from airspace_grid import grid_index as gi
+from airspace_grid import grid_sfc
+from airspace_grid.grid_core import GridGenerator
+from airspace_grid.grid_cellset import CellSet
+from airspace_grid.grid_manager import AirspaceGridManager
+from airspace_grid.grid_parallel import generate_grid_columns
+from airspace_grid.grid_polyfill import polyfill
+from airspace_grid.grid_region import GridRegion
+from airspace_grid.grid_encode import encode_grid, encode_grid_batch
+
+POINTS = [(114.05, 22.55, 60), (-73.98, 40.75, 120), (151.2, -33.86, 30), (-0.0005, 0.0004, 10)]
+
+
+def test_codes_to_index_matches_cell_index():
+    codes = encode_grid_batch([p[0] for p in POINTS], [p[1] for p in POINTS], [p[2] for p in POINTS], level=11)
+    for level in range(1, gi.MAX_LEVEL + 1):
+        quad, ax, ay = gh.codes_to_index(codes, level)
+        assert [(int(q), int(x), int(y)) for q, x, y in zip(quad, ax, ay)] == \
+            [gi.cell_index(code, level) for code in codes]
+        # 索引 -> 规范编码 -> 索引
+        plane = gh.index_to_codes(quad, ax, ay, level)
+        assert all(len(code) == gi.PLANE_CODE_LENGTH for code in plane)
+        assert [gi.cell_index(code, level) for code in plane] == [gi.cell_index(code, level) for code in codes]
+
+
+def test_parent_and_children():
+    for lon, lat, alt in POINTS:
+        code = encode_grid(lon, lat, alt, level=11)
+        for level in range(1, gi.MAX_LEVEL):
+            p = gh.parent(code, level)
+            assert gi.cell_index(p, level) == gi.cell_index(code, level)
+            assert gh.parent(p, level) == p
+            assert gi.elevation_of(p) == gi.elevation_of(code)
+
+            kids = gh.children(p, level)
+            assert len(kids) == gi.LON_RADIX[level + 1] * gi.LAT_RADIX[level + 1]
+            assert len({gi.cell_index(k, level + 1) for k in kids}) == len(kids)
+            assert all(gh.parent(k, level) == p for k in kids)
+            assert gh.parent(code, level + 1) in kids
+
+
+def test_neighbors_and_k_ring():
+    level = 11
+    for lon, lat, alt in POINTS:
+        code = encode_grid(lon, lat, alt, level=level)
+        west, south, east, north = gi.cell_bbox(*gi.cell_index(code, level), level)
+        horizontal = gh.neighbors(code, level, include_vertical=False)
+        assert len(horizontal) == 8
+        for nb in horizontal:
+            w, s, e, n = gi.cell_bbox(*gi.cell_index(nb, level), level)
+            # 跨越本初子午线 / 赤道时同样相接
+            assert np.isclose(max(w, west), min(e, east)) or np.isclose(max(s, south), min(n, north))
+            assert max(w, west) <= min(e, east) + 1e-9 and max(s, south) <= min(n, north) + 1e-9
+
+        vertical = gh.neighbors(code, level)[8:]
+        step = 1000 / 2 ** (level - 5)
+        layer = int(gi.elevation_of(code) // step)
+        assert sorted(int(gi.elevation_of(v) // step) for v in vertical) == \
+            [k for k in (layer - 1, layer + 1) if k >= 0]
+
+        assert len(gh.k_ring(code, level, 2)) == 25
+        assert len(gh.k_ring(code, level, 1, include_vertical=True)) == (27 if layer > 0 else 18)
+        assert gi.cell_index(gh.k_ring(code, level, 0)[0], level) == gi.cell_index(code, level)
+
+
+def test_invalid_codes():
+    for bad, level in (('X31A132040422412222222', 5), ('N31A932040422412222222', 3)):
+        try:
+            gh.codes_to_index([bad], level)
+        except ValueError:
+            continue
+        raise AssertionError(f"应拒绝无效编码 {bad}")
+
+    codes = encode_grid_batch([p[0] for p in POINTS], [p[1] for p in POINTS], [p[2] for p in POINTS], level=11)
+    bad = codes[1][:4] + '9' + codes[1][5:]
+    quad, ax, ay, valid = gh.codes_to_index([codes[0], bad, codes[2]], 5, return_valid=True)
+    assert valid.tolist() == [True, False, True]
+    assert (int(quad[2]), int(ax[2]), int(ay[2])) == gi.cell_index(codes[2], 5)
+    elev = gh.elevation_batch(codes + [codes[0][:-1] + 'x'])
+    assert elev[:-1].tolist() == [gi.elevation_of(code) for code in codes] and np.isnan(elev[-1])
+
+    # 逐个解析与批量解析拒绝同样的编码：半球、经度带、纬度带以及各级码元
+    region = GridRegion(114.0, 114.02, 22.5, 22.51, 9, 0, 250)
+    code = region.cell(3).code
+    assert region.index_of(code, exact=False) == 3
+    for bad in ('X' + code[1:], code[0] + '90' + code[3:], code[:3] + 'Z' + code[4:], code[:7] + '9' + code[8:]):
+        try:
+            gi.cell_index(bad, 9)
+        except ValueError:
+            pass
+        else:
+            raise AssertionError(f"应拒绝无效编码 {bad}")
+        assert not gh.codes_to_index([bad], 9, return_valid=True)[3][0]
+        assert region.index_of(bad, exact=False) is None
+
+
+def test_polyfill_matches_brute_force():
+    polygon = [(114.0013, 22.5017), (114.0512, 22.5093), (114.0431, 22.5488), (114.0077, 22.5391)]
+    geom = Polygon(polygon)
+    level, step = 9, 1000 / 2 ** 4
+    ax = np.arange(int(114.0 / gi.LON_CELL_SIZE[level]), int(114.06 / gi.LON_CELL_SIZE[level]) + 1)
+    ay = np.arange(int(22.5 / gi.LAT_CELL_SIZE[level]), int(22.55 / gi.LAT_CELL_SIZE[level]) + 1)
+    gx, gy = [g.ravel() for g in np.meshgrid(ax, ay)]
+    boxes = shapely.box(gx * gi.LON_CELL_SIZE[level], gy * gi.LAT_CELL_SIZE[level],
+                        (gx + 1) * gi.LON_CELL_SIZE[level], (gy + 1) * gi.LAT_CELL_SIZE[level])
+
+    for mode, layers in (('intersect', range(0, 3)), ('contain', range(1, 2))):
+        if mode == 'intersect':
+            mask = shapely.intersects(geom, boxes) & ~shapely.touches(geom, boxes)
+        else:
+            mask = shapely.covers(geom, boxes)
+        expected = {(int(x), int(y), k) for x, y in zip(gx[mask], gy[mask]) for k in layers}
+
+        compact = polyfill(polygon, level, 60, 150, mode)
+        expanded = polyfill(polygon, level, 60, 150, mode, expand=True)
+        assert list(expanded) == [level]
+        if mode == 'intersect':
+            assert min(compact) < level
+            assert sum(map(len, compact.values())) < len(expanded[level]) / 2
+        cells = [gi.cell_index(code, level)[1:] + (int(gi.elevation_of(code) // step),)
+                 for code in expanded[level]]
+        assert len(cells) == len(set(cells)) and set(cells) == expected
+
+        # 紧凑覆盖中的粗网格与展开结果一致
+        for lv, codes in compact.items():
+            for code in codes[:20]:
+                assert gh.parent(code, lv) == code
+                assert any(gi.cell_index(c, lv) == gi.cell_index(code, lv) for c in expanded[level])
+
+
+def test_polyfill_across_meridian_and_equator():
+    square = [(-0.01, -0.01), (0.01, -0.01), (0.01, 0.01), (-0.01, 0.01)]
+    cover = polyfill(square, 9, 0, 1000, expand=True)
+    # 四个象限各 18 × 18 个平面网格，每个 16 层
+    quads = [gi.cell_index(code, 9)[0] for code in cover[9]]
+    assert len(cover[9]) == 4 * 18 * 18 * 16
+    assert sorted(set(quads)) == [gi.NW, gi.NE, gi.SW, gi.SE]
+    assert polyfill(square, 4, mode='contain') == {}
+
+
+def test_cell_set_compaction_and_algebra(tmp_path):
+    manager = AirspaceGridManager()
+    manager.generate_grids(114.0, 114.05, 22.5, 22.55, 8, 0, 500)
+    region = manager.get_cell_set()
+    cover = region.to_cover()
+    # 完整的兄弟网格合并为父网格，展开后与原网格一一对应
+    assert min(cover) < 8 and len(region) < len(manager.grid_cells) / 10
+    assert region.nbytes < 16 * 1024
+    key = lambda codes, level: {gi.cell_index(c, level) + (int(gi.elevation_of(c) // 125),) for c in codes}
+    assert key(region.expand(8), 8) == key(manager.grid_cells, 8)
+    assert CellSet.from_cover(cover) == region
+
+    polygon = [(114.0013, 22.5017), (114.0512, 22.5093), (114.0431, 22.5488), (114.0077, 22.5391)]
+    zone = CellSet.from_cover(polyfill(polygon, 8, 0, 250))
+    a, b = key(region.expand(8), 8), key(zone.expand(8), 8)
+    assert key((region | zone).expand(8), 8) == a | b
+    assert key((region & zone).expand(8), 8) == a & b
+    assert key((region - zone).expand(8), 8) == a - b
+
+    # 22位编码表示整个高度范围；第5级柱体由第6级的 25 × 2 个三维网格组成
+    code = region.expand(8)[0]
+    column = CellSet.from_codes([gi.plane_code(code)], 8)
+    assert column.volume(8) == 8 and column.contains(code, 8)
+    assert len(CellSet.from_codes([code], 5).expand(6)) == 50
+
+    path = tmp_path / 'region.npz'
+    region.save(path)
+    assert CellSet.load(path) == region
+
+
+def test_space_filling_curve_order():
+    # 完整立方体上 Hilbert 曲线相邻序号的网格都相邻
+    cube = np.indices((8, 8, 8)).reshape(3, -1)
+    ordered = cube[:, np.argsort(grid_sfc.hilbert(list(cube), 3))]
+    assert (np.abs(np.diff(ordered, axis=1)).sum(axis=0) == 1).all()
+    assert sum(grid_sfc.level_bits(gi.MAX_LEVEL)) == 64
+
+    plain = GridGenerator.get_grids(114.0, 114.02, 22.5, 22.52, 9, 0, 250)
+    morton = GridGenerator.get_grids(114.0, 114.02, 22.5, 22.52, 9, 0, 250, order='morton')
+    hilbert = GridGenerator.get_grids(114.0, 114.02, 22.5, 22.52, 9, 0, 250, order='hilbert')
+    assert sorted(g.code for g in plain) == sorted(g.code for g in morton) == sorted(g.code for g in hilbert)
+
+    # cellid 为全球 Morton 键：唯一且与 morton 输出顺序一致
+    keys = [g.cellid for g in morton]
+    assert keys == sorted(keys) and len(set(keys)) == len(keys)
+    # 去掉末 3 位后的键前缀相同的网格（2 × 2 × 2 块）属于同一个第8级父网格
+    blocks = np.array(keys, dtype=np.uint64) >> np.uint64(3)
+    parents = grid_sfc.grid_keys([g.center[0] for g in morton], [g.center[1] for g in morton],
+                                 [sum(g.alt_range) / 2 for g in morton], 8)
+    assert len(set(zip(blocks.tolist(), parents.tolist()))) == len(set(blocks.tolist()))
+
+    def steps(grids):
+        coords = grid_sfc.grid_index_arrays([g.center[0] for g in grids], [g.center[1] for g in grids],
+                                            [sum(g.alt_range) / 2 for g in grids], 9)
+        return np.abs(np.diff(np.array(coords), axis=1)).sum(axis=0)
+    assert (steps(hilbert) == 1).mean() > 0.95
+    assert steps(hilbert).mean() < steps(plain).mean()
+
+
+def test_parallel_grid_columns():
+    region = (114.0, 114.02, 22.5, 22.51, 9, 0, 250)
+    expected = GridGenerator.get_grids(*region)
+    # 结果与进程数无关，且与 get_grids 逐项一致
+    for workers in (1, 2):
+        blocks = generate_grid_columns(*region, workers=workers, tile_cells=1000)
+        assert len(blocks) > 1
+        cells = [cell for block in blocks for cell in block.to_cells()]
+        assert [c.code for c in cells] == [g.code for g in expected]
+        assert all(c.bbox == g.bbox and c.center == g.center and c.alt_range == g.alt_range
+                   for c, g in zip(cells, expected))
+    # 各次调用共用同一个进程池
+    from airspace_grid import grid_parallel
+    pool = grid_parallel._get_executor()
+    generate_grid_columns(*region, workers=2, tile_cells=1000)
+    assert grid_parallel._get_executor() is pool
+
+    manager = AirspaceGridManager()
+    blocks = manager.generate_grids_parallel(*region, workers=1)
+    assert manager.grid_columns == blocks and not len(manager.attribute_manager)
+    assert manager.get_statistics() == {"total_grids": len(expected), "level_distribution": {9: len(expected)}}
+    hits = manager.get_grids_by_area(114.0, 114.001, 22.5, 22.501)
+    assert hits and all(h.bbox[0] <= 114.001 and h.bbox[1] <= 22.501 for h in hits)
+    assert manager.get_cell_set().volume(9) == len(expected)
+
+
+def test_grid_region():
+    bounds = (114.0, 114.02, 22.5, 22.51, 9, 0, 250)
+    expected = GridGenerator.get_grids(*bounds)
+    region = GridRegion(*bounds)
+    assert len(region) == len(expected)
+    assert [c.code for c in region] == [g.code for g in expected]
+    for i in (0, 7, len(expected) - 1):
+        assert region.index_of(expected[i].code) == i
+        assert region.cell(i).bbox == expected[i].bbox
+    assert GridGenerator.get_grids(114.5, 114.6, 22.5, 22.6, 9)[0].code not in region
+
+    # 属性对象在第一次写入时才创建
+    manager = AirspaceGridManager()
+    manager.generate_region(*bounds)
+    code = expected[3].code
+    assert not len(manager.attribute_manager)
+    assert manager.get_grid_attributes(code).alt_range == list(expected[3].alt_range)
+    assert manager.update_grid_attribute(code, "weather_conditions", "wind_speed", 12)
+    assert manager.attribute_manager.get_all_grid_codes() == [code]
+    assert [g.code for g in manager.search_grids("weather_conditions", "wind_speed", 12)] == [code]
+    assert not manager.update_grid_attribute("X" * 33, "weather_conditions", "wind_speed", 1)
+    assert manager.get_statistics()["total_grids"] == len(expected)
+    hits = manager.get_grids_by_area(114.0, 114.001, 22.5, 22.501)
+    assert {h.code for h in hits} == {g.code for g in expected
+                                      if g.bbox[0] <= 114.001 and g.bbox[1] <= 22.501}
+
+
+def test_columnar_attributes_with_region_defaults():
+    bounds = (114.0, 114.02, 22.5, 22.51, 9, 0, 250)
+    manager = AirspaceGridManager()
+    grids = manager.generate_grids(*bounds)
+    region = manager.generate_region(114.0, 114.01, 22.5, 22.51, 9, 0, 250)
+    inside = [g for g in grids if g.code in region]
+    assert 0 < len(inside) < len(grids)
+
+    # 区域默认值一次写入，区域内网格继承，单独写入的网格保留自己的取值
+    manager.set_region_attribute(region, "weather_conditions", "visibility", "poor")
+    manager.update_grid_attribute(inside[0].code, "weather_conditions", "visibility", "good")
+    manager.update_grid_attribute(inside[1].code, "flight_rules", "allowed", ["VFR", "IFR"])
+    attrs = manager.attribute_manager
+    assert attrs.get_attribute(inside[0].code, "weather_conditions", "visibility") == "good"
+    assert attrs.get_attribute(inside[1].code, "weather_conditions", "visibility") == "poor"
+    assert attrs.get_attribute(grids[-1].code, "weather_conditions", "visibility") is None
+    assert manager.get_grid_attributes(inside[1].code).flight_rules == {"allowed": ["VFR", "IFR"]}
+    poor = manager.search_grids("weather_conditions", "visibility", "poor")
+    assert sorted(g.code for g in poor) == sorted(g.code for g in inside[1:])
+
+    # 不同取值只保存一份，返回的可变取值是副本
+    column = attrs.columns[("weather_conditions", "visibility")]
+    assert column.values == ["poor", "good"] and len(column.cells) == 1
+    manager.get_grid_attributes(inside[1].code).flight_rules["allowed"].append("X")
+    assert attrs.get_attribute(inside[1].code, "flight_rules", "allowed") == ["VFR", "IFR"]
+
+    # JSON 往返保留（展开后的）属性
+    restored = type(attrs)()
+    restored.from_json(attrs.to_json())
+    for code in (inside[0].code, inside[1].code, grids[-1].code):
+        assert restored.get_grid_attributes(code).to_dict() == attrs.get_grid_attributes(code).to_dict()
+
+
+def test_region_default_search():
+    manager = AirspaceGridManager()
+    outer = manager.generate_region(114.0, 114.02, 22.5, 22.51, 9, 0, 250)
+    inner = manager.generate_region(114.0, 114.01, 22.5, 22.505, 9, 0, 250)
+    codes = outer.codes()
+    queries = codes[::7] + [codes[0][:4] + "0" + codes[0][5:], codes[0][:22], "X" * 33]
+    expected = [outer.index_of(c) for c in queries]
+    assert expected[-3:] == [None] * 3
+    assert outer.index_of_many(queries).tolist() == [-1 if i is None else i for i in expected]
+    assert outer.covers(inner.columns()).all() and inner.covers(outer.columns()).sum() == len(inner)
+
+    # 后写入的区域默认值覆盖先写入的，网格自己的取值优先；结果与逐格查询一致
+    manager.set_region_attribute(outer, "weather_conditions", "visibility", "poor")
+    manager.set_region_attribute(inner, "weather_conditions", "visibility", "good")
+    manager.update_grid_attribute(codes[-1], "weather_conditions", "visibility", "good")
+    manager.update_grid_attribute(inner.codes()[0], "weather_conditions", "visibility", "poor")
+    attrs = manager.attribute_manager
+    for value in ("poor", "good"):
+        found = [a.grid_code for a in attrs.get_grids_by_category_value("weather_conditions", "visibility", value)]
+        assert len(found) == len(set(found))
+        assert sorted(found) == sorted(c for c in codes if manager.get_grid_attributes(c)
+                                       .weather_conditions.get("visibility") == value)
+    # 继承按网格级别判断：其他级别的网格不继承
+    other = GridRegion(114.0, 114.01, 22.5, 22.505, 10, 0, 250).cell(0)
+    assert attrs.build_attributes(other).weather_conditions == {}
+
+
+def test_bulk_update_attributes():
+    bounds = (114.0, 114.02, 22.5, 22.51, 9, 0, 250)
+    manager = AirspaceGridManager()
+    grids = manager.generate_grids(*bounds)
+    region = manager.generate_region(114.1, 114.11, 22.5, 22.51, 9, 0, 250)
+    virtual = region.codes()
+
+    # 编码列表：逐个网格取值的数组与单一取值，虚拟区域中的网格批量登记，找不到的编码跳过
+    codes = [g.code for g in grids[:5]] + virtual[:3] + ["X" * 33]
+    wind = np.arange(len(codes), dtype=np.float64) % 3
+    report = manager.bulk_update_attributes(codes, "weather_conditions",
+                                            {"wind_speed": wind, "source": "forecast"})
+    assert (report["selected"], report["updated"], report["registered"], report["missing"]) == (9, 8, 3, 1)
+    assert set(report["timings"]) == {"select", "resolve", "apply"}
+    attrs = manager.attribute_manager
+    for code, speed in zip(codes[:-1], wind):
+        assert attrs.get_attribute(code, "weather_conditions", "wind_speed") == speed
+        assert attrs.get_attribute(code, "weather_conditions", "source") == "forecast"
+    assert attrs.columns[("weather_conditions", "wind_speed")].values == [0.0, 1.0, 2.0]
+    assert sorted(g.code for g in manager.search_grids("weather_conditions", "wind_speed", 1.0)) == \
+        sorted(c for c, w in zip(codes[:-1], wind) if w == 1.0)
+
+    # 范围与多边形选择器
+    report = manager.bulk_update_attributes([114.0, 22.5, 114.001, 22.501], "airspace_status", {"status": "closed"})
+    hits = {h.code for h in manager.get_grids_by_area(114.0, 114.001, 22.5, 22.501)}
+    assert report["updated"] == len(hits) > 0
+    assert {g.code for g in manager.search_grids("airspace_status", "status", "closed")} == hits
+    square = [(114.1, 22.5), (114.105, 22.5), (114.105, 22.505), (114.1, 22.505)]
+    manager.bulk_update_attributes(square, "airspace_status", {"status": "open"})
+    inside = [c.code for c in region if 114.1 < c.center[0] < 114.105 and 22.5 < c.center[1] < 22.505]
+    assert inside and sorted(g.code for g in manager.search_grids("airspace_status", "status", "open")) == \
+        sorted(inside)
+
+    # 区域的单一取值写成一条区域默认值（覆盖区域内网格自己的取值），不登记网格
+    before, latest = len(attrs), attrs.changes.latest
+    report = manager.bulk_update_attributes(region, "airspace_status", {"status": "restricted"})
+    assert (report["selected"], report["updated"], report["registered"]) == (len(region), len(region), 0)
+    assert len(attrs) == before and attrs.changes.latest == latest + 1
+    change = attrs.changes.since(latest)[0][0].to_dict()
+    assert change["op"] == "region" and change["region"]["override"] and change["value"] == "restricted"
+    assert all(attrs.get_attribute(c, "airspace_status", "status") == "restricted" for c in inside + virtual[:3])
+    # 逐个网格取值的数组才登记区域内的网格
+    report = manager.bulk_update_attributes(region, "weather_conditions",
+                                            {"wind_speed": np.ones(len(region)), "source": "radar"})
+    assert report["registered"] > 0 and len(attrs) == before + report["registered"]
+    assert all(code in attrs for code in virtual)
+    assert attrs.get_attribute(virtual[-1], "weather_conditions", "source") == "radar"
+
+    # 参数无效时不修改任何网格
+    before = len(attrs)
+    for category, values in (("weather_conditions", {"wind_speed": np.zeros(2)}), ("no_such_category", {"x": 1})):
+        try:
+            manager.bulk_update_attributes(virtual[3:6], category, values)
+            assert False
+        except ValueError:
+            pass
+    assert len(attrs) == before
+
+
+def test_time_versioned_attributes():
+    manager = AirspaceGridManager()
+    region = manager.generate_region(114.0, 114.01, 22.5, 22.51, 9, 0, 250)
+    codes = region.codes()
+    attrs = manager.attribute_manager
+    manager.update_grid_attribute(codes[0], "weather_conditions", "wind_speed", 3.0)
+
+    # 预报时次乱序写入，按时间排序；TTL 之后失效，回落到当前取值
+    t0 = 1_800_000_000.0
+    for hour, speed in ((2, 12.0), (0, 5.0), (1, 7.5)):
+        report = manager.bulk_update_attributes(codes, "weather_conditions", {"wind_speed": speed},
+                                                valid_time=t0 + hour * 3600, ttl=3600)
+        assert report["updated"] == len(codes)
+    assert manager.record_grid_attribute(codes[1], "dynamic_updates", "status", "closed", t0 + 1800)
+    assert not manager.record_grid_attribute("X" * 33, "dynamic_updates", "status", "closed", t0)
+    assert attrs.history_size() == 3 * len(codes) + 1
+
+    at = lambda code, t: attrs.get_attribute_at(code, "weather_conditions", "wind_speed", t)
+    assert at(codes[0], t0 - 1) == 3.0
+    assert [at(codes[5], t0 + s) for s in (0, 3599, 3600, 5400, 7200, 10799)] == [5.0, 5.0, 7.5, 7.5, 12.0, 12.0]
+    assert at(codes[0], t0 + 10800) == 3.0 and at(codes[5], t0 + 10800) is None
+    assert attrs.get_attribute(codes[5], "weather_conditions", "wind_speed") is None
+    view = manager.get_grid_attributes(codes[1], at=datetime.fromtimestamp(t0 + 3600))
+    assert view.weather_conditions == {"wind_speed": 7.5} and view.dynamic_updates == {"status": "closed"}
+    assert manager.get_grid_attributes(codes[1]).dynamic_updates == {}
+
+    # 取值与当前取值共用字典；过期清理只删除不再起作用的记录
+    assert attrs.columns[("weather_conditions", "wind_speed")].values == [3.0, 12.0, 5.0, 7.5]
+    assert manager.expire_attributes(t0 + 3600) == len(codes)
+    assert at(codes[5], t0 + 3600) == 7.5 and at(codes[5], t0 + 7200) == 12.0
+    assert manager.expire_attributes(t0 + 10800) == 2 * len(codes)
+    assert attrs.history_size() == 1 and at(codes[0], t0 + 3600) == 3.0
+    assert attrs.get_attribute_at(codes[1], "dynamic_updates", "status", t0 + 86400) == "closed"
+
+    # 全部网格一个列式存储：同一网格同一有效时间以后写入的为准，删除网格同时删除其记录
+    history = attrs.columns[("weather_conditions", "wind_speed")].history
+    attrs.record_many([codes[2], codes[2]], "weather_conditions", {"wind_speed": np.array([1.0, 2.0])}, t0)
+    attrs.record_attribute(codes[3], "weather_conditions", "wind_speed", 4.0, t0)
+    attrs.record_attribute(codes[3], "weather_conditions", "wind_speed", 6.0, t0)
+    assert len(history) == 2 and at(codes[2], t0) == 2.0 and at(codes[3], t0 + 1) == 6.0
+    assert np.all(np.diff(history.cells) >= 0)
+    assert attrs.remove_grid_attributes(codes[3]) and len(history) == 1
+
+
+def test_attribute_change_log():
+    manager = AirspaceGridManager()
+    grids = manager.generate_grids(114.0, 114.02, 22.5, 22.51, 9, 0, 250)
+    region = manager.generate_region(114.1, 114.11, 22.5, 22.51, 9, 0, 250)
+    codes = [g.code for g in grids]
+    attrs = manager.attribute_manager
+
+    manager.update_grid_attribute(codes[0], "airspace_status", "status", "active")
+    manager.bulk_update_attributes(codes[:3], "weather_conditions",
+                                   {"wind_speed": np.array([1.0, 2.0, 1.0]), "source": "obs"})
+    manager.bulk_update_attributes(codes[:2], "weather_conditions", {"wind_speed": 9.0}, valid_time=100.0, ttl=60)
+    manager.set_region_attribute(region, "airspace_status", "status", "closed")
+    attrs.remove_grid_attributes(codes[1])
+    result = manager.get_attribute_changes(0)
+    assert [c["seq"] for c in result["changes"]] == [1, 2, 3, 4, 5, 6]
+    assert result["next"] == result["latest"] == 6 and not result["truncated"]
+    update, wind, source, record, default, remove = result["changes"]
+    assert (update["op"], update["codes"], update["value"]) == ("update", [codes[0]], "active")
+    assert (wind["key"], wind["codes"], wind["values"]) == ("wind_speed", codes[:3], [1.0, 2.0, 1.0])
+    assert source["value"] == "obs" and "values" not in source
+    assert (record["op"], record["valid_time"], record["expires"], record["value"]) == ("record", 100.0, 160.0, 9.0)
+    assert default["op"] == "region" and default["region"]["level"] == 9 and "codes" not in default
+    assert (remove["op"], remove["codes"]) == ("remove", [codes[1]])
+
+    # 增量：只取序号之后的变更；limit 分页
+    assert [c["seq"] for c in manager.get_attribute_changes(4)["changes"]] == [5, 6]
+    page = manager.get_attribute_changes(0, limit=4)
+    assert page["next"] == 4 and page["latest"] == 6
+    assert manager.get_attribute_changes(6) == {"changes": [], "next": 6, "latest": 6, "truncated": False}
+
+    # 长轮询：其他线程写入后唤醒
+    import threading
+    timer = threading.Timer(0.05, manager.update_grid_attribute, (codes[2], "flight_rules", "max_speed", 80))
+    timer.start()
+    result = manager.get_attribute_changes(6, timeout=5)
+    timer.join()
+    assert [c["key"] for c in result["changes"]] == ["max_speed"]
+
+    # 环形缓冲区溢出或序号晚于最新（服务重启）时标记 truncated
+    log = type(attrs.changes)(capacity=3)
+    for i in range(5):
+        log.append("update", "flight_rules", "n", ["c"], value=i)
+    changes, truncated = log.since(0)
+    assert [c.seq for c in changes] == [3, 4, 5] and truncated
+    assert log.since(2) == (changes, False)
+    assert log.since(9) == ([], True) and log.wait(9, timeout=0)
+
+    # 按编码总数限制：大批量写入挤出较早的变更，最新的一条总是保留
+    log = type(attrs.changes)(capacity=100, max_codes=10)
+    for i in range(4):
+        log.append("update", "flight_rules", "n", ["c"] * 3, value=i)
+    assert (log.oldest, log.code_count) == (2, 9)
+    log.append("update", "flight_rules", "n", ["c"] * 25, value=9)
+    assert (len(log), log.code_count) == (1, 25) and log.since(0)[1]
+    try:
+        log.since(0, limit=0)
+        assert False
+    except ValueError:
+        pass
+
+    # 导入保持序号单调并记一条 reset
+    latest = attrs.changes.latest
+    attrs.from_json(attrs.to_json())
+    assert [c["op"] for c in manager.get_attribute_changes(latest)["changes"]] == ["reset"]
+
+
+def test_level5_code_migration():
+    """第五级使用精确的 1/6° / 1/12° 后，受影响纬度的编码（固定新旧编码，防止无意中再次改变）"""
+    cases = [
+        # (lon, lat, alt), 旧编码（0.1667 / 0.0833）, 新编码
+        ((114.05, 22.5834, 50), 'N50F30243344047439393939191919199', 'N50F30240344047439393939191919199'),
+        ((113.9, 22.75, 120), 'N49F25235440142129292929292929299', 'N49F25231440142129292929292929299'),
+        # 不受影响的纬度编码不变
+        ((114.3, 22.7, 50), 'N50F30233324002419191919191919199', 'N50F30233324002419191919191919199'),
+        ((114.05, 22.55, 60), 'N50F30243314042539393939393939399', 'N50F30243314042539393939393939399'),
+    ]
+    points = [p for p, _, _ in cases]
+    batch = encode_grid_batch([p[0] for p in points], [p[1] for p in points], [p[2] for p in points], level=10)
+    for (point, old, new), code in zip(cases, batch):
+        assert encode_grid(*point, level=10) == code == new
+        # 新旧编码只在第五级及以下的码元不同，第四级父网格相同
+        assert gh.parent(new, 4) == gh.parent(old, 4)
+
+
+if __name__ == "__main__":
+    import pathlib
+    import tempfile
+    test_codes_to_index_matches_cell_index()
+    test_parent_and_children()
+    test_neighbors_and_k_ring()
+    test_invalid_codes()
+    test_polyfill_matches_brute_force()
+    test_polyfill_across_meridian_and_equator()
+    test_cell_set_compaction_and_algebra(pathlib.Path(tempfile.mkdtemp()))
+    test_space_filling_curve_order()
+    test_parallel_grid_columns()
+    test_grid_region()
+    test_columnar_attributes_with_region_defaults()
+    test_region_default_search()
+    test_bulk_update_attributes()
+    test_time_versioned_attributes()
+    test_attribute_change_log()
+    test_level5_code_migration()
+    print("测试完成！")
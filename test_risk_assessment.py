@@ -0,0 +1,482 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试风险评估的栅格图层缓存
+"""
+
+import asyncio
+import json
+import os
+import threading
+
+import numpy as np
+import rasterio
+from rasterio.transform import from_origin
+
+import risk_assessment as ra
+import obstacle_grid
+import risk_layer
+import risk_planner
+import risk_pyramid
+import risk_route
+import risk_server
+import risk_zonal
+from airspace_grid import grid_index as gi
+from airspace_grid.grid_manager import AirspaceGridManager
+from airspace_grid.grid_encode import encode_grid, encode_grid_batch
+
+
+def write_tif(path, arr, transform):
+    with rasterio.open(path, 'w', driver='GTiff', height=arr.shape[0], width=arr.shape[1],
+                       count=1, dtype=arr.dtype, transform=transform) as dst:
+        dst.write(arr, 1)
+
+
+def test_raster_layer_registry(tmp_path):
+    """测试图层只加载一次、文件变化后刷新、缺失文件按 0 采样"""
+    path = str(tmp_path / "layer.tif")
+    transform = from_origin(114.0, 23.0, 0.01, 0.01)
+    write_tif(path, np.full((10, 10), 7, dtype=np.int16), transform)
+
+    ra.clear_layers()
+    layer = ra.get_layer(path)
+    assert ra.get_layer(path) is layer
+    assert layer.sample(114.055, 22.955) == 7
+    assert layer.sample(120.0, 22.955) == 0  # 超出范围
+
+    write_tif(path, np.full((10, 10), 9, dtype=np.int16), transform)
+    os.utime(path, ns=(layer.mtime + 10**9, layer.mtime + 10**9))
+    assert ra.refresh_layers() == [path]
+    assert layer.sample(114.055, 22.955) == 9
+
+    missing = ra.get_layer(str(tmp_path / "missing.tif"))
+    assert missing.sample(114.055, 22.955) == 0
+    ra.clear_layers()
+
+
+def test_windowed_raster_reads(tmp_path):
+    """测试大栅格按块读取：采样结果与整体读取一致，缓存不超过上限"""
+    path = str(tmp_path / "large.tif")
+    arr = np.arange(40 * 30, dtype=np.float32).reshape(40, 30)
+    write_tif(path, arr, from_origin(114.0, 23.0, 0.01, 0.01))
+
+    saved = ra.RASTER_FULL_LOAD_BYTES, ra.RASTER_BLOCK_SIZE, ra.RASTER_CACHE_BYTES
+    ra.RASTER_FULL_LOAD_BYTES, ra.RASTER_BLOCK_SIZE, ra.RASTER_CACHE_BYTES = 0, 8, 3 * 8 * 8 * 4
+    try:
+        layer = ra.RasterLayer(path)
+        assert layer.arr is None
+        rng = np.random.default_rng(0)
+        lons = rng.uniform(113.99, 114.31, 300)
+        lats = rng.uniform(22.59, 23.01, 300)
+        values = layer.sample_many(lons, lats)
+        for lon, lat, value in zip(lons, lats, values):
+            col, row = int((lon - 114.0) / 0.01), int((23.0 - lat) / 0.01)
+            expected = arr[row, col] if 0 <= row < 40 and 0 <= col < 30 else 0
+            assert value == expected == layer.sample(lon, lat)
+        assert layer.state.cache_bytes <= ra.RASTER_CACHE_BYTES
+        assert len(layer.state.blocks) <= 3
+
+        # 重新加载（尺寸变化）与并发采样：读取方看到完整的旧版本或新版本
+        errors = []
+        def reader():
+            try:
+                for _ in range(200):
+                    layer.sample_many(lons, lats)
+                    layer.sample(lons[0], lats[0])
+            except Exception as e:   # noqa: BLE001
+                errors.append(e)
+        threads = [threading.Thread(target=reader) for _ in range(4)]
+        for t in threads:
+            t.start()
+        for i in range(20):
+            shape = (40, 30) if i % 2 else (12, 9)
+            # 原子替换文件，旧版本的数据集仍读取原文件
+            write_tif(path + ".new", np.ones(shape, dtype=np.float32), from_origin(114.0, 23.0, 0.01, 0.01))
+            os.replace(path + ".new", path)
+            layer.load()
+        for t in threads:
+            t.join()
+        assert not errors, errors
+        layer.close()
+    finally:
+        ra.RASTER_FULL_LOAD_BYTES, ra.RASTER_BLOCK_SIZE, ra.RASTER_CACHE_BYTES = saved
+
+
+def test_risk_score_sample_point():
+    """测试示例数据上的风险分数（terrain.tif 缺失时地形按 0 处理）"""
+    score = ra.get_risk_score(114.05, 22.55, 10)
+    print(f"风险分数: {score}")
+    assert score > 0
+    assert ra.risk_level(score) in range(1, 6)
+
+
+def test_vectorized_scores_match_scalar():
+    """测试批量风险分数、分级和网格编码与逐点计算一致"""
+    rng = np.random.default_rng(0)
+    lons = rng.uniform(113.7, 114.7, 500)
+    lats = rng.uniform(22.4, 22.9, 500)
+    alts = rng.choice([0, 10, 120.5], 500)
+
+    scores = ra.get_risk_scores(lons, lats, alts)
+    expected = [ra.get_risk_score(x, y, z) for x, y, z in zip(lons, lats, alts)]
+    assert np.array_equal(scores, np.array(expected, dtype=float))
+    assert ra.risk_levels(scores).tolist() == [ra.risk_level(v) for v in expected]
+    assert ra.risk_levels([19.9, 20, 199.9, 200, float('nan')]).tolist() == [1, 2, 4, 5, 5]
+
+    codes = encode_grid_batch(lons, lats, alts, level=11)
+    assert codes == [encode_grid(x, y, z, level=11) for x, y, z in zip(lons, lats, alts)]
+    edges = [(180.0, 90.0), (-180.0, -90.0), (0.0, 0.0), (-73.5, -33.25), (114.25, 22.6667)]
+    assert encode_grid_batch([e[0] for e in edges], [e[1] for e in edges], 10) == \
+        [encode_grid(lon, lat, 10) for lon, lat in edges]
+
+
+def test_risk_by_polygon():
+    """测试多边形区域风险"""
+    polygon = [[114.05, 22.52, 10], [114.10, 22.52, 10], [114.10, 22.56, 10],
+               [114.05, 22.56, 10], [114.05, 22.52, 10]]
+    results = ra.risk_by_polygon(polygon)
+    print(f"网格数量: {len(results)}")
+    assert len(results) == 500
+    assert results[0]['code'] == encode_grid(114.05 + 0.002, 22.52 + 0.002, 10, level=11)
+    assert all(r['risk'] in range(1, 6) for r in results)
+
+
+def test_precomputed_risk_table(tmp_path, monkeypatch):
+    """测试预计算风险表：编码解析为索引后查表，与网格中心实时采样一致"""
+    table = risk_layer.build_risk_table((114.04, 22.54, 114.07, 22.56), level=9)
+    path = str(tmp_path / "risk_table.npz")
+    table.save(path)
+    table = risk_layer.RiskTable.load(path)
+    assert table.shape == (37, 54)
+
+    rng = np.random.default_rng(0)
+    codes = []
+    for lon, lat in zip(rng.uniform(114.04, 114.07, 200), rng.uniform(22.54, 22.56, 200)):
+        code = encode_grid(lon, lat, 35.5, level=11)
+        codes.append(code)
+        quad, ax, ay = gi.cell_index(code, 9)
+        assert (quad, ax, ay) == gi.point_index(lon, lat, 9)
+        assert abs(gi.elevation_of(code) - 35.5) < 1e-6
+        center = gi.cell_center(quad, ax, ay, 9)
+        expected = ra.risk_level(ra.get_risk_score(center[0], center[1], gi.elevation_of(code)))
+        assert table.lookup_code(code) == expected
+
+    outside = encode_grid(113.0, 22.0, 10, level=11)
+    assert table.lookup_code(outside) is None
+    monkeypatch.setenv("RISK_TABLE_PATH", path)
+    assert risk_layer.get_risk_table() is not None
+    batch = risk_layer.risk_by_codes(codes + [outside, 'invalid', 'N50J0047' + 'x' * 14])
+    center = gi.cell_center(*gi.cell_index(outside), gi.MAX_LEVEL)
+    expected = ra.risk_level(ra.get_risk_score(center[0], center[1], gi.elevation_of(outside)))
+    assert risk_layer.risk_by_code(outside) == expected
+    assert batch.tolist() == [table.lookup_code(c) for c in codes] + [expected, 0, 0]
+    assert table.lookup_codes(codes[:5] + [outside] + codes[5:]).tolist() == \
+        [table.lookup_code(c) for c in codes[:5]] + [0] + [table.lookup_code(c) for c in codes[5:]]
+
+    # 格式错误的编码（半球、经度带、纬度带、码元越界、长度不对）在区域统计和金字塔接口返回 400
+    import risk_api
+    client = risk_api.app.test_client()
+    code = codes[0]
+    for bad in ('X' + code[1:], code[0] + '90' + code[3:], code[:3] + 'Z' + code[4:], code[:7] + '9' + code[8:],
+                code[:-1]):
+        for path in ('/risk/zonal', '/risk/pyramid'):
+            assert client.get(path, query_string={'code': bad, 'level': 6}).status_code == 400
+    assert client.get('/risk/pyramid', query_string={'code': code, 'level': 6}).status_code == 200
+    assert client.get('/risk/pyramid', query_string={'code': code, 'level': 10}).status_code == 400
+
+
+def test_risk_by_code_matches_batch(monkeypatch):
+    """测试单个编码与批量查询使用同一套编码 -> 位置换算（无预计算表时实时采样）"""
+    import risk_api
+    monkeypatch.setenv("RISK_TABLE_PATH", "/nonexistent/risk_table.npz")
+    rng = np.random.default_rng(1)
+    codes = encode_grid_batch(rng.uniform(113.8, 114.6, 300), rng.uniform(22.45, 22.8, 300),
+                              rng.uniform(0, 300, 300), level=11)
+    client = risk_api.app.test_client()
+    batch = client.post('/risk/batch', json={'codes': codes}).get_json()['risk']
+    assert batch == risk_layer.risk_by_codes(codes).tolist()
+    for code, risk in list(zip(codes, batch))[:50]:
+        assert client.get('/risk/by_code', query_string={'code': code}).get_json()['risk'] == risk
+    assert [risk_layer.risk_by_code(c) for c in codes] == batch
+    assert client.get('/risk/by_code', query_string={'code': 'invalid'}).status_code == 400
+
+
+def test_zonal_statistics(tmp_path):
+    """测试积分图区域统计与逐像元统计一致"""
+    path = str(tmp_path / "zonal.tif")
+    rng = np.random.default_rng(0)
+    arr = rng.integers(0, 100, (70, 90)).astype(np.int16)
+    arr[5:9, 5:9] = 32767  # nodata 按 0 处理
+    with rasterio.open(path, 'w', driver='GTiff', height=70, width=90, count=1, dtype='int16',
+                       nodata=32767, transform=from_origin(114.0, 23.0, 0.01, 0.01)) as dst:
+        dst.write(arr, 1)
+    values = np.where(arr == 32767, 0, arr).astype(float)
+
+    saved = risk_zonal.ZONAL_BLOCK_SIZE, risk_zonal.ZONAL_STRIP_ROWS
+    risk_zonal.ZONAL_BLOCK_SIZE, risk_zonal.ZONAL_STRIP_ROWS = 8, 16
+    try:
+        zonal = risk_zonal.ZonalLayer(ra.RasterLayer(path), cache_dir=str(tmp_path / "cache"))
+        for _ in range(100):
+            r0, c0 = int(rng.integers(0, 69)), int(rng.integers(0, 89))
+            r1, c1 = int(rng.integers(r0 + 1, 71)), int(rng.integers(c0 + 1, 91))
+            window = values[r0:r1, c0:c1]
+            assert zonal.window_sum(r0, r1, c0, c1) == window.sum()
+            assert zonal.window_max(r0, r1, c0, c1) == window.max()
+    finally:
+        risk_zonal.ZONAL_BLOCK_SIZE, risk_zonal.ZONAL_STRIP_ROWS = saved
+
+    stats = zonal.stats([114.1, 22.5, 114.3, 22.7])  # 像元列 10~30，行 30~50
+    assert stats['pixels'] == 400
+    assert stats['sum'] == values[30:50, 10:30].sum()
+    assert zonal.stats([120.0, 30.0, 120.1, 30.1])['pixels'] == 0
+
+    # 单点采样对 nodata 采用同一约定：与按 0 处理后的像元一致
+    layer = ra.RasterLayer(path)
+    rows, cols = np.indices(arr.shape)
+    lons, lats = 114.0 + (cols + 0.5) * 0.01, 23.0 - (rows + 0.5) * 0.01
+    assert np.array_equal(layer.sample_many(lons, lats), values)
+    assert layer.sample(lons[6, 6], lats[6, 6]) == 0 and layer.sample(lons[0, 0], lats[0, 0]) == arr[0, 0]
+
+    # 同名栅格位于不同目录时缓存互不覆盖；栅格更新后删除旧版本缓存
+    cache_dir = tmp_path / "cache"
+    other_dir = tmp_path / "other"
+    other_dir.mkdir()
+    other = str(other_dir / "zonal.tif")
+    with rasterio.open(other, 'w', driver='GTiff', height=70, width=90, count=1, dtype='int16',
+                       nodata=32767, transform=from_origin(114.0, 23.0, 0.01, 0.01)) as dst:
+        dst.write(np.ones_like(arr), 1)
+    other_zonal = risk_zonal.ZonalLayer(ra.RasterLayer(other), cache_dir=str(cache_dir))
+    assert other_zonal.window_sum(0, 70, 0, 90) == 70 * 90
+    assert zonal.window_sum(0, 70, 0, 90) == values.sum()
+    assert len(list(cache_dir.glob('*.npy'))) == 4
+
+    stale = sorted(p.name for p in cache_dir.glob('*.npy'))
+    os.utime(other, ns=(os.stat(other).st_mtime_ns + 10**9,) * 2)
+    risk_zonal.ZonalLayer(ra.RasterLayer(other), cache_dir=str(cache_dir))
+    names = sorted(p.name for p in cache_dir.glob('*.npy'))
+    assert len(names) == 4 and names != stale
+    assert not list(cache_dir.glob('*.tmp.npy'))
+
+
+def test_risk_pyramid():
+    """测试风险金字塔：粗级别统计等于子网格聚合，剪枝查找与逐格筛选一致"""
+    table = risk_layer.build_risk_table((114.04, 22.54, 114.07, 22.56), level=9)
+    pyramid = risk_pyramid.RiskPyramid(table)
+    assert sorted(pyramid.levels) == list(range(1, 10))
+    assert pyramid.levels[1].count.sum() == table.shape[0] * table.shape[1]
+
+    base = pyramid.levels[9]
+    rows, cols = np.indices(base.shape)
+    scores = base.upper_bound(rows, cols, 35.5)
+    assert scores[3, 4] == table.score_index(table.quad, table.ax0 + 4, table.ay0 + 3, 35.5)
+
+    code = encode_grid(114.05, 22.55, 35.5, level=11)
+    stats = pyramid.stats_by_code(code, 6)
+    _, ax, ay = gi.cell_index(code, 6)
+    cx, cy = cols + base.ax0, rows + base.ay0
+    for lv in (9, 8, 7):
+        cx, cy = cx // gi.LON_RADIX[lv], cy // gi.LAT_RADIX[lv]
+    inside = (cx == ax) & (cy == ay)
+    assert stats['cells'] == inside.sum()
+    assert abs(stats['score_max'] - scores[inside].max()) < 1e-6
+    assert abs(stats['score_mean'] - scores[inside].mean()) < 1e-6
+
+    for min_risk in (1, 3, 5):
+        ax, ay, visited = pyramid.find_risky_cells(min_risk, 35.5)
+        found = np.zeros(base.shape, dtype=bool)
+        found[ay - base.ay0, ax - base.ax0] = True
+        assert np.array_equal(found, ra.risk_levels(scores) >= min_risk)
+    assert pyramid.prescreen_codes([encode_grid(113.0, 22.0, 10, level=11)], 5).tolist() == [True]
+
+    # 批量预筛选与逐个编码的子树上界一致（22位编码按高度 0），无效编码按需要实时计算处理
+    rng = np.random.default_rng(2)
+    codes = encode_grid_batch(rng.uniform(114.03, 114.08, 50), rng.uniform(22.53, 22.57, 50), 35.5, level=11)
+    codes = codes + [gi.plane_code(codes[0])]
+    for min_risk in (2, 3):
+        expected = []
+        for code in codes:
+            stats = pyramid.stats_by_code(code, 7)
+            expected.append(stats is None or stats['risk_max'] >= min_risk)
+        assert pyramid.prescreen_codes(codes + ['invalid', 'X' + codes[0][1:]], min_risk, level=7).tolist() == \
+            expected + [True, True]
+
+    # 比底层更细的级别没有数据，报错而不是截断
+    for call in (lambda: pyramid.stats_by_code(code, 10), lambda: pyramid.find_risky_cells(3, 35.5, level=10),
+                 lambda: pyramid.prescreen_codes(codes, 3, level=10), lambda: pyramid.stats_by_code(code, 0)):
+        try:
+            call()
+        except ValueError:
+            continue
+        raise AssertionError("应拒绝底层级别以外的金字塔级别")
+
+
+def test_risk_by_route():
+    """测试航线风险剖面：采样点风险与逐点计算一致，距离和时间按网格累加"""
+    waypoints = [[114.05, 22.55, 0], [114.06, 22.55, 120], [114.06, 22.56, 120]]
+    result = risk_route.risk_by_route(waypoints, speed=12, level=11)
+    cells = result['cells']
+    points, lengths = risk_route._densify(np.array(waypoints, dtype=float), 11)
+    assert cells['code'][0] == encode_grid(*points[0], level=11)
+    assert len(set(cells['code'])) == len(cells['code'])
+    assert abs(result['length'] - sum(cells['length'])) < 1e-6
+    assert abs(result['length'] - (np.hypot(0.01 * 111320 * np.cos(np.radians(22.55)), 120) + 1113.2)) < 1e-6
+    assert abs(result['duration'] - result['length'] / 12) < 1e-6
+    assert abs(sum(result['exposure'].values()) - result['duration']) < 1e-6
+    assert result['max_risk'] == max(cells['risk'])
+
+    scores = [ra.get_risk_score(*p) for p in points]
+    assert result['max_score'] == max(scores)
+    assert abs(result['integral'] - np.dot(scores, lengths / 12)) < 1e-6
+
+
+def test_obstacle_grid():
+    """测试建筑高度体素化：每个网格取范围内像元和中心采样的最大高度，按高度层判断占用"""
+    bbox = (114.05, 22.55, 114.06, 22.557)
+    grid = obstacle_grid.build_obstacle_grid(bbox, level=11)
+    layer = ra.get_layer(ra.building_tif)
+    cols, rows = layer.inverse * (np.array([bbox[0], bbox[2]]), np.array([bbox[3], bbox[1]]))
+    row0, col0 = int(rows.min()), int(cols.min())
+    data = layer.read_window(row0, int(np.ceil(rows.max())), col0, int(np.ceil(cols.max())))
+
+    top = np.zeros(grid.shape)
+    for (r, c), height in np.ndenumerate(data):
+        lon, lat = layer.transform * (col0 + c + 0.5, row0 + r + 0.5)
+        _, ax, ay = gi.point_index(lon, lat, 11)
+        if 0 <= ay - grid.ay0 < grid.shape[0] and 0 <= ax - grid.ax0 < grid.shape[1]:
+            top[ay - grid.ay0, ax - grid.ax0] = max(top[ay - grid.ay0, ax - grid.ax0], height)
+    for iy, ix in np.ndindex(grid.shape):
+        center = gi.cell_center(grid.quad, grid.ax0 + ix, grid.ay0 + iy, 11)
+        top[iy, ix] = max(top[iy, ix], layer.sample(*center))
+    assert np.array_equal(grid.ceiling, np.ceil(top / grid.alt_step))
+
+    iy, ix = np.unravel_index(np.argmax(grid.ceiling), grid.shape)
+    lon, lat = gi.cell_center(grid.quad, grid.ax0 + ix, grid.ay0 + iy, 11)
+    height = grid.ceiling[iy, ix] * grid.alt_step
+    assert grid.is_blocked(lon, lat, height - 1) and not grid.is_blocked(lon, lat, height + 1)
+    assert grid.is_blocked_code(encode_grid(lon, lat, height - 1, level=11))
+    assert grid.blocked_many([lon, lon, 120.0], [lat, lat, 30.0], [0, height + 1, 0]).tolist() == [True, False, False]
+    bits = np.unpackbits(grid.bitset(), axis=-1, bitorder='little')[..., :grid.layers]
+    assert np.array_equal(bits.sum(axis=-1), grid.ceiling)
+
+    route = risk_route.risk_by_route([[lon - 0.001, lat, 1], [lon + 0.001, lat, 1]], obstacles=grid)
+    assert route['blocked_cells'] == sum(route['cells']['blocked']) > 0
+
+
+def test_risk_planner():
+    """测试代价场航线规划：绕开障碍物、路径连续，编码与 calculate_route_grids 指向同一网格"""
+    grid = risk_planner.build_cost_grid((114.05, 22.55, 114.06, 22.56), level=11, alt_min=0, alt_max=125)
+    assert grid.shape == (10, 74, 74)
+    start, goal = (114.0505, 22.5505, 60), (114.0595, 22.5595, 20)
+    result = risk_planner.plan_route(grid, start, goal)
+    cells = np.array([grid.cell_of(*c) for c in result['cells']])
+    assert tuple(cells[0]) == grid.cell_of(*start) and tuple(cells[-1]) == grid.cell_of(*goal)
+    assert np.abs(np.diff(cells, axis=0)).max() == 1
+    assert not grid.blocked[cells[:, 0], cells[:, 1], cells[:, 2]].any()
+
+    codes, _ = AirspaceGridManager().calculate_route_grids([tuple(c) for c in result['cells']], 11)
+    assert [gi.cell_index(c, 11) for c in codes] == [gi.cell_index(c, 11) for c in result['codes']]
+
+    # 均匀风险下在一堵只留一个缺口的墙前绕行
+    score = np.zeros((3, 12, 12))
+    blocked = np.ones((3, 12, 12), dtype=bool)
+    blocked[1, 1:-1, 1:-1] = False
+    blocked[1, 1:-1, 6] = True
+    blocked[1, 9, 6] = False
+    wall = risk_planner.CostGrid(11, 0, 0, 0, score, blocked)
+    center = lambda y, x: wall.cell_geometry(1, y, x)
+    result = risk_planner.plan_route(wall, center(2, 2), center(2, 10))
+    assert [wall.cell_of(*c)[1:] for c in result['cells']].count((9, 6)) == 1
+    assert result['expanded'] < blocked.size
+
+    try:
+        risk_planner.build_cost_grid((-0.01, 22.55, 0.01, 22.56), level=11)
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("应拒绝东北象限以外的范围")
+
+
+
+def test_route_plan_endpoint_validation():
+    """测试航线规划接口拒绝无效的起终点、级别和距离权重"""
+    import api_server
+    client = api_server.app.test_client()
+    base = {'start': [114.0505, 22.5505, 60], 'goal': [114.0595, 22.5595, 20], 'level': 11}
+    bad = [{'start': [114.0505, 22.5505]}, {'goal': [114.0595, 22.5595, 20, 0]}, {'start': 114.0},
+           {'goal': ['114.0595', 22.5595, 20]}, {'start': [114.0505, True, 60]}, {'level': 0}, {'level': 17},
+           {'level': 'x'}, {'level': None}, {'distance_weight': -1}, {'distance_weight': 'nan'}]
+    for override in bad:
+        response = client.post('/api/grids/route/plan', json={**base, **override})
+        assert response.status_code == 400, override
+        assert 'error' in response.get_json()
+    response = client.post('/api/grids/route/plan', json={**base, 'alt_max': 125, 'margin': 0.001})
+    assert response.status_code == 200 and response.get_json()['data']['count'] > 0
+
+async def asgi_call(app, method, path, query=b'', body=None):
+    messages = [{'type': 'http.request', 'body': json.dumps(body).encode() if body else b''}]
+    response = {}
+
+    async def receive():
+        return messages.pop(0)
+
+    async def send(message):
+        if message['type'] == 'http.response.start':
+            response['status'] = message['status']
+        else:
+            response['body'] = json.loads(message['body'])
+
+    await app({'type': 'http', 'method': method, 'path': path, 'query_string': query}, receive, send)
+    return response['status'], response['body']
+
+
+def test_risk_server(tmp_path, monkeypatch):
+    """测试 ASGI 服务：并发单点查询合并为一次批量计算，结果与逐点计算一致"""
+    monkeypatch.setenv(ra.RASTER_MMAP_ENV, str(tmp_path))
+    server = risk_server.RiskServer(pool_size=0, mmap_dir=str(tmp_path))
+    assert asyncio.run(asgi_call(server, 'GET', '/risk/by_coord', b'lon=114&lat=22'))[0] == 503
+    server.start()
+    assert isinstance(ra.get_layer(ra.building_tif).arr, np.memmap)
+    # 积分图在启动时构建，不留到首个 /risk/zonal 请求
+    assert all(path in risk_zonal._zonal_layers for path in risk_zonal.LAYER_PATHS.values())
+
+    rng = np.random.default_rng(0)
+    points = np.c_[rng.uniform(113.8, 114.6, 100), rng.uniform(22.45, 22.83, 100), rng.choice([0, 50], 100)]
+    malformed = encode_grid(114.05, 22.55, 60, level=11)
+    malformed = ['X' + malformed[1:], malformed[0] + '90' + malformed[3:], malformed[:3] + 'Z' + malformed[4:]]
+
+    async def run():
+        queries = [f'lon={x}&lat={y}&alt={z}'.encode() for x, y, z in points]
+        single = await asyncio.gather(*[asgi_call(server, 'GET', '/risk/by_coord', q) for q in queries])
+        batch = await asgi_call(server, 'POST', '/risk/batch', body={'points': points.tolist()})
+        errors = [await asgi_call(server, 'GET', '/risk/by_code', b'code=invalid'),
+                  await asgi_call(server, 'GET', '/risk/by_coord', b'lon=x'),
+                  await asgi_call(server, 'GET', '/unknown'),
+                  await asgi_call(server, 'GET', '/risk/zonal', b'code=N50J')]
+        errors += [await asgi_call(server, 'GET', '/risk/zonal', f'code={code}'.encode()) for code in malformed]
+        return single, batch, errors
+
+    single, batch, errors = asyncio.run(run())
+    server.stop()
+    expected = [ra.risk_by_coord(*p) for p in points]
+    assert [(body['code'], body['risk']) for _, body in single] == expected
+    assert server.batcher.batches == 1 and server.batcher.points == 100
+    assert batch == (200, {'codes': [e[0] for e in expected], 'risk': [e[1] for e in expected]})
+    assert [status for status, _ in errors] == [400, 400, 404, 400, 400, 400, 400]
+    ra.clear_layers()
+
+
+if __name__ == "__main__":
+    import pathlib
+    import tempfile
+    test_raster_layer_registry(pathlib.Path(tempfile.mkdtemp()))
+    test_windowed_raster_reads(pathlib.Path(tempfile.mkdtemp()))
+    test_risk_score_sample_point()
+    test_vectorized_scores_match_scalar()
+    test_risk_by_polygon()
+    test_zonal_statistics(pathlib.Path(tempfile.mkdtemp()))
+    test_risk_pyramid()
+    test_risk_by_route()
+    test_obstacle_grid()
+    test_risk_planner()
+    test_route_plan_endpoint_validation()
+    print("测试完成！")